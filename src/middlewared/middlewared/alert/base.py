@@ -197,6 +197,9 @@ class AlertSource:
     products = ("CORE", "ENTERPRISE", "SCALE", "SCALE_ENTERPRISE")
     failover_related = False
     run_on_backup_node = True
+    # Seconds after which `alert.process_alerts` stops waiting for the check (it is left running and its result
+    # is used during the next run)
+    run_timeout = 120
 
     def __init__(self, middleware):
         self.middleware = middleware
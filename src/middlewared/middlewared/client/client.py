@@ -315,6 +315,7 @@ class Client(object):
         self._event_callbacks = defaultdict(list)
         self._closed = Event()
         self._connected = Event()
+        self._send_lock = Lock()
         self._ws = WSClient(
             uri,
             client=self,
@@ -336,7 +337,10 @@ class Client(object):
             raise
 
     def _send(self, data):
-        self._ws.send(json.dumps(data))
+        data = json.dumps(data)
+        # Client can be shared between threads, websocket frames must not interleave
+        with self._send_lock:
+            self._ws.send(data)
 
     def _recv(self, message):
         _id = message.get('id')
@@ -451,13 +455,18 @@ class Client(object):
         job_id = fields['id']
         with self._jobs_lock:
             if fields:
+                if job_id not in self._jobs and 'method' not in fields:
+                    # Partial update (i.e. progress) of a job we have not seen being added (it was started before we
+                    # subscribed) and are not waiting for
+                    return
+
                 job = self._jobs[job_id]
                 job.update(fields)
                 if isinstance(job.get('__callback'), Callable):
                     Thread(
                         target=job['__callback'], args=(job,), daemon=True,
                     ).start()
-                if mtype == 'CHANGED' and job['state'] in ('SUCCESS', 'FAILED', 'ABORTED'):
+                if mtype == 'CHANGED' and job.get('state') in ('SUCCESS', 'FAILED', 'ABORTED'):
                     # If an Event already exist we just set it to mark it finished.
                     # Otherwise we create a new Event.
                     # This is to prevent a race-condition of job finishing before
@@ -579,6 +588,10 @@ class Client(object):
             return False
         return True
 
+    @property
+    def closed(self):
+        return self._closed.is_set()
+
     def close(self):
         self._ws.close()
         # Wait for websocketclient thread to close
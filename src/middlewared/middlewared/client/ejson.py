@@ -1,6 +1,12 @@
 from datetime import date, datetime, time, timedelta, timezone
 
 import json
+import math
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 
 class JSONEncoder(json.JSONEncoder):
@@ -39,5 +45,40 @@ def dumps(obj, **kwargs):
     return json.dumps(obj, cls=JSONEncoder, **kwargs)
 
 
+if orjson is not None:
+    # Dates and times are passed to `JSONEncoder.default` so that they are encoded the same way as by `dumps`
+    ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+    orjson_default = JSONEncoder().default
+
+
+def has_non_finite_float(obj):
+    if isinstance(obj, float):
+        return not math.isfinite(obj)
+    if isinstance(obj, dict):
+        return any(has_non_finite_float(v) for v in obj.values())
+    if isinstance(obj, (list, tuple)):
+        return any(has_non_finite_float(v) for v in obj)
+    return False
+
+
+def dumps_fast(obj):
+    """
+    Serialize `obj` with orjson when it is installed and with `dumps` otherwise. The output is compact and not ASCII
+    escaped but it decodes to the same value as `dumps` output. Values orjson can't encode (i.e. integers wider than
+    64 bits) and non-finite floats (which orjson encodes as `null`) are serialized by `dumps`.
+    """
+    if orjson is not None:
+        try:
+            serialized = orjson.dumps(obj, default=orjson_default, option=ORJSON_OPTIONS)
+        except TypeError:
+            pass
+        else:
+            # Only look for `NaN` and `Infinity` when they might have been encoded
+            if b'null' not in serialized or not has_non_finite_float(obj):
+                return serialized.decode()
+
+    return dumps(obj)
+
+
 def loads(obj, **kwargs):
     return json.loads(obj, object_hook=object_hook, **kwargs)
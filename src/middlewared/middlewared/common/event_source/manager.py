@@ -4,6 +4,7 @@ import functools
 
 from collections import defaultdict, namedtuple
 
+from middlewared.client import ejson as json
 from middlewared.event import EventSource
 from middlewared.schema import ValidationErrors
 from middlewared.service_exception import CallError
@@ -98,6 +99,8 @@ class EventSourceManager:
                 await self.unsubscribe(ident)
 
     def _send_event(self, name, arg, event_type, **kwargs):
+        # Every subscriber receives the same message so it is only serialized once
+        serialized = None
         for ident in list(self.subscriptions[name][arg]):
             try:
                 ident_data = self.idents[ident]
@@ -105,7 +108,12 @@ class EventSourceManager:
                 self.middleware.logger.trace("Ident %r is gone", ident)
                 continue
 
-            ident_data.app.send_event(self.get_full_name(name, arg), event_type, **kwargs)
+            if serialized is None:
+                serialized = json.dumps_fast(
+                    ident_data.app.event_message(self.get_full_name(name, arg), event_type, **kwargs)
+                )
+
+            ident_data.app._send_serialized(serialized)
 
     async def _unsubscribe_all(self, name, arg, error=None):
         for ident in self.subscriptions[name][arg]:
@@ -1,6 +1,6 @@
 import asyncio
 import contextlib
-from collections import OrderedDict
+from collections import defaultdict, deque, OrderedDict
 import copy
 from datetime import datetime
 import enum
@@ -18,6 +18,11 @@ from middlewared.pipe import Pipes
 logger = logging.getLogger(__name__)
 
 LOGS_DIR = '/var/log/jobs'
+# Job attributes `Job.__encode__` depends on, setting any of them makes a new job version
+ENCODED_ATTRS = {
+    'id', 'args', 'description', 'logs_path', 'logs_excerpt', 'progress', 'result', 'error', 'exception', 'exc_info',
+    'state', 'time_started', 'time_finished',
+}
 
 
 class State(enum.Enum):
@@ -36,12 +41,13 @@ class JobSharedLock(object):
     for this lock.
     """
 
-    def __init__(self, queue, name, *, loop=None):
+    def __init__(self, queue, name):
         self.queue = queue
         self.name = name
         self.jobs = set()
-        # Once we upgrade to python 3.10 and it starts crashing here, just revert a commit that introduced `loop=loop`
-        self.lock = asyncio.Lock(loop=loop)
+        # Jobs waiting for this lock in the order they were queued
+        self.waiting = deque()
+        self.acquired = False
 
     def add_job(self, job):
         self.jobs.add(job)
@@ -53,13 +59,14 @@ class JobSharedLock(object):
         self.jobs.discard(job)
 
     def locked(self):
-        return self.lock.locked()
+        return self.acquired
 
-    async def acquire(self):
-        return await self.lock.acquire()
+    def acquire(self):
+        assert not self.acquired
+        self.acquired = True
 
     def release(self):
-        return self.lock.release()
+        self.acquired = False
 
 
 class JobsQueue(object):
@@ -67,7 +74,10 @@ class JobsQueue(object):
     def __init__(self, middleware):
         self.middleware = middleware
         self.deque = JobsDeque()
-        self.queue = []
+
+        # Jobs that can be started right away: jobs without a lock and, for every lock that is not acquired, the
+        # first job waiting for it
+        self.ready = deque()
 
         # Event responsible for the job queue schedule loop.
         # This event is set and a new job is potentially ready to run
@@ -87,15 +97,24 @@ class JobsQueue(object):
     def all(self):
         return self.deque.all()
 
+    def candidates(self, filters):
+        return self.deque.candidates(filters)
+
     def add(self, job):
         self.handle_lock(job)
-        if job.options["lock_queue_size"] is not None:
-            queued_jobs = [another_job for another_job in self.queue if another_job.lock is job.lock]
-            if len(queued_jobs) >= job.options["lock_queue_size"]:
-                return queued_jobs[-1]
+        lock = job.lock
+        if lock is not None and job.options["lock_queue_size"] is not None:
+            if lock.waiting and len(lock.waiting) >= job.options["lock_queue_size"]:
+                lock.remove_job(job)
+                return lock.waiting[-1]
 
         self.deque.add(job)
-        self.queue.append(job)
+        if lock is None:
+            self.ready.append(job)
+        else:
+            lock.waiting.append(job)
+            if not lock.locked() and len(lock.waiting) == 1:
+                self.ready.append(job)
 
         job.send_event('ADDED', job.__encode__())
 
@@ -114,7 +133,7 @@ class JobsQueue(object):
 
         lock = self.job_locks.get(name)
         if lock is None:
-            lock = JobSharedLock(self, name, loop=self.middleware.loop)
+            lock = JobSharedLock(self, name)
             self.job_locks[lock.name] = lock
 
         lock.add_job(job)
@@ -129,12 +148,16 @@ class JobsQueue(object):
         lock.remove_job(job)
         lock.release()
 
-        if len(lock.get_jobs()) == 0:
+        if lock.waiting:
+            # Next job waiting for the same lock can run now
+            self.ready.append(lock.waiting[0])
+            self.queue_event.set()
+        elif len(lock.get_jobs()) == 0:
             self.job_locks.pop(lock.name)
 
-        # Once a lock is released there could be another job in the queue
-        # waiting for the same lock
-        self.queue_event.set()
+    def finish(self, job):
+        self.release_lock(job)
+        self.deque.finished(job)
 
     async def next(self):
         """
@@ -143,21 +166,15 @@ class JobsQueue(object):
         while True:
             # Awaits a new event to look for a job
             await self.queue_event.wait()
-            found = None
-            for job in self.queue:
-                # Get job in the queue if it has no lock or its not locked
-                if job.lock is None or not job.lock.locked():
-                    found = job
-                    if job.lock:
-                        await job.lock.acquire()
-                    break
-            if found:
-                # Unlocked job found to run
-                self.queue.remove(found)
-                # If there are no more jobs in the queue, clear the event
-                if len(self.queue) == 0:
+            if self.ready:
+                job = self.ready.popleft()
+                if job.lock is not None:
+                    job.lock.waiting.popleft()
+                    job.lock.acquire()
+                # If there are no more jobs ready to run, clear the event
+                if not self.ready:
                     self.queue_event.clear()
-                return found
+                return job
             else:
                 # No jobs available to run, clear the event
                 self.queue_event.clear()
@@ -178,6 +195,11 @@ class JobsDeque(object):
         self.maxlen = maxlen
         self.count = 0
         self.__dict = OrderedDict()
+        # Ids of finished jobs in the order they have finished
+        self.__finished = OrderedDict()
+        # Method name/state name -> {job id: job}
+        self.__by_method = defaultdict(dict)
+        self.__by_state = defaultdict(dict)
         with contextlib.suppress(FileNotFoundError):
             shutil.rmtree(LOGS_DIR)
 
@@ -194,18 +216,73 @@ class JobsDeque(object):
         self.count += 1
         job.set_id(self.count)
         if len(self.__dict) > self.maxlen:
-            for old_job_id, old_job in self.__dict.items():
-                if old_job.state in (State.SUCCESS, State.FAILED, State.ABORTED):
-                    self.remove(old_job_id)
-                    break
+            if self.__finished:
+                # Job that finished first is discarded
+                self.remove(next(iter(self.__finished)))
             else:
                 logger.warning("There are %d jobs waiting or running", len(self.__dict))
         self.__dict[job.id] = job
+        self.__by_method[job.method_name][job.id] = job
+        self.__by_state[job.state.name][job.id] = job
+        job.state_listener = self.state_changed
+
+    def state_changed(self, job, old_state):
+        if job.id in self.__dict:
+            self.__by_state[old_state.name].pop(job.id, None)
+            self.__by_state[job.state.name][job.id] = job
+
+    def candidates(self, filters):
+        """
+        Jobs that can match query-filters `filters` in the order of their ids. Jobs are narrowed down using `id`,
+        `method` and `state` equality and membership filters, `filters` still have to be applied to them.
+        """
+        candidates = None
+        for f in filters or []:
+            if len(f) != 3 or f[1] not in ('=', 'in'):
+                continue
+
+            name, op, value = f
+            values = value if op == 'in' else [value]
+            if not isinstance(values, (list, tuple)):
+                continue
+
+            try:
+                if name == 'id':
+                    # Copied first as the jobs might be changing in the event loop thread
+                    jobs = self.__dict.copy()
+                    jobs = {job_id: jobs[job_id] for job_id in values if job_id in jobs}
+                elif name in ('method', 'state'):
+                    index = self.__by_method if name == 'method' else self.__by_state
+                    jobs = {}
+                    for v in values:
+                        jobs.update(index.get(v, {}).copy())
+                else:
+                    continue
+            except TypeError:
+                # Unhashable filter value, can't be looked up
+                continue
+
+            candidates = jobs if candidates is None else {k: v for k, v in candidates.items() if k in jobs}
+
+        if candidates is None:
+            return list(self.__dict.copy().values())
+
+        return [candidates[job_id] for job_id in sorted(candidates)]
+
+    def finished(self, job):
+        if job.id in self.__dict:
+            self.__finished[job.id] = None
 
     def remove(self, job_id):
+        self.__finished.pop(job_id, None)
         if job_id in self.__dict:
-            self.__dict[job_id].cleanup()
+            job = self.__dict[job_id]
+            job.cleanup()
             del self.__dict[job_id]
+            for index, key in ((self.__by_method, job.method_name), (self.__by_state, job.state.name)):
+                index[key].pop(job_id, None)
+                if not index[key]:
+                    index.pop(key)
 
 
 class Job:
@@ -221,6 +298,10 @@ class Job:
     logs_fd: None
 
     def __init__(self, middleware, method_name, serviceobj, method, args, options, pipes, on_progress_cb):
+        # Incremented on every change of the encoded job, `raw_result` -> (version, encoded job)
+        self.version = 0
+        self._encoded = {}
+        self.state_listener = None
         self._finished = asyncio.Event(loop=middleware.loop)
         self.middleware = middleware
         self.method_name = method_name
@@ -265,6 +346,11 @@ class Job:
             except Exception:
                 logger.error("Error setting job description", exc_info=True)
 
+    def __setattr__(self, name, value):
+        super().__setattr__(name, value)
+        if name in ENCODED_ATTRS:
+            self.version += 1
+
     def check_pipe(self, pipe):
         """
         Check if pipe named `pipe` was opened by caller. Will raise a `ValueError` if it was not.
@@ -297,9 +383,12 @@ class Job:
         if self.state == State.RUNNING:
             assert state not in ('WAITING', 'RUNNING')
         assert self.state not in (State.SUCCESS, State.FAILED, State.ABORTED)
+        old_state = self.state
         self.state = State.__members__[state]
         if self.state in (State.SUCCESS, State.FAILED, State.ABORTED):
             self.time_finished = datetime.utcnow()
+        if self.state_listener is not None:
+            self.state_listener(self, old_state)
 
     def set_description(self, description):
         """
@@ -340,15 +429,19 @@ class Job:
                 self.progress['extra'] = extra
                 changed = True
 
-        encoded = self.__encode__()
+        if changed:
+            self.version += 1
+
         if self.on_progress_cb:
             try:
-                self.on_progress_cb(encoded)
+                self.on_progress_cb(self.__encode__())
             except Exception:
                 logger.warning('Failed to run on progress callback', exc_info=True)
 
         if changed:
-            self.send_event('CHANGED', encoded)
+            # Subscribers merge changed fields into the job they already have, `state` is included for the ones
+            # that have not seen the job before
+            self.send_event('CHANGED', {'id': self.id, 'state': self.state.name, 'progress': self.progress.copy()})
 
     async def wait(self, timeout=None, raise_error=False):
         if timeout is None:
@@ -425,7 +518,7 @@ class Job:
             await self.__close_logs()
             await self.__close_pipes()
 
-            queue.release_lock(self)
+            queue.finish(self)
             self._finished.set()
             self.send_event('CHANGED', self.__encode__())
             if self.options['transient']:
@@ -488,6 +581,18 @@ class Job:
         await self.middleware.run_in_thread(close_pipes)
 
     def __encode__(self, raw_result=True):
+        """
+        Encoded job. Encoding is reused until the job changes, returned dict must not be modified below its top level.
+        """
+        version = self.version
+        cached = self._encoded.get(raw_result)
+        if cached is None or cached[0] != version:
+            cached = version, self.__encode(raw_result)
+            self._encoded[raw_result] = cached
+
+        return cached[1].copy()
+
+    def __encode(self, raw_result):
         exc_info = None
         if self.exc_info:
             etype = self.exc_info[0]
@@ -517,7 +622,7 @@ class Job:
             'abortable': self.options['abortable'],
             'logs_path': self.logs_path,
             'logs_excerpt': self.logs_excerpt,
-            'progress': self.progress,
+            'progress': self.progress.copy(),
             'result': self.result if raw_result else self.middleware.dump_result(self.result, method=self.method),
             'error': self.error,
             'exception': self.exception,
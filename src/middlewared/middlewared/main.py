@@ -14,6 +14,7 @@ from .utils.debug import get_frame_details, get_threads_stacks
 from .utils.lock import SoftHardSemaphore, SoftHardSemaphoreLimit
 from .utils.nginx import get_remote_addr_port
 from .utils.plugins import LoadPluginsMixin
+from .utils.process_pool import ElasticProcessPool, LANE_LONG, LANE_SHORT
 from .utils.profile import profile_wrap
 from .utils.service.call import ServiceCallMixin
 from .utils.threading import set_thread_name, IoThreadPoolExecutor
@@ -33,7 +34,6 @@ import asyncio
 import binascii
 from collections import namedtuple
 import concurrent.futures
-import concurrent.futures.process
 import concurrent.futures.thread
 import contextlib
 from dataclasses import dataclass
@@ -110,7 +110,9 @@ class Application(object):
         self.__callbacks[name].append(method)
 
     def _send(self, data):
-        serialized = json.dumps(data)
+        self._send_serialized(json.dumps_fast(data))
+
+    def _send_serialized(self, serialized):
         asyncio.run_coroutine_threadsafe(self.response.send_str(serialized), loop=self.loop)
         _1KB = 1000
         if len(serialized) > _1KB:
@@ -238,6 +240,7 @@ class Application(object):
             await self.middleware.event_source_manager.subscribe(self, self.__esm_ident(ident), shortname, arg)
         else:
             self.__subscribed[ident] = name
+            self.middleware.register_event_subscriber(self, name)
 
         self._send({
             'msg': 'ready',
@@ -246,7 +249,9 @@ class Application(object):
 
     async def unsubscribe(self, ident):
         if ident in self.__subscribed:
-            self.__subscribed.pop(ident)
+            name = self.__subscribed.pop(ident)
+            if name not in self.__subscribed.values():
+                self.middleware.unregister_event_subscriber(self, name)
         elif self.__esm_ident(ident) in self.middleware.event_source_manager.idents:
             await self.middleware.event_source_manager.unsubscribe(self.__esm_ident(ident))
 
@@ -261,11 +266,14 @@ class Application(object):
             )[0] not in self.middleware.event_source_manager.event_sources
         ):
             return
+        self._send(self.event_message(name, event_type, **kwargs))
+
+    @staticmethod
+    def event_message(name, event_type, **kwargs):
         event = {
             'msg': event_type.lower(),
             'collection': name,
         }
-        kwargs = kwargs.copy()
         if 'id' in kwargs:
             event['id'] = kwargs.pop('id')
         if event_type in ('ADDED', 'CHANGED'):
@@ -276,7 +284,7 @@ class Application(object):
                 event['cleared'] = kwargs.pop('cleared')
         if kwargs:
             event['extra'] = kwargs
-        self._send(event)
+        return event
 
     def on_open(self):
         self.middleware.register_wsclient(self)
@@ -291,6 +299,10 @@ class Application(object):
 
         await self.middleware.event_source_manager.unsubscribe_app(self)
 
+        for name in set(self.__subscribed.values()):
+            self.middleware.unregister_event_subscriber(self, name)
+        self.__subscribed.clear()
+
         self.middleware.unregister_wsclient(self)
 
     async def on_message(self, message):
@@ -836,11 +848,18 @@ class PreparedCall:
 class Middleware(LoadPluginsMixin, ServiceCallMixin):
 
     CONSOLE_ONCE_PATH = '/tmp/.middlewared-console-once'
+    # (min_workers, max_workers) of each process pool lane. Jobs and methods that have proven to be
+    # long-running use the long lane so that they do not delay short calls.
+    PROCESS_POOL_LANES = {
+        LANE_SHORT: (3, 8),
+        LANE_LONG: (1, 4),
+    }
 
     def __init__(
         self, loop_debug=False, loop_monitor=True, debug_level=None,
         log_handler=None, trace_malloc=False,
         log_format='[%(asctime)s] (%(levelname)s) %(name)s.%(funcName)s():%(lineno)d - %(message)s',
+        process_pool_lanes=None,
     ):
         super().__init__()
         self.logger = logger.Logger(
@@ -855,6 +874,7 @@ class Middleware(LoadPluginsMixin, ServiceCallMixin):
         self.debug_level = debug_level
         self.log_handler = log_handler
         self.log_format = log_format
+        self.process_pool_lanes = dict(self.PROCESS_POOL_LANES, **(process_pool_lanes or {}))
         self.app = None
         self.loop = None
         self.__thread_id = threading.get_ident()
@@ -862,6 +882,8 @@ class Middleware(LoadPluginsMixin, ServiceCallMixin):
         multiprocessing.set_start_method('spawn')  # Spawn new processes for ProcessPool instead of forking
         self.__init_procpool()
         self.__wsclients = {}
+        # Event name (or `*`) -> websocket clients subscribed to it
+        self.__event_subscribers = defaultdict(set)
         self.__events = Events()
         self.event_source_manager = EventSourceManager(self)
         self.__event_subs = defaultdict(list)
@@ -1079,6 +1101,16 @@ class Middleware(LoadPluginsMixin, ServiceCallMixin):
     def unregister_wsclient(self, client):
         self.__wsclients.pop(client.session_id)
 
+    def register_event_subscriber(self, client, name):
+        self.__event_subscribers[name].add(client)
+
+    def unregister_event_subscriber(self, client, name):
+        subscribers = self.__event_subscribers.get(name)
+        if subscribers is not None:
+            subscribers.discard(client)
+            if not subscribers:
+                self.__event_subscribers.pop(name, None)
+
     def register_hook(self, name, method, *, blockable=False, inline=False, order=0, raise_error=False, sync=True):
         """
         Register a hook under `name`.
@@ -1205,20 +1237,17 @@ class Middleware(LoadPluginsMixin, ServiceCallMixin):
         return await self.run_in_executor(self.thread_pool_executor, method, *args, **kwargs)
 
     def __init_procpool(self):
-        self.__procpool = concurrent.futures.ProcessPoolExecutor(
-            max_workers=5,
-            initializer=functools.partial(worker_init, self.debug_level, self.log_handler)
+        self.__procpool = ElasticProcessPool(
+            functools.partial(worker_init, self.debug_level, self.log_handler), self.process_pool_lanes,
         )
 
     async def run_in_proc(self, method, *args, **kwargs):
-        retries = 2
-        for i in range(retries):
-            try:
-                return await self.run_in_executor(self.__procpool, method, *args, **kwargs)
-            except concurrent.futures.process.BrokenProcessPool:
-                if i == retries - 1:
-                    raise
-                self.__init_procpool()
+        return await self.__procpool.run(
+            f'{method.__module__}.{method.__qualname__}', functools.partial(method, *args, **kwargs),
+        )
+
+    def get_process_pool_stats(self):
+        return self.__procpool.stats()
 
     def pipe(self, buffered=False):
         """
@@ -1299,7 +1328,9 @@ class Middleware(LoadPluginsMixin, ServiceCallMixin):
         return await self.run_in_executor(prepared_call.executor, methodobj, *prepared_call.args)
 
     async def _call_worker(self, name, *args, job=None):
-        return await self.run_in_proc(main_worker, name, args, job)
+        return await self.__procpool.run(
+            name, functools.partial(main_worker, name, args, job), LANE_LONG if job else None,
+        )
 
     def dump_args(self, args, method=None, method_name=None):
         if method is None:
@@ -1446,11 +1477,25 @@ class Middleware(LoadPluginsMixin, ServiceCallMixin):
 
         self.logger.trace(f'Sending event {name!r}:{event_type!r}:{kwargs!r}')
 
-        for session_id, wsclient in list(self.__wsclients.items()):
+        if self.event_source_manager.short_name_arg(name)[0] in self.event_source_manager.event_sources:
+            # `Application.send_event` does not check subscriptions for events named after an event source
+            recipients = set(self.__wsclients.values())
+        else:
+            recipients = self.__event_subscribers.get(name, set()) | self.__event_subscribers.get('*', set())
+
+        if recipients:
             try:
-                wsclient.send_event(name, event_type, **kwargs)
+                # Serialized once for all the recipients
+                serialized = json.dumps_fast(Application.event_message(name, event_type, **kwargs))
             except Exception:
-                self.logger.warn('Failed to send event {} to {}'.format(name, session_id), exc_info=True)
+                self.logger.warn('Failed to serialize event {}'.format(name), exc_info=True)
+                recipients = set()
+
+            for wsclient in recipients:
+                try:
+                    wsclient._send_serialized(serialized)
+                except Exception:
+                    self.logger.warn('Failed to send event {} to {}'.format(name, wsclient.session_id), exc_info=True)
 
         async def wrap(handler):
             try:
@@ -1746,7 +1791,7 @@ class Middleware(LoadPluginsMixin, ServiceCallMixin):
         asyncio.ensure_future(self.jobs.run())
 
         # Start up middleware worker process pool
-        self.__procpool._start_executor_manager_thread()
+        self.__procpool.start()
 
         runner = web.AppRunner(app, handle_signals=False, access_log=None)
         await runner.setup()
@@ -1824,6 +1869,9 @@ def main():
     parser.add_argument('--trace-malloc', '-tm', action='store', nargs=2, type=int, default=False)
     parser.add_argument('--overlay-dirs', '-o', action='append')
     parser.add_argument('--disable-debug-mode', action='store_true', default=False)
+    for lane in Middleware.PROCESS_POOL_LANES:
+        parser.add_argument(f'--process-pool-{lane}', nargs=2, type=int, metavar=('MIN', 'MAX'),
+                            help=f'Number of worker processes in the {lane} process pool lane')
     parser.add_argument('--debug-level', choices=[
         'TRACE',
         'DEBUG',
@@ -1866,6 +1914,10 @@ def main():
         trace_malloc=args.trace_malloc,
         debug_level=args.debug_level,
         log_handler=args.log_handler,
+        process_pool_lanes={
+            lane: tuple(bounds) for lane in Middleware.PROCESS_POOL_LANES
+            if (bounds := getattr(args, f'process_pool_{lane}')) is not None
+        },
     ).run()
 
 
@@ -3,7 +3,7 @@ from middlewared.service import (
     CallError, CRUDService, ValidationErrors, item_method, no_auth_required, pass_app, private, filterable, job
 )
 import middlewared.sqlalchemy as sa
-from middlewared.utils import run, filter_list
+from middlewared.utils import run, filter_getattrs, filter_list
 from middlewared.utils.osc import IS_FREEBSD
 from middlewared.validators import Email
 from middlewared.plugins.smb import SMBBuiltin
@@ -24,6 +24,35 @@ from pathlib import Path
 from contextlib import suppress
 
 SKEL_PATH = '/etc/skel/'
+# Query result attributes which are only computed when they are selected or used by query filters/ordering
+USER_EXTEND_ATTRS = ('groups', 'sshpubkey')
+GROUP_EXTEND_ATTRS = ('users',)
+SMB_ATTRS = ('nt_name', 'sid')
+# Related rows of more than this many users/groups are fetched without narrowing them by id
+EXTEND_CONTEXT_MAX_IDS = 500
+
+
+def query_attrs(names):
+    return {name.lstrip('-').split('.', 1)[0] for name in names}
+
+
+def wanted_attrs(attrs, filters, options):
+    """
+    Subset of computed `attrs` that query `filters` and `options` need.
+    """
+    used = query_attrs(filter_getattrs(filters)) | query_attrs(options.get('order_by') or [])
+    select = query_attrs(options.get('select') or [])
+    return [
+        attr for attr in attrs
+        if attr in used or (not options.get('count') and (not select or attr in select))
+    ]
+
+
+def eager_filters(filters, attrs):
+    """
+    Top-level `filters` that do not use any of computed `attrs` and can be applied before they are computed.
+    """
+    return [f for f in filters if not query_attrs(filter_getattrs([f])) & set(attrs)]
 
 
 def pw_checkname(verrors, attribute, name):
@@ -153,20 +182,37 @@ class UserService(CRUDService):
 
     @private
     async def user_extend_context(self, rows, extra):
-        memberships = {}
-        res = await self.middleware.call(
-            'datastore.query', 'account.bsdgroupmembership',
-            [], {'prefix': 'bsdgrpmember_'}
-        )
+        """
+        `extra` may contain `extend_attrs`, a list of `USER_EXTEND_ATTRS` to compute for `rows` (all of them by
+        default).
+        """
+        extend_attrs = extra.get('extend_attrs', USER_EXTEND_ATTRS)
+        ctx = {'extend_attrs': extend_attrs}
 
-        for i in res:
-            uid = i['user']['id']
-            if uid in memberships:
-                memberships[uid].append(i['group']['id'])
-            else:
-                memberships[uid] = [i['group']['id']]
+        if 'groups' in extend_attrs:
+            memberships = {}
+            ids = [row['id'] for row in rows]
+            res = await self.middleware.call(
+                'datastore.query', 'account.bsdgroupmembership',
+                [['user', 'in', ids]] if len(ids) <= EXTEND_CONTEXT_MAX_IDS else [], {'prefix': 'bsdgrpmember_'}
+            )
+
+            for i in res:
+                uid = i['user']['id']
+                if uid in memberships:
+                    memberships[uid].append(i['group']['id'])
+                else:
+                    memberships[uid] = [i['group']['id']]
+
+            ctx['memberships'] = memberships
 
-        return {"memberships": memberships}
+        if 'sshpubkey' in extend_attrs:
+            # Read authorized keys of all the users in a single thread
+            ctx['sshpubkeys'] = await self.middleware.run_in_thread(
+                lambda: {row['id']: self._read_authorized_keys(row['home']) for row in rows}
+            )
+
+        return ctx
 
     @private
     def _read_authorized_keys(self, homedir):
@@ -185,9 +231,15 @@ class UserService(CRUDService):
         if user['email'] == '':
             user['email'] = None
 
-        user['groups'] = ctx['memberships'].get(user['id'], [])
-        # Get authorized keys
-        user['sshpubkey'] = await self.middleware.run_in_thread(self._read_authorized_keys, user['home'])
+        extend_attrs = ctx.get('extend_attrs', USER_EXTEND_ATTRS)
+        if 'groups' in extend_attrs:
+            user['groups'] = ctx['memberships'].get(user['id'], [])
+        if 'sshpubkey' in extend_attrs:
+            # Get authorized keys
+            if user['id'] in ctx.get('sshpubkeys', {}):
+                user['sshpubkey'] = ctx['sshpubkeys'][user['id']]
+            else:
+                user['sshpubkey'] = await self.middleware.run_in_thread(self._read_authorized_keys, user['home'])
 
         return user
 
@@ -220,6 +272,10 @@ class UserService(CRUDService):
         `DS` - include users from Directory Service (LDAP or Active Directory) in results
 
         `"extra": {"search_dscache": true}` is a legacy method of querying for directory services users.
+
+        Filters which can be evaluated in SQL narrow down the users read from the database. `groups`, `sshpubkey`
+        and SMB information are only computed for users that match the remaining filters that do not use them, and
+        only if they are selected or used by the filters or ordering.
         """
         if not filters:
             filters = []
@@ -229,12 +285,6 @@ class UserService(CRUDService):
         options['extend_context'] = self._config.datastore_extend_context
         options['prefix'] = self._config.datastore_prefix
 
-        datastore_options = options.copy()
-        datastore_options.pop('count', None)
-        datastore_options.pop('get', None)
-        datastore_options.pop('limit', None)
-        datastore_options.pop('offset', None)
-
         extra = options.get('extra', {})
         dssearch = extra.pop('search_dscache', False)
         additional_information = extra.get('additional_information', [])
@@ -242,23 +292,44 @@ class UserService(CRUDService):
         if 'DS' in additional_information:
             additional_information.remove('DS')
 
+        if dssearch:
+            return await self.middleware.call('dscache.query', 'USERS', filters, options)
+
+        extend_attrs = wanted_attrs(USER_EXTEND_ATTRS, filters, options)
+        smb = 'SMB' in additional_information and bool(wanted_attrs(SMB_ATTRS, filters, options))
+
+        # Empty email is normalized to null by `user_extend` so SQL can't tell them apart
+        sql_filters = await self.middleware.call(
+            'datastore.sql_filters', self._config.datastore,
+            [f for f in filters if len(f) != 3 or f[0] != 'email'], self._config.datastore_prefix,
+        )
+        result = await self.middleware.call(
+            'datastore.query', self._config.datastore, sql_filters, {
+                'extend': self._config.datastore_extend,
+                'extend_context': self._config.datastore_extend_context,
+                'prefix': self._config.datastore_prefix,
+                'extra': {'extend_attrs': []},
+            }
+        )
+        for entry in result:
+            entry.update({'local': True, 'id_type_both': False})
+
+        if prefilters := eager_filters(filters, USER_EXTEND_ATTRS + SMB_ATTRS):
+            result = await self.middleware.run_in_thread(filter_list, result, prefilters)
+
+        if extend_attrs and result:
+            ctx = await self.user_extend_context(result, {'extend_attrs': extend_attrs})
+            result = [await self.user_extend(entry, ctx) for entry in result]
+
         username_sid = {}
-        if 'SMB' in additional_information:
+        if smb and result:
             for u in await self.middleware.call("smb.passdb_list", True):
                 username_sid.update({u['Unix username']: {
                     'nt_name': u['NT username'],
                     'sid': u['User SID'],
                 }})
 
-        if dssearch:
-            return await self.middleware.call('dscache.query', 'USERS', filters, options)
-
-        result = await self.middleware.call(
-            'datastore.query', self._config.datastore, [], datastore_options
-        )
-
         for entry in result:
-            entry.update({'local': True, 'id_type_both': False})
             if username_sid:
                 smb_entry = username_sid.get(entry['username'], {
                     'nt_name': '',
@@ -1187,9 +1258,25 @@ class GroupService(CRUDService):
 
     @private
     async def group_extend_context(self, rows, extra):
+        """
+        `extra` may contain `extend_attrs`, a list of `GROUP_EXTEND_ATTRS` to compute for `rows` (all of them by
+        default).
+        """
+        extend_attrs = extra.get('extend_attrs', GROUP_EXTEND_ATTRS)
+        ctx = {'extend_attrs': extend_attrs}
+        if 'users' not in extend_attrs:
+            return ctx
+
         mem = {}
-        membership = await self.middleware.call('datastore.query', 'account.bsdgroupmembership', [], {'prefix': 'bsdgrpmember_'})
-        users = await self.middleware.call('datastore.query', 'account.bsdusers')
+        ids = [row['id'] for row in rows]
+        narrow = len(ids) <= EXTEND_CONTEXT_MAX_IDS
+        membership = await self.middleware.call(
+            'datastore.query', 'account.bsdgroupmembership', [['group', 'in', ids]] if narrow else [],
+            {'prefix': 'bsdgrpmember_'}
+        )
+        users = await self.middleware.call(
+            'datastore.query', 'account.bsdusers', [['bsdusr_group', 'in', ids]] if narrow else []
+        )
 
         # uid and gid variables here reference database ids rather than OS uid / gid
         for g in membership:
@@ -1208,12 +1295,14 @@ class GroupService(CRUDService):
             else:
                 mem[gid] = [uid]
 
-        return {"memberships": mem}
+        ctx['memberships'] = mem
+        return ctx
 
     @private
     async def group_extend(self, group, ctx):
         group['name'] = group['group']
-        group['users'] = ctx['memberships'].get(group['id'], [])
+        if 'users' in ctx.get('extend_attrs', GROUP_EXTEND_ATTRS):
+            group['users'] = ctx['memberships'].get(group['id'], [])
         return group
 
     @private
@@ -1245,6 +1334,10 @@ class GroupService(CRUDService):
         `DS` - include groups from Directory Service (LDAP or Active Directory) in results
 
         `"extra": {"search_dscache": true}` is a legacy method of querying for directory services groups.
+
+        Filters which can be evaluated in SQL narrow down the groups read from the database. `users` and SMB
+        information are only computed for groups that match the remaining filters that do not use them, and only if
+        they are selected or used by the filters or ordering.
         """
         if not filters:
             filters = []
@@ -1254,12 +1347,6 @@ class GroupService(CRUDService):
         options['extend_context'] = self._config.datastore_extend_context
         options['prefix'] = self._config.datastore_prefix
 
-        datastore_options = options.copy()
-        datastore_options.pop('count', None)
-        datastore_options.pop('get', None)
-        datastore_options.pop('limit', None)
-        datastore_options.pop('offset', None)
-
         extra = options.get('extra', {})
         dssearch = extra.pop('search_dscache', False)
         additional_information = extra.get('additional_information', [])
@@ -1270,16 +1357,35 @@ class GroupService(CRUDService):
         if dssearch:
             return await self.middleware.call('dscache.query', 'GROUPS', filters, options)
 
-        if 'SMB' in additional_information:
-            smb_groupmap = await self.middleware.call("smb.groupmap_list")
+        extend_attrs = wanted_attrs(GROUP_EXTEND_ATTRS, filters, options)
+        smb = 'SMB' in additional_information and bool(wanted_attrs(SMB_ATTRS, filters, options))
 
+        sql_filters = await self.middleware.call(
+            'datastore.sql_filters', self._config.datastore, filters, self._config.datastore_prefix,
+        )
         result = await self.middleware.call(
-            'datastore.query', self._config.datastore, [], datastore_options
+            'datastore.query', self._config.datastore, sql_filters, {
+                'extend': self._config.datastore_extend,
+                'extend_context': self._config.datastore_extend_context,
+                'prefix': self._config.datastore_prefix,
+                'extra': {'extend_attrs': []},
+            }
         )
-
         for entry in result:
             entry.update({'local': True, 'id_type_both': False})
-            if 'SMB' in additional_information:
+
+        if prefilters := eager_filters(filters, GROUP_EXTEND_ATTRS + SMB_ATTRS):
+            result = await self.middleware.run_in_thread(filter_list, result, prefilters)
+
+        if extend_attrs and result:
+            ctx = await self.group_extend_context(result, {'extend_attrs': extend_attrs})
+            result = [await self.group_extend(entry, ctx) for entry in result]
+
+        if smb and result:
+            smb_groupmap = await self.middleware.call("smb.groupmap_list")
+
+        for entry in result:
+            if smb:
                 smb_data = smb_groupmap['local'].get(entry['gid'])
                 if not smb_data:
                     smb_data = smb_groupmap['local_builtins'].get(entry['gid'], {'nt_name': '', 'sid': ''})
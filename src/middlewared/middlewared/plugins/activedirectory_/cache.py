@@ -16,13 +16,15 @@ class ActiveDirectoryService(Service):
         service = "activedirectory"
 
     @private
-    def get_gencache_sid(self, tdb_key):
-        gencache = tdb.Tdb('/tmp/gencache.tdb', 0, tdb.DEFAULT, os.O_RDONLY)
-        try:
-            tdb_val = gencache.get(tdb_key)
-        finally:
-            gencache.close()
-
+    def get_gencache_sid(self, tdb_key, gencache=None):
+        if gencache is None:
+            gencache = tdb.Tdb('/tmp/gencache.tdb', 0, tdb.DEFAULT, os.O_RDONLY)
+            try:
+                return self.get_gencache_sid(tdb_key, gencache)
+            finally:
+                gencache.close()
+
+        tdb_val = gencache.get(tdb_key)
         if tdb_val is None:
             return None
 
@@ -83,36 +85,44 @@ class ActiveDirectoryService(Service):
         else:
             entries = self.get_gencache_names(domain_info)
 
-        for i in entries:
-            entry = {"id": -1, "sid": None, "nss": None}
-            if entry_type == 'USER':
-                try:
-                    entry["nss"] = pwd.getpwnam(i)
-                except KeyError:
-                    continue
-                entry["id"] = entry["nss"].pw_uid
-                tdb_key = f'IDMAP/UID2SID/{entry["id"]}'
+        gencache = tdb.Tdb('/tmp/gencache.tdb', 0, tdb.DEFAULT, os.O_RDONLY)
+        try:
+            for i in entries:
+                entry = {"id": -1, "sid": None, "nss": None}
+                if entry_type == 'USER':
+                    try:
+                        entry["nss"] = pwd.getpwnam(i)
+                    except KeyError:
+                        continue
+                    entry["id"] = entry["nss"].pw_uid
+                    tdb_key = f'IDMAP/UID2SID/{entry["id"]}'
+
+                else:
+                    try:
+                        entry["nss"] = grp.getgrnam(i)
+                    except KeyError:
+                        continue
+                    entry["id"] = entry["nss"].gr_gid
+                    tdb_key = f'IDMAP/GID2SID/{entry["id"]}'
+
+                """
+                Try to look up in gencache before asking winbindd.
+                """
+                entry['sid'] = self.get_gencache_sid((tdb_key.encode() + b"\x00"), gencache)
+                ret.append(entry)
+        finally:
+            gencache.close()
 
-            else:
-                try:
-                    entry["nss"] = grp.getgrnam(i)
-                except KeyError:
-                    continue
-                entry["id"] = entry["nss"].gr_gid
-                tdb_key = f'IDMAP/GID2SID/{entry["id"]}'
-
-            """
-            Try to look up in gencache before subprocess to wbinfo.
-            """
-            entry['sid'] = self.get_gencache_sid((tdb_key.encode() + b"\x00"))
-            if not entry['sid']:
-                entry['sid'] = self.middleware.call_sync('idmap.unixid_to_sid', {
-                    'id_type': entry_type,
-                    'id': entry['id'],
-                })
+        # Entries missing from gencache are resolved with as few wbinfo calls as possible
+        unresolved = [entry for entry in ret if not entry['sid']]
+        sids = self.middleware.call_sync('idmap.unixids_to_sids', [
+            {'id_type': entry_type, 'id': entry['id']} for entry in unresolved
+        ])
+        for entry, sid in zip(unresolved, sids):
+            entry['sid'] = sid
 
+        for entry in ret:
             entry['domain_info'] = dom_by_sid[entry['sid'].rsplit('-', 1)[0]]
-            ret.append(entry)
 
         return ret
 
@@ -144,6 +154,7 @@ class ActiveDirectoryService(Service):
         online_check_wait()
 
         users = self.get_entries({'entry_type': 'USER', 'cache_enabled': not ad['disable_freenas_cache']})
+        user_entries = []
         for u in users:
             user_data = u['nss']
             rid = int(u['sid'].rsplit('-', 1)[1])
@@ -173,9 +184,12 @@ class ActiveDirectoryService(Service):
                 'nt_name': None,
                 'sid': None,
             }
-            self.middleware.call_sync('dscache.insert', self._config.namespace.upper(), 'USER', entry)
+            user_entries.append(entry)
+
+        self.middleware.call_sync('dscache.replace', self._config.namespace.upper(), 'USER', user_entries)
 
         groups = self.get_entries({'entry_type': 'GROUP', 'cache_enabled': not ad['disable_freenas_cache']})
+        group_entries = []
         for g in groups:
             group_data = g['nss']
             rid = int(g['sid'].rsplit('-', 1)[1])
@@ -195,7 +209,9 @@ class ActiveDirectoryService(Service):
                 'nt_name': None,
                 'sid': None,
             }
-            self.middleware.call_sync('dscache.insert', self._config.namespace.upper(), 'GROUP', entry)
+            group_entries.append(entry)
+
+        self.middleware.call_sync('dscache.replace', self._config.namespace.upper(), 'GROUP', group_entries)
 
     @private
     async def get_cache(self):
@@ -1,3 +1,4 @@
+import asyncio
 from collections import defaultdict, namedtuple
 import copy
 from datetime import datetime, timezone
@@ -28,12 +29,12 @@ from middlewared.client.client import ReserveFDException
 from middlewared.schema import accepts, Any, Bool, Datetime, Dict, Int, List, Patch, returns, Ref, Str
 from middlewared.service import (
     ConfigService, CRUDService, Service, ValidationErrors,
-    job, periodic, private,
+    filterable, job, periodic, private,
 )
 from middlewared.service_exception import CallError
 import middlewared.sqlalchemy as sa
 from middlewared.validators import validate_schema
-from middlewared.utils import bisect
+from middlewared.utils import bisect, filter_list
 from middlewared.utils.plugins import load_modules, load_classes
 from middlewared.utils.python import get_middlewared_dir
 
@@ -47,6 +48,12 @@ AlertSourceLock = namedtuple("AlertSourceLock", ["source_name", "expires_at"])
 
 SEND_ALERTS_ON_READY = False
 
+# Maximum number of alert sources that are checked at the same time
+ALERT_SOURCES_CONCURRENCY = 8
+# Alert sources that took longer than this (seconds) are reported as slow by `alert.source_stats`
+ALERT_SOURCE_SLOW_THRESHOLD = 30
+ALERT_SOURCE_DURATION_BUCKETS = (0.1, 0.5, 1, 5, 10, 30, 60, 120, 300)
+
 
 class AlertModel(sa.Model):
     __tablename__ = 'system_alert'
@@ -73,6 +80,18 @@ class AlertSourceRunFailedAlertClass(AlertClass):
     exclude_from_list = True
 
 
+class AlertSourceRunTimedOutAlertClass(AlertClass):
+    category = AlertCategory.SYSTEM
+    level = AlertLevel.WARNING
+    title = "Alert Check Timed Out"
+    text = (
+        "Alert check %(source_name)s did not finish within %(timeout)d seconds. Its results will be updated once it "
+        "completes."
+    )
+
+    exclude_from_list = True
+
+
 class AlertSourceRunFailedOnBackupNodeAlertClass(AlertClass):
     category = AlertCategory.SYSTEM
     level = AlertLevel.CRITICAL
@@ -130,6 +149,41 @@ class AlertPolicy:
         return gone_alerts, new_alerts
 
 
+class AlertSourceRunStats:
+    def __init__(self):
+        self.runs = 0
+        self.timeouts = 0
+        self.last_duration = None
+        self.max_duration = 0
+        self.total_duration = 0
+        # Last bucket counts runs longer than `ALERT_SOURCE_DURATION_BUCKETS[-1]`
+        self.histogram = [0] * (len(ALERT_SOURCE_DURATION_BUCKETS) + 1)
+
+    def record(self, duration):
+        self.runs += 1
+        self.last_duration = duration
+        self.max_duration = max(self.max_duration, duration)
+        self.total_duration += duration
+        self.histogram[next(
+            (i for i, le in enumerate(ALERT_SOURCE_DURATION_BUCKETS) if duration <= le),
+            len(ALERT_SOURCE_DURATION_BUCKETS),
+        )] += 1
+
+    def serialize(self):
+        return {
+            "runs": self.runs,
+            "timeouts": self.timeouts,
+            "last_duration": self.last_duration,
+            "max_duration": self.max_duration,
+            "mean_duration": self.total_duration / self.runs if self.runs else None,
+            "slow": self.last_duration is not None and self.last_duration >= ALERT_SOURCE_SLOW_THRESHOLD,
+            "histogram": dict(
+                [(f"<={le}", count) for le, count in zip(ALERT_SOURCE_DURATION_BUCKETS, self.histogram)] +
+                [(f">{ALERT_SOURCE_DURATION_BUCKETS[-1]}", self.histogram[-1])]
+            ),
+        }
+
+
 def get_alert_level(alert, classes):
     return AlertLevel[classes.get(alert.klass.name, {}).get("level", alert.klass.level.name)]
 
@@ -193,6 +247,10 @@ class AlertService(Service):
 
         self.blocked_sources = defaultdict(set)
         self.sources_locks = {}
+        # Checks that did not finish within `run_timeout` are left running and their results are collected during
+        # the next `process_alerts` run
+        self.sources_tasks = {}
+        self.sources_stats = defaultdict(AlertSourceRunStats)
 
         self.blocked_failover_alerts_until = 0
 
@@ -628,82 +686,109 @@ class AlertService(Service):
             if source_lock.expires_at <= time.monotonic():
                 await self.unblock_source(k)
 
-        for alert_source in ALERT_SOURCES.values():
-            if product_type not in alert_source.products:
-                continue
+        semaphore = asyncio.Semaphore(ALERT_SOURCES_CONCURRENCY)
+        await asyncio.gather(*[
+            self.__run_alert_source(alert_source, semaphore, master_node, backup_node, run_on_backup_node)
+            for alert_source in ALERT_SOURCES.values()
+            if (
+                product_type in alert_source.products and
+                (not alert_source.failover_related or run_failover_related)
+            )
+        ])
 
-            if alert_source.failover_related and not run_failover_related:
-                continue
+    async def __run_alert_source(self, alert_source, semaphore, master_node, backup_node, run_on_backup_node):
+        if task := self.sources_tasks.get(alert_source.name):
+            if not task.done():
+                self.logger.debug("Alert source %r is still running", alert_source.name)
+                return
+        elif not alert_source.schedule.should_run(datetime.utcnow(), self.alert_source_last_run[alert_source.name]):
+            return
 
-            if not alert_source.schedule.should_run(datetime.utcnow(), self.alert_source_last_run[alert_source.name]):
-                continue
+        async with semaphore:
+            await self.__run_alert_source_locked(alert_source, master_node, backup_node, run_on_backup_node)
 
+    async def __run_alert_source_locked(self, alert_source, master_node, backup_node, run_on_backup_node):
+        if alert_source.name not in self.sources_tasks:
             self.alert_source_last_run[alert_source.name] = datetime.utcnow()
 
-            alerts_a = [alert
-                        for alert in self.alerts
-                        if alert.node == master_node and alert.source == alert_source.name]
-            locked = False
-            if self.blocked_sources[alert_source.name]:
-                self.logger.debug("Not running alert source %r because it is blocked", alert_source.name)
-                locked = True
-            else:
-                self.logger.trace("Running alert source: %r", alert_source.name)
-
-                try:
-                    alerts_a = await self.__run_source(alert_source.name)
-                except UnavailableException:
-                    pass
-            for alert in alerts_a:
-                alert.node = master_node
+        alerts_a = [alert
+                    for alert in self.alerts
+                    if alert.node == master_node and alert.source == alert_source.name]
+        locked = False
+        if self.blocked_sources[alert_source.name]:
+            self.logger.debug("Not running alert source %r because it is blocked", alert_source.name)
+            self.sources_tasks.pop(alert_source.name, None)
+            locked = True
+        else:
+            self.logger.trace("Running alert source: %r", alert_source.name)
 
-            alerts_b = []
-            if run_on_backup_node and alert_source.run_on_backup_node:
+            try:
+                alerts = await self.__run_source_with_timeout(alert_source)
+            except UnavailableException:
+                pass
+            else:
+                if alerts is None:
+                    self.logger.warning("Alert source %r did not finish within %d seconds", alert_source.name,
+                                        alert_source.run_timeout)
+                    alerts_a = [alert for alert in alerts_a if alert.klass != AlertSourceRunTimedOutAlertClass]
+                    alerts_a.append(Alert(AlertSourceRunTimedOutAlertClass,
+                                          args={
+                                              "source_name": alert_source.name,
+                                              "timeout": alert_source.run_timeout,
+                                          },
+                                          _source=alert_source.name))
+                else:
+                    alerts_a = alerts
+        for alert in alerts_a:
+            alert.node = master_node
+
+        alerts_b = []
+        if run_on_backup_node and alert_source.run_on_backup_node:
+            try:
+                alerts_b = [alert
+                            for alert in self.alerts
+                            if alert.node == backup_node and alert.source == alert_source.name]
                 try:
-                    alerts_b = [alert
-                                for alert in self.alerts
-                                if alert.node == backup_node and alert.source == alert_source.name]
-                    try:
-                        if not locked:
-                            alerts_b = await self.middleware.call("failover.call_remote", "alert.run_source",
-                                                                  [alert_source.name])
-
-                            alerts_b = [Alert(**dict({k: v for k, v in alert.items()
-                                                      if k in ["args", "datetime", "last_occurrence", "dismissed",
-                                                               "mail"]},
-                                                     klass=AlertClass.class_by_name[alert["klass"]],
-                                                     _source=alert["source"],
-                                                     _key=alert["key"]))
-                                        for alert in alerts_b]
-                    except CallError as e:
-                        if e.errno in [errno.ECONNABORTED, errno.ECONNREFUSED, errno.ECONNRESET, errno.EHOSTDOWN,
-                                       errno.ETIMEDOUT, CallError.EALERTCHECKERUNAVAILABLE]:
-                            pass
-                        else:
-                            raise
-                except ReserveFDException:
-                    self.logger.debug('Failed to reserve a privileged port')
-                except Exception:
-                    alerts_b = [
-                        Alert(AlertSourceRunFailedOnBackupNodeAlertClass,
-                              args={
-                                  "source_name": alert_source.name,
-                                  "traceback": traceback.format_exc(),
-                              },
-                              _source=alert_source.name)
-                    ]
+                    if not locked:
+                        alerts_b = await self.middleware.call("failover.call_remote", "alert.run_source",
+                                                              [alert_source.name])
+
+                        alerts_b = [Alert(**dict({k: v for k, v in alert.items()
+                                                  if k in ["args", "datetime", "last_occurrence", "dismissed",
+                                                           "mail"]},
+                                                 klass=AlertClass.class_by_name[alert["klass"]],
+                                                 _source=alert["source"],
+                                                 _key=alert["key"]))
+                                    for alert in alerts_b]
+                except CallError as e:
+                    if e.errno in [errno.ECONNABORTED, errno.ECONNREFUSED, errno.ECONNRESET, errno.EHOSTDOWN,
+                                   errno.ETIMEDOUT, CallError.EALERTCHECKERUNAVAILABLE]:
+                        pass
+                    else:
+                        raise
+            except ReserveFDException:
+                self.logger.debug('Failed to reserve a privileged port')
+            except Exception:
+                alerts_b = [
+                    Alert(AlertSourceRunFailedOnBackupNodeAlertClass,
+                          args={
+                              "source_name": alert_source.name,
+                              "traceback": traceback.format_exc(),
+                          },
+                          _source=alert_source.name)
+                ]
 
-            for alert in alerts_b:
-                alert.node = backup_node
+        for alert in alerts_b:
+            alert.node = backup_node
 
-            for alert in alerts_a + alerts_b:
-                self.__handle_alert(alert)
+        for alert in alerts_a + alerts_b:
+            self.__handle_alert(alert)
 
-            self.alerts = (
-                [a for a in self.alerts if a.source != alert_source.name] +
-                alerts_a +
-                alerts_b
-            )
+        self.alerts = (
+            [a for a in self.alerts if a.source != alert_source.name] +
+            alerts_a +
+            alerts_b
+        )
 
     def __handle_alert(self, alert):
         try:
@@ -748,6 +833,26 @@ class AlertService(Service):
         except UnavailableException:
             raise CallError("This alert checker is unavailable", CallError.EALERTCHECKERUNAVAILABLE)
 
+    @private
+    @filterable
+    async def source_stats(self, filters, options):
+        """
+        Run statistics of alert sources: number of runs and timeouts, durations (in seconds) and their histogram.
+
+        `running` is set for the sources which are still being checked after timing out in previous
+        `alert.process_alerts` run, `slow` for the ones whose last check took longer than
+        `ALERT_SOURCE_SLOW_THRESHOLD` seconds.
+        """
+        return filter_list([
+            dict(
+                self.sources_stats[name].serialize(),
+                name=name,
+                timeout=alert_source.run_timeout,
+                running=name in self.sources_tasks and not self.sources_tasks[name].done(),
+            )
+            for name, alert_source in ALERT_SOURCES.items()
+        ], filters, options)
+
     @private
     async def block_source(self, source_name, timeout=3600):
         if source_name not in ALERT_SOURCES:
@@ -769,6 +874,33 @@ class AlertService(Service):
         # This values come from observation from support of how long a M-series boot can take.
         self.blocked_failover_alerts_until = time.monotonic() + 900
 
+    async def __run_source_with_timeout(self, alert_source):
+        """
+        Run (or keep waiting for, if it timed out previously) `alert_source` check for at most `run_timeout` seconds.
+
+        Returns `None` if it timed out.
+        """
+        if (task := self.sources_tasks.get(alert_source.name)) is None:
+            task = self.sources_tasks[alert_source.name] = asyncio.ensure_future(
+                self.__run_source_timed(alert_source.name)
+            )
+
+        try:
+            return await asyncio.wait_for(asyncio.shield(task), alert_source.run_timeout)
+        except asyncio.TimeoutError:
+            self.sources_stats[alert_source.name].timeouts += 1
+            return None
+        finally:
+            if task.done():
+                self.sources_tasks.pop(alert_source.name, None)
+
+    async def __run_source_timed(self, source_name):
+        start = time.monotonic()
+        try:
+            return await self.__run_source(source_name)
+        finally:
+            self.sources_stats[source_name].record(time.monotonic() - start)
+
     async def __run_source(self, source_name):
         alert_source = ALERT_SOURCES[source_name]
 
@@ -810,13 +942,14 @@ class AlertService(Service):
             if await self.middleware.call('failover.status') == 'BACKUP':
                 return
 
-        await self.middleware.call("datastore.delete", "system.alert", [])
-
+        operations = [["delete", "system.alert", []]]
         for alert in self.alerts:
             d = alert.__dict__.copy()
             d["klass"] = d["klass"].name
             del d["mail"]
-            await self.middleware.call("datastore.insert", "system.alert", d)
+            operations.append(["insert", "system.alert", d])
+
+        await self.middleware.call("datastore.bulk", operations)
 
     @private
     @accepts(Str("klass"), Any("args", null=True))
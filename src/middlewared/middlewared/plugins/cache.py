@@ -275,6 +275,14 @@ class DSCache(Service):
         Dict('cache_entry', additional_attrs=True),
     )
     async def insert(self, ds, idtype, entry):
+        await self.middleware.call('tdb.batch_ops', {
+            "name": f'{ds.lower()}_{idtype.lower()}',
+            "ops": self.insert_ops(idtype, [entry])
+        })
+        return True
+
+    @private
+    def insert_ops(self, idtype, entries):
         if idtype == "GROUP":
             id_key = "gid"
             name_key = "name"
@@ -282,15 +290,25 @@ class DSCache(Service):
             id_key = "uid"
             name_key = "username"
 
-        ops = [
-            {"action": "SET", "key": f'ID_{entry[id_key]}', "val": entry},
-            {"action": "SET", "key": f'NAME_{entry[name_key]}', "val": entry}
-        ]
-        await self.middleware.call('tdb.batch_ops', {
+        ops = []
+        for entry in entries:
+            ops.extend([
+                {"action": "SET", "key": f'ID_{entry[id_key]}', "val": entry},
+                {"action": "SET", "key": f'NAME_{entry[name_key]}', "val": entry}
+            ])
+
+        return ops
+
+    @private
+    async def replace(self, ds, idtype, entries):
+        """
+        Replace all cached `idtype` entries of `ds` with `entries`. The new cache is built aside and swapped in at
+        once so queries never see it empty or partially filled.
+        """
+        await self.middleware.call('tdb.replace', {
             "name": f'{ds.lower()}_{idtype.lower()}',
-            "ops": ops
+            "ops": self.insert_ops(idtype, entries)
         })
-        return True
 
     @accepts(
         Str('directory_service', required=True, enum=["ACTIVEDIRECTORY", "LDAP"]),
@@ -454,11 +472,10 @@ class DSCache(Service):
 
         entries = await self.entries(enabled_ds.upper(), objtype[:-1])
         if 'SMB' in extra.get('additional_information', []):
-            for entry in entries:
-                sid = await self.middleware.call('idmap.unixid_to_sid', {
-                    'id_type': objtype[:-1],
-                    'id': entry[f'{objtype[0].lower()}id'],
-                })
+            sids = await self.middleware.call('idmap.unixids_to_sids', [
+                {'id_type': objtype[:-1], 'id': entry[f'{objtype[0].lower()}id']} for entry in entries
+            ])
+            for entry, sid in zip(entries, sids):
                 name_key = "username" if objtype == 'USERS' else 'group'
                 entry.update({
                     'nt_name': entry[name_key],
@@ -476,12 +493,14 @@ class DSCache(Service):
         UI button to 'rebuild directory service cache'.
         """
         for ds in ['activedirectory', 'ldap']:
-            await self.middleware.call('tdb.wipe', {'name': f'{ds}_user'})
-            await self.middleware.call('tdb.wipe', {'name': f'{ds}_group'})
-
             ds_state = await self.middleware.call(f'{ds}.get_state')
 
             if ds_state == 'HEALTHY':
+                # Cache contents are replaced at once when filled
                 await job.wrap(await self.middleware.call(f'{ds}.fill_cache', True))
-            elif ds_state != 'DISABLED':
+                continue
+
+            await self.middleware.call('tdb.wipe', {'name': f'{ds}_user'})
+            await self.middleware.call('tdb.wipe', {'name': f'{ds}_group'})
+            if ds_state != 'DISABLED':
                 self.logger.debug('Unable to refresh [%s] cache, state is: %s' % (ds, ds_state))
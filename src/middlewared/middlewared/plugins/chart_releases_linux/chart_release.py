@@ -97,6 +97,9 @@ class ChartReleaseService(CRUDService):
         `query-options.extra.history` is a boolean when set will retrieve all chart version upgrades
         for a chart release.
 
+        `query-options.extra.latest_revision_only` is a boolean when set will only read the latest helm revision
+        of each chart release so `config` is built from that revision alone. It has no effect if `history` is set.
+
         `query-options.extra.include_chart_schema` is a boolean when set will retrieve the schema being used by
         the chart release in question.
 
@@ -573,6 +576,7 @@ class ChartReleaseService(CRUDService):
         namespace = get_namespace(release_name)
 
         cp = await run(['helm', 'uninstall', release_name, '-n', namespace], check=False)
+        await self.middleware.call('k8s.secret.relist_helm_release_secrets')
         if cp.returncode:
             raise CallError(f'Unable to uninstall "{release_name}" chart release: {cp.stderr}')
 
@@ -40,6 +40,7 @@ class ChartReleaseService(Service):
                 env=dict(os.environ, KUBECONFIG='/etc/rancher/k3s/k3s.yaml'),
             )
             stderr = cp.communicate()[1]
+            self.middleware.call_sync('k8s.secret.relist_helm_release_secrets')
             if cp.returncode:
                 raise CallError(f'Failed to {tn_action} chart release: {stderr.decode()}')
 
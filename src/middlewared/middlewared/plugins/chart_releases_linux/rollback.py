@@ -126,6 +126,7 @@ class ChartReleaseService(Service):
                 get_namespace(release_name), '--recreate-pods'
             ] + command, check=False,
         )
+        await self.middleware.call('k8s.secret.relist_helm_release_secrets')
         await self.middleware.call('chart.release.sync_secrets_for_release', release_name)
         await self.middleware.call('chart.release.refresh_events_state', release_name)
 
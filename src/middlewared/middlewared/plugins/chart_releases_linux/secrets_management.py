@@ -1,5 +1,6 @@
 import gzip
 import json
+import threading
 
 from base64 import b64decode
 from collections import defaultdict
@@ -7,10 +8,62 @@ from copy import deepcopy
 from pkg_resources import parse_version
 
 from middlewared.service import private, Service
+from middlewared.utils import filter_list
 
 from .utils import CHART_NAMESPACE_PREFIX, get_namespace
 
 
+# Decoded helm releases keyed by secret `(namespace, name)`. An entry is reused only while its secret has the same
+# resource version and it is dropped once the secret is no longer listed.
+DECODED_RELEASES = {}
+DECODED_RELEASES_LOCK = threading.Lock()
+
+
+def decode_release(release_secret):
+    key = (release_secret['metadata']['namespace'], release_secret['metadata']['name'])
+    resource_version = release_secret['metadata']['resource_version']
+    with DECODED_RELEASES_LOCK:
+        cached = DECODED_RELEASES.get(key)
+
+    if cached is None or cached[0] != resource_version:
+        release = json.loads(gzip.decompress(b64decode(b64decode(release_secret['data']['release']))).decode())
+        # We don't want manifest files data
+        release.pop('manifest')
+        release['chart_metadata'] = release.pop('chart')['metadata']
+        cached = (resource_version, release)
+        with DECODED_RELEASES_LOCK:
+            DECODED_RELEASES[key] = cached
+
+    return deepcopy(cached[1])
+
+
+def prune_decoded_releases(namespace_filter, listed):
+    with DECODED_RELEASES_LOCK:
+        for key in [
+            k for k in DECODED_RELEASES
+            if k not in listed and filter_list([{'metadata': {'namespace': k[0]}}], [namespace_filter])
+        ]:
+            DECODED_RELEASES.pop(key)
+
+
+def latest_revisions(release_secrets):
+    """
+    Keep only the latest revision of each chart release out of `release_secrets` using the labels helm sets on them.
+    """
+    latest = {}
+    for release_secret in release_secrets:
+        labels = release_secret['metadata']['labels'] or {}
+        if not labels.get('name') or not (labels.get('version') or '').isdigit():
+            # Revision can't be told without decoding the release
+            return release_secrets
+
+        key = (release_secret['metadata']['namespace'], labels['name'])
+        if key not in latest or int(labels['version']) > int(latest[key]['metadata']['labels']['version']):
+            latest[key] = release_secret
+
+    return list(latest.values())
+
+
 class ChartReleaseService(Service):
 
     class Config:
@@ -32,18 +85,19 @@ class ChartReleaseService(Service):
         secrets = self.middleware.call_sync(
             'k8s.secret.query', [namespace_filter], {'extra': {'field_selector': 'type=helm.sh/release.v1'}}
         )
+        prune_decoded_releases(
+            namespace_filter, {(s['metadata']['namespace'], s['metadata']['name']) for s in secrets}
+        )
+        if options.get('latest_revision_only') and not options.get('history'):
+            secrets = latest_revisions(secrets)
+
         official_catalog_label = self.middleware.call_sync('catalog.official_catalog_label')
         for release_secret in secrets:
-            data = release_secret.pop('data')
-            release = json.loads(gzip.decompress(b64decode(b64decode(data['release']))).decode())
+            release = decode_release(release_secret)
             name = release['name']
             release_namespace_name = get_namespace(name)
 
-            # We don't want manifest files data
-            release.pop('manifest')
-
             release.update({
-                'chart_metadata': release.pop('chart')['metadata'],
                 'id': name,
                 'catalog': namespace_labels[release_namespace_name].get('catalog', official_catalog_label),
                 'catalog_train': namespace_labels[release_namespace_name].get('catalog_train', 'test'),
@@ -66,6 +120,11 @@ class ChartReleaseService(Service):
 
         return release_secrets
 
+    @private
+    def clear_decoded_releases_cache(self):
+        with DECODED_RELEASES_LOCK:
+            DECODED_RELEASES.clear()
+
     @private
     async def sync_secrets_for_release(self, release):
         secrets_data = await self.middleware.call(
@@ -91,3 +150,6 @@ class ChartReleaseService(Service):
 
         for remove_secret in to_remove:
             await self.middleware.call('k8s.secret.delete', remove_secret, {'namespace': get_namespace(release)})
+
+        if to_remove:
+            await self.middleware.call('k8s.secret.relist_helm_release_secrets')
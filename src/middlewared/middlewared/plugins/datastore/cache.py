@@ -0,0 +1,155 @@
+from collections import defaultdict, OrderedDict
+import copy
+import functools
+import threading
+
+from middlewared.service import Service
+from middlewared.utils.lang import undefined
+
+# Maximum number of cached query results
+QUERY_CACHE_SIZE = 1024
+# Results with more rows than this are not cached, copying them would cost as much as querying them
+QUERY_CACHE_MAX_ROWS = 1000
+
+
+def freeze(value):
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(v) for v in value)
+    elif isinstance(value, (set, frozenset)):
+        return frozenset(freeze(v) for v in value)
+    elif isinstance(value, dict):
+        return tuple((k, freeze(v)) for k, v in value.items())
+    # Type is included so that i.e. `1` and `True` are not considered the same filter value
+    return type(value), value
+
+
+@functools.lru_cache(maxsize=None)
+def affected_tables(table):
+    """
+    Names of tables which can be modified by writing to `table` (i.e. by `ON DELETE CASCADE` foreign keys).
+    """
+    result = set()
+    pending = [table]
+    while pending:
+        table = pending.pop()
+        if table.name in result:
+            continue
+
+        result.add(table.name)
+        for other_table in table.metadata.tables.values():
+            for column in other_table.c:
+                if any(foreign_key.column.table is table for foreign_key in column.foreign_keys):
+                    pending.append(other_table)
+
+    return frozenset(result)
+
+
+class DatastoreQueryCache:
+    """
+    Cache of serialized `datastore.query` rows (before `extend` is applied) keyed by table, filters and options.
+
+    Every entry records all the tables its result was built from (joined foreign keys and many-to-many
+    relationships) and is dropped as soon as any of them is written to.
+    """
+
+    def __init__(self, maxsize=QUERY_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.by_table = defaultdict(set)
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def key(self, table, filters, options):
+        try:
+            key = (
+                table.name, freeze(filters), options['relationships'], options['prefix'], freeze(options['order_by']),
+                options['offset'], options['limit'], options['count'],
+            )
+            hash(key)
+        except TypeError:
+            return None
+
+        return key
+
+    def get(self, key):
+        if key is None:
+            return undefined
+
+        with self.lock:
+            try:
+                value = self.entries[key]
+            except KeyError:
+                self.misses += 1
+                return undefined
+
+            self.entries.move_to_end(key)
+            self.hits += 1
+
+        return copy.deepcopy(value)
+
+    def put(self, key, tables, value, generation):
+        """
+        Store `value` unless any table was written to since `generation` was retrieved.
+        """
+        if key is None or (isinstance(value, list) and len(value) > QUERY_CACHE_MAX_ROWS):
+            return
+
+        value = copy.deepcopy(value)
+        with self.lock:
+            if generation != self.generation:
+                return
+
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            for table in tables:
+                self.by_table[table].add(key)
+
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, tables=None):
+        """
+        Drop cached results depending on any of `tables` (all cached results if `tables` is `None`).
+        """
+        with self.lock:
+            self.generation += 1
+            self.invalidations += 1
+
+            if tables is None:
+                self.entries.clear()
+                self.by_table.clear()
+                return
+
+            for table in tables:
+                for key in self.by_table.pop(table, set()):
+                    self.entries.pop(key, None)
+
+    def stats(self):
+        with self.lock:
+            return {
+                'entries': len(self.entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations,
+            }
+
+
+query_cache = DatastoreQueryCache()
+
+
+class DatastoreService(Service):
+
+    class Config:
+        private = True
+
+    def query_cache_stats(self):
+        """
+        Hit/miss counters of `datastore.query` result cache.
+        """
+        return query_cache.stats()
+
+    def query_cache_clear(self):
+        query_cache.invalidate()
@@ -1,12 +1,35 @@
+import asyncio
 from concurrent.futures import ThreadPoolExecutor
+import contextlib
+import contextvars
+import os
+import queue
 import re
+import shutil
+import sqlite3
+import time
 
 from sqlalchemy import create_engine
 
 from middlewared.service import private, Service
+from middlewared.service_exception import CallError
 
 from middlewared.plugins.config import FREENAS_DATABASE
 
+from .cache import affected_tables, query_cache
+
+# Number of read-only connections serving `datastore.fetchall` concurrently. Writes are always serialized on a
+# single connection.
+READ_POOL_SIZE = 4
+# Write-ahead log allows readers to proceed while a write transaction is in progress
+JOURNAL_MODE = 'WAL'
+# Database is only vacuumed on setup if at least this fraction of its pages is unused
+VACUUM_FREE_PAGES_RATIO = 0.25
+# Checkpoint is retried while readers prevent it from completing for at most this many seconds
+CHECKPOINT_BUSY_TIMEOUT = 5
+# Transaction opened by `datastore.bulk` in the current task
+TRANSACTION = contextvars.ContextVar('datastore_transaction', default=None)
+
 
 def regexp(expr, item):
     if item is None:
@@ -16,37 +39,258 @@ def regexp(expr, item):
     return reg.search(item) is not None
 
 
+def checkpoint_database(database=None):
+    """
+    Transfer write-ahead log contents into the database file and truncate the log so that the database file can be
+    copied or replaced safely.
+
+    No write transactions should be running when this is called (i.e. it should be called from
+    `DatastoreService.thread_pool` while holding `DatastoreService.write_lock`).
+
+    Raises `CallError` if readers do not let the checkpoint complete within `CHECKPOINT_BUSY_TIMEOUT` seconds.
+    """
+    deadline = time.monotonic() + CHECKPOINT_BUSY_TIMEOUT
+    with contextlib.closing(sqlite3.connect(database or FREENAS_DATABASE)) as conn:
+        while True:
+            busy, log, checkpointed = conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+            if not busy:
+                return
+
+            if time.monotonic() > deadline:
+                raise CallError(
+                    f'Database checkpoint did not complete: {checkpointed} of {log} write-ahead log pages transferred'
+                )
+
+            time.sleep(0.1)
+
+
+class DatastoreTransaction:
+    def __init__(self):
+        self.transaction = None
+        # `(sql, binds)` to be passed to `datastore.post_execute_write` hook as a single batch
+        self.statements = []
+        # Tables written to, `None` if unknown
+        self.tables = set()
+        # Events to be sent once transaction is committed
+        self.events = []
+
+
 class DatastoreService(Service):
 
     class Config:
         private = True
 
+    # Writer, every write goes through this executor
     thread_pool = ThreadPoolExecutor(1)
+    # Held by writes outside of a transaction and by transactions for their entire duration
+    write_lock = asyncio.Lock()
+    read_thread_pool = ThreadPoolExecutor(READ_POOL_SIZE)
 
     engine = None
     connection = None
+    read_engine = None
+    read_connections = None
+    read_connections_count = 0
 
     @private
     async def setup(self):
-        await self.middleware.run_in_executor(self.thread_pool, self._setup)
+        async with self.write_lock:
+            await self.middleware.run_in_executor(self.thread_pool, self._setup)
 
     def _setup(self):
-        if self.engine is not None:
-            self.engine.dispose()
-
-        if self.connection is not None:
-            self.connection.close()
+        self._close()
 
         self.engine = create_engine(f'sqlite:///{FREENAS_DATABASE}')
 
         self.connection = self.engine.connect()
         self.connection.connection.create_function("REGEXP", 2, regexp)
         self.connection.connection.execute("PRAGMA foreign_keys=ON")
-        self.connection.connection.execute("VACUUM")
+        self._vacuum()
+
+        # Every connection to an in-memory database would get its own empty database so all queries have to go
+        # through the writer connection
+        if FREENAS_DATABASE != ':memory:':
+            self.connection.connection.execute(f"PRAGMA journal_mode={JOURNAL_MODE}")
+            self._open_read_connections()
+
+        query_cache.invalidate()
+
+    def _vacuum(self):
+        page_count = self.connection.connection.execute("PRAGMA page_count").fetchone()[0]
+        freelist_count = self.connection.connection.execute("PRAGMA freelist_count").fetchone()[0]
+        if page_count and freelist_count / page_count >= VACUUM_FREE_PAGES_RATIO:
+            self.connection.connection.execute("VACUUM")
+
+    def _open_read_connections(self):
+        if self.read_connections is None:
+            self.read_connections = queue.Queue()
+
+        # Connections are only ever used by one thread at a time as they are handed out by `read_connections` queue
+        self.read_engine = create_engine(
+            f'sqlite:///{FREENAS_DATABASE}', connect_args={'check_same_thread': False},
+        )
+        for i in range(READ_POOL_SIZE):
+            connection = self.read_engine.connect()
+            connection.connection.create_function("REGEXP", 2, regexp)
+            connection.connection.execute("PRAGMA query_only=ON")
+            self.read_connections.put(connection)
+
+        self.read_connections_count = READ_POOL_SIZE
+
+    def _close(self):
+        # Wait for running reads to finish, database file might be replaced once we are done
+        for i in range(self.read_connections_count):
+            self.read_connections.get().close()
+        self.read_connections_count = 0
+
+        if self.read_engine is not None:
+            self.read_engine.dispose()
+            self.read_engine = None
+
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+        if self.engine is not None:
+            self.engine.dispose()
+            self.engine = None
+
+    @private
+    async def checkpoint(self):
+        """
+        Make sure the database file contains all committed transactions so it can be copied.
+        """
+        async with self.write_lock:
+            await self.middleware.run_in_executor(self.thread_pool, checkpoint_database)
+
+    @private
+    async def replace(self, path, move=False):
+        """
+        Replace the database file with `path` (which is copied unless `move` is set) and reopen it.
+
+        Write-ahead log of the current database is emptied beforehand so that it is not applied to the new file.
+        """
+        async with self.write_lock:
+            await self.middleware.run_in_executor(self.thread_pool, self._replace, path, move)
+
+    def _replace(self, path, move):
+        self._close()
+        checkpoint_database()
+
+        if move:
+            os.rename(path, FREENAS_DATABASE)
+        else:
+            shutil.copy(path, FREENAS_DATABASE)
+
+        self._setup()
+
+    @private
+    async def bulk(self, operations):
+        """
+        Run `operations` in a single transaction.
+
+        Each operation is a list of `datastore` method name (`insert`, `update` or `delete`) followed by its
+        arguments. Returns list of their results. If any of them fails, the whole transaction is rolled back.
+
+        Writes are committed at once and synced to the HA peer as a single batch, `*.query` events are coalesced
+        and sent after commit. Reads made during the transaction do not see its uncommitted writes.
+        """
+        result = []
+        async with self._transaction():
+            for method, *args in operations:
+                if method not in ('insert', 'update', 'delete'):
+                    raise ValueError(f'Invalid bulk operation: {method!r}')
+
+                result.append(await self.middleware.call(f'datastore.{method}', *args))
+
+        return result
+
+    @contextlib.asynccontextmanager
+    async def _transaction(self):
+        if TRANSACTION.get() is not None:
+            # Nested transactions are merged into the outer one
+            yield TRANSACTION.get()
+            return
+
+        transaction = DatastoreTransaction()
+        async with self.write_lock:
+            token = TRANSACTION.set(transaction)
+            try:
+                await self.middleware.run_in_executor(self.thread_pool, self._begin, transaction)
+                try:
+                    yield transaction
+                except BaseException:
+                    await self.middleware.run_in_executor(self.thread_pool, self._rollback, transaction)
+                    raise
+                else:
+                    await self.middleware.run_in_executor(self.thread_pool, self._commit, transaction)
+            finally:
+                TRANSACTION.reset(token)
+
+        if transaction.events:
+            await self.middleware.call('datastore.send_transaction_events', transaction.events)
+
+    def _begin(self, transaction):
+        transaction.transaction = self.connection.begin()
+
+    def _commit(self, transaction):
+        try:
+            transaction.transaction.commit()
+        finally:
+            query_cache.invalidate(transaction.tables)
+
+        if transaction.statements:
+            self.middleware.call_hook_inline(
+                "datastore.post_execute_write",
+                [sql for sql, binds in transaction.statements],
+                [binds for sql, binds in transaction.statements],
+                {'ha_sync': True, 'return_last_insert_rowid': False},
+            )
+
+    def _rollback(self, transaction):
+        try:
+            transaction.transaction.rollback()
+        finally:
+            # Uncommitted writes might have been read through the writer connection
+            query_cache.invalidate(transaction.tables)
 
     @private
     async def execute(self, *args):
-        return await self.middleware.run_in_executor(self.thread_pool, self.connection.execute, *args)
+        if (transaction := TRANSACTION.get()) is not None:
+            transaction.tables = None
+            return await self.middleware.run_in_executor(self.thread_pool, self.connection.execute, *args)
+
+        async with self.write_lock:
+            return await self.middleware.run_in_executor(self.thread_pool, self._execute, *args)
+
+    def _execute(self, *args):
+        try:
+            return self.connection.execute(*args)
+        finally:
+            # We do not know which tables were affected by raw SQL
+            query_cache.invalidate()
+
+    @private
+    async def execute_batch(self, queries, params):
+        """
+        Execute raw SQL `queries` (each with corresponding item of `params` as binds) in a single transaction.
+        """
+        if TRANSACTION.get() is not None:
+            TRANSACTION.get().tables = None
+            for query, binds in zip(queries, params):
+                await self.middleware.run_in_executor(self.thread_pool, self.connection.execute, query, binds)
+            return
+
+        async with self.write_lock:
+            await self.middleware.run_in_executor(self.thread_pool, self._execute_batch, queries, params)
+
+    def _execute_batch(self, queries, params):
+        try:
+            with self.connection.begin():
+                for query, binds in zip(queries, params):
+                    self.connection.execute(query, binds)
+        finally:
+            query_cache.invalidate()
 
     @private
     async def execute_write(self, stmt, options=None):
@@ -67,10 +311,22 @@ class DatastoreService(Service):
             else:
                 binds.append(value)
 
-        return await self.middleware.run_in_executor(self.thread_pool, self._execute_write, sql, binds, options)
+        if (transaction := TRANSACTION.get()) is not None:
+            return await self.middleware.run_in_executor(
+                self.thread_pool, self._execute_write_transaction, transaction, sql, binds, options,
+                affected_tables(stmt.table),
+            )
 
-    def _execute_write(self, sql, binds, options):
-        result = self.connection.execute(sql, binds)
+        async with self.write_lock:
+            return await self.middleware.run_in_executor(
+                self.thread_pool, self._execute_write, sql, binds, options, affected_tables(stmt.table),
+            )
+
+    def _execute_write(self, sql, binds, options, tables=None):
+        try:
+            result = self.connection.execute(sql, binds)
+        finally:
+            query_cache.invalidate(tables)
 
         self.middleware.call_hook_inline("datastore.post_execute_write", sql, binds, options)
 
@@ -79,13 +335,37 @@ class DatastoreService(Service):
 
         return result
 
+    def _execute_write_transaction(self, transaction, sql, binds, options, tables):
+        result = self.connection.execute(sql, binds)
+
+        if transaction.tables is not None:
+            transaction.tables |= tables
+
+        if options['ha_sync']:
+            transaction.statements.append((sql, binds))
+
+        if options['return_last_insert_rowid']:
+            return self._fetchall("SELECT last_insert_rowid()")[0][0]
+
+        return result
+
     @private
     async def fetchall(self, *args):
+        if self.read_connections_count:
+            return await self.middleware.run_in_executor(self.read_thread_pool, self._read_fetchall, *args)
+
         return await self.middleware.run_in_executor(self.thread_pool, self._fetchall, *args)
 
-    def _fetchall(self, query, params=None):
-        cursor = self.connection.execute(query, params or [])
+    def _fetchall(self, query, params=None, connection=None):
+        cursor = (connection or self.connection).execute(query, params or [])
         try:
             return cursor.fetchall()
         finally:
             cursor.close()
+
+    def _read_fetchall(self, query, params=None):
+        connection = self.read_connections.get()
+        try:
+            return self._fetchall(query, params, connection)
+        finally:
+            self.read_connections.put(connection)
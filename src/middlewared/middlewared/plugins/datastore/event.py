@@ -3,6 +3,8 @@ from collections import defaultdict
 from middlewared.schema import accepts, Dict, Str
 from middlewared.service import Service
 
+from .connection import TRANSACTION
+
 
 class DatastoreService(Service):
 
@@ -28,6 +30,10 @@ class DatastoreService(Service):
         self.middleware.event_register(f"{options['plugin']}.query", options["description"])
 
     async def send_insert_events(self, datastore, row):
+        if (transaction := TRANSACTION.get()) is not None:
+            transaction.events.append(("insert", datastore, row))
+            return
+
         for options in self.events[datastore]:
             await self._send_event(
                 options,
@@ -37,6 +43,10 @@ class DatastoreService(Service):
             )
 
     async def send_update_events(self, datastore, id):
+        if (transaction := TRANSACTION.get()) is not None:
+            transaction.events.append(("update", datastore, id))
+            return
+
         for options in self.events[datastore]:
             fields = await self._fields(options, {options["prefix"] + options["id"]: id}, False)
             if not fields:
@@ -52,6 +62,10 @@ class DatastoreService(Service):
             )
 
     async def send_delete_events(self, datastore, id):
+        if (transaction := TRANSACTION.get()) is not None:
+            transaction.events.append(("delete", datastore, id))
+            return
+
         for options in self.events[datastore]:
             await self._send_event(
                 options,
@@ -61,6 +75,22 @@ class DatastoreService(Service):
             )
             await self._send_event(options, "REMOVED", id=id)
 
+    async def send_transaction_events(self, events):
+        """
+        Send events collected during a `datastore.bulk` transaction.
+
+        Only one update event is sent for each entry (entries fields are queried when the event is sent so they
+        are up to date anyway) and update events for entries that were deleted later are dropped.
+        """
+        deleted = {(datastore, id) for type, datastore, id in events if type == "delete"}
+        last_update = {(datastore, id): i for i, (type, datastore, id) in enumerate(events) if type == "update"}
+        for i, (type, datastore, value) in enumerate(events):
+            # `value` is the inserted row for insert events and entry id otherwise
+            if type == "update" and ((datastore, value) in deleted or last_update[(datastore, value)] != i):
+                continue
+
+            await getattr(self, f"send_{type}_events")(datastore, value)
+
     async def _fields(self, options, row, get=True):
         query_options = {"get": get}
         if options.get("extra"):
@@ -1,7 +1,14 @@
 import operator
 
+from sqlalchemy import Boolean, Integer, String
+
 from .schema import SchemaMixin
 
+# Operators that behave the same in SQL as in `filter_list` (given that the value type matches the column type)
+SQL_EXPRESSIBLE_OPERATORS = ('=', 'in')
+# Longer `in` lists are better evaluated in Python than bound as that many SQL parameters
+SQL_EXPRESSIBLE_IN_VALUES = 500
+
 
 def in_(col, value):
     has_nulls = None in value
@@ -21,7 +28,52 @@ def nin(col, value):
     return expr
 
 
+def _value_matches_column_type(col, value):
+    if value is None:
+        return True
+    if isinstance(col.type, Boolean):
+        return isinstance(value, bool)
+    if isinstance(col.type, Integer):
+        return isinstance(value, int) and not isinstance(value, bool)
+    if isinstance(col.type, String):
+        return isinstance(value, str)
+    return False
+
+
 class FilterMixin(SchemaMixin):
+    def _sql_expressible_filters(self, filters, table, prefix):
+        """
+        Subset of `filters` which match exactly the same rows in SQL as they do when `filter_list` applies them
+        to the serialized rows.
+        """
+        rv = []
+        for f in filters:
+            if not isinstance(f, (list, tuple)) or len(f) != 3:
+                continue
+
+            name, op, value = f
+            if op not in SQL_EXPRESSIBLE_OPERATORS or not isinstance(name, str) or '.' in name or '__' in name:
+                continue
+
+            try:
+                col = self._get_col(table, name, prefix)
+            except KeyError:
+                continue
+
+            # Foreign keys are serialized as the related row and the column must be serialized under `name`
+            serialized_name = col.name[len(prefix):] if prefix and col.name.startswith(prefix) else col.name
+            if col.foreign_keys or serialized_name != name:
+                continue
+
+            values = value if op == 'in' else [value]
+            if not isinstance(values, (list, tuple)) or len(values) > SQL_EXPRESSIBLE_IN_VALUES:
+                continue
+
+            if all(_value_matches_column_type(col, v) for v in values):
+                rv.append(f)
+
+        return rv
+
     def _filters_to_queryset(self, filters, table, prefix, aliases):
         opmap = {
             '=': operator.eq,
@@ -10,7 +10,9 @@ from sqlalchemy.sql.operators import desc_op, nullsfirst_op, nullslast_op
 from middlewared.schema import accepts, Bool, Dict, Int, List, Ref, Str
 from middlewared.service import Service
 from middlewared.service_exception import MatchNotFound
+from middlewared.utils.lang import undefined
 
+from .cache import query_cache
 from .filter import FilterMixin
 from .schema import SchemaMixin
 
@@ -25,6 +27,8 @@ class DatastoreService(Service, FilterMixin, SchemaMixin):
     class Config:
         private = True
 
+    dependencies = {}
+
     @accepts(
         Str('name'),
         List('query-filters', register=True),
@@ -82,6 +86,34 @@ class DatastoreService(Service, FilterMixin, SchemaMixin):
         # which might happen with "prefix"
         options = options.copy()
 
+        cache_key = query_cache.key(table, filters, options)
+        result = query_cache.get(cache_key)
+        if result is undefined:
+            generation = query_cache.generation
+            result = await self._query_rows(table, filters, options)
+            if table not in self.dependencies:
+                self.dependencies[table] = self._get_dependencies(table)
+            query_cache.put(cache_key, self.dependencies[table], result, generation)
+
+        if options['count']:
+            return result
+
+        result = await self._queryset_extend(
+            result, options['extend'], options['extend_context'], options['select'], options['extra'],
+        )
+
+        if options['get']:
+            try:
+                return result[0]
+            except IndexError:
+                raise MatchNotFound() from None
+
+        return result
+
+    async def _query_rows(self, table, filters, options):
+        """
+        Query serialized rows of `table` (or their count) without extending them.
+        """
         aliases = {}
         if options['count']:
             qs = select([func.count(self._get_pk(table))])
@@ -161,19 +193,20 @@ class DatastoreService(Service, FilterMixin, SchemaMixin):
             # This will only fetch many-to-many relationships for primary table, not for joins, but that's enough
             relationships = await self._fetch_many_to_many(table, result)
 
-        result = await self._queryset_serialize(
-            result,
-            table, aliases, relationships, options['extend'], options['extend_context'], options['prefix'],
-            options['select'], options['extra'],
-        )
+        return [
+            self._serialize(row, table, aliases, relationships[i], options['prefix'])
+            for i, row in enumerate(result)
+        ]
 
-        if options['get']:
-            try:
-                return result[0]
-            except IndexError:
-                raise MatchNotFound() from None
+    @accepts(Str('name'), Ref('query-filters'), Str('prefix', null=True, default=None))
+    async def sql_filters(self, name, filters, prefix):
+        """
+        Subset of `filters` that can be passed to `datastore.query` for `name` without changing which rows match.
 
-        return result
+        Services that filter extended rows can narrow the rows in SQL with these and still apply all of `filters` to
+        the extended result.
+        """
+        return self._sql_expressible_filters(filters, self._get_table(name), prefix)
 
     @accepts(Str('name'), Ref('query-options'))
     async def config(self, name, options):
@@ -201,13 +234,32 @@ class DatastoreService(Service, FilterMixin, SchemaMixin):
 
         return result
 
-    async def _queryset_serialize(
-        self, qs, table, aliases, relationships, extend, extend_context, field_prefix, select, extra_options,
-    ):
-        rows = []
-        for i, row in enumerate(qs):
-            rows.append(self._serialize(row, table, aliases, relationships[i], field_prefix))
+    def _get_dependencies(self, table, dependencies=None):
+        """
+        Names of all tables `datastore.query` results for `table` are built from.
+        """
+        if dependencies is None:
+            dependencies = set()
+
+        table = table.original if isinstance(table, Alias) else table
+        if table.name in dependencies:
+            return dependencies
+
+        dependencies.add(table.name)
+        for foreign_key in self._get_queryset_joins(table):
+            self._get_dependencies(foreign_key.column.table, dependencies)
+
+        try:
+            relationships = self._get_relationships(table)
+        except RuntimeError:
+            relationships = {}
+        for relationship in relationships.values():
+            dependencies.add(relationship.secondary.name)
+            self._get_dependencies(relationship.target, dependencies)
+
+        return dependencies
 
+    async def _queryset_extend(self, rows, extend, extend_context, select, extra_options):
         if extend_context:
             extend_context_value = await self.middleware.call(extend_context, rows, extra_options)
         else:
@@ -35,7 +35,10 @@ class DatastoreService(Service, SchemaMixin):
     @private
     async def sql(self, query, *args):
         try:
-            if query.strip().split()[0].upper() == 'SELECT':
+            if isinstance(query, list):
+                # Transaction synced by `datastore.bulk` as a single HA journal entry
+                await self.middleware.call('datastore.execute_batch', query, *args)
+            elif query.strip().split()[0].upper() == 'SELECT':
                 return [dict(row) for row in await self.middleware.call('datastore.fetchall', query, *args)]
             else:
                 await self.middleware.call('datastore.execute', query, *args)
@@ -1,7 +1,7 @@
 from sqlalchemy import and_, types
 from sqlalchemy.sql import sqltypes
 
-from middlewared.schema import accepts, Any, Bool, Dict, Str
+from middlewared.schema import accepts, Any, Bool, Dict, List, Str
 from middlewared.service import Service
 
 from .filter import FilterMixin
@@ -131,6 +131,44 @@ class DatastoreService(Service, FilterMixin, SchemaMixin):
 
         return id
 
+    @accepts(
+        Str('name'),
+        List('rows', items=[Dict('row', additional_attrs=True)]),
+        Dict(
+            'options',
+            Bool('ha_sync', default=True),
+            Str('prefix', default=''),
+            Bool('send_events', default=True),
+        ),
+    )
+    async def insert_many(self, name, rows, options):
+        """
+        Insert multiple entries to `name` in a single transaction (see `datastore.bulk`).
+
+        Returns list of primary keys of inserted entries.
+        """
+        return await self.middleware.call('datastore.bulk', [['insert', name, row, options] for row in rows])
+
+    @accepts(
+        Str('name'),
+        List('updates', items=[List('update', items=[Any('id_or_filters'), Dict('data', additional_attrs=True)])]),
+        Dict(
+            'options',
+            Bool('ha_sync', default=True),
+            Str('prefix', default=''),
+            Bool('send_events', default=True),
+        ),
+    )
+    async def update_many(self, name, updates, options):
+        """
+        Update multiple entries in `name` in a single transaction (see `datastore.bulk`).
+
+        `updates` is a list of `[id_or_filters, data]` pairs. Returns list of updated entries ids.
+        """
+        return await self.middleware.call(
+            'datastore.bulk', [['update', name, id_or_filters, data, options] for id_or_filters, data in updates],
+        )
+
     def _extract_relationships(self, table, prefix, data):
         relationships = self._get_relationships(table)
 
@@ -1,4 +1,5 @@
 import re
+import threading
 
 import libsgio
 import pyudev
@@ -8,6 +9,7 @@ from middlewared.service import accepts, private, Service
 from middlewared.utils.gpu import get_gpus
 from middlewared.utils.serial import serial_port_choices
 from middlewared.utils.functools import cache
+from middlewared.plugins.disk_.disk_info import get_partition_for_disk
 from middlewared.plugins.disk_.enums import DISKS_TO_IGNORE
 
 RE_NVME_PRIV = re.compile(r'nvme[0-9]+c')
@@ -16,6 +18,15 @@ RE_NVME_PRIV = re.compile(r'nvme[0-9]+c')
 class DeviceService(Service):
 
     DISK_ROTATION_ERROR_LOG_CACHE = set()
+    # Rotation rate does not change for a disk, keep it by disk serial so that its SG_IO probe is done only once
+    DISK_ROTATION_RATE_CACHE = {}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Disk name -> `get_disk_details` (with partitions) of all the disks. It is populated on first use and then
+        # kept up to date by `disk_event`.
+        self.disk_inventory = None
+        self.disk_inventory_lock = threading.Lock()
 
     @private
     @cache
@@ -28,19 +39,79 @@ class DeviceService(Service):
 
     @private
     def get_disks(self, get_partitions=False):
+        with self.disk_inventory_lock:
+            if self.disk_inventory is None:
+                self.disk_inventory = self._list_disks()
+
+            return {
+                name: self._disk_copy(disk, get_partitions) for name, disk in self.disk_inventory.items()
+            }
+
+    def _list_disks(self):
         ctx = pyudev.Context()
         disks = {}
         for dev in ctx.list_devices(subsystem='block', DEVTYPE='disk'):
-            if dev.sys_name.startswith(DISKS_TO_IGNORE) or RE_NVME_PRIV.match(dev.sys_name):
+            if self._ignore_disk(dev.sys_name):
                 continue
 
             try:
-                disks[dev.sys_name] = self.get_disk_details(ctx, dev, get_partitions)
+                disks[dev.sys_name] = self.get_disk_details(ctx, dev, True)
             except Exception:
                 self.logger.debug('Failed to retrieve disk details for %s', dev.sys_name, exc_info=True)
 
         return disks
 
+    def _ignore_disk(self, name):
+        return name.startswith(DISKS_TO_IGNORE) or RE_NVME_PRIV.match(name)
+
+    def _disk_copy(self, disk, get_partitions):
+        # `parts` is the only attribute that is not a scalar
+        return {**disk, 'parts': [part.copy() for part in disk['parts']] if get_partitions else []}
+
+    @private
+    def disk_event(self, action, name, devtype, devpath):
+        """
+        Update disk inventory with udev `action` for block device `name` of type `devtype` at `devpath`.
+        """
+        if devtype == 'partition':
+            # Partition table of its disk has changed, looks like `/devices/.../block/sda/sda1`
+            name = devpath.rstrip('/').split('/')[-2]
+            action = 'change'
+        elif devtype != 'disk':
+            return
+
+        if self._ignore_disk(name):
+            return
+
+        with self.disk_inventory_lock:
+            if self.disk_inventory is None:
+                return
+
+            if action == 'move':
+                # We don't know what the disk was called before, list all of them again on next use
+                self.disk_inventory = None
+            elif action == 'remove':
+                self.disk_inventory.pop(name, None)
+            else:
+                ctx = pyudev.Context()
+                try:
+                    self.disk_inventory[name] = self.get_disk_details(
+                        ctx, pyudev.Devices.from_name(ctx, 'block', name), True,
+                    )
+                except pyudev.DeviceNotFoundByNameError:
+                    self.disk_inventory.pop(name, None)
+                except Exception:
+                    self.logger.debug('Failed to retrieve disk details for %s', name, exc_info=True)
+                    self.disk_inventory.pop(name, None)
+
+    @private
+    def reset_disk_inventory(self):
+        """
+        Disk inventory might have missed udev events, it will be populated again on next use.
+        """
+        with self.disk_inventory_lock:
+            self.disk_inventory = None
+
     @private
     def get_disk_partitions(self, dev, lss):
         parts = []
@@ -48,7 +119,7 @@ class DeviceService(Service):
         parent = dev.sys_name
         for i in filter(lambda x: all(x.get(k) for k in keys), dev.children):
             part_num = int(i['ID_PART_ENTRY_NUMBER'])
-            part_name = self.middleware.call_sync('disk.get_partition_for_disk', parent, part_num)
+            part_name = get_partition_for_disk(parent, part_num)
             part = {
                 'name': part_name,
                 'id': part_name,
@@ -123,7 +194,7 @@ class DeviceService(Service):
 
         if self.safe_retrieval(dev.attributes, 'queue/rotational', None) == '1':
             disk['type'] = 'HDD'
-            disk['rotationrate'] = self._get_rotation_rate(f'/dev/{dev.sys_name}')
+            disk['rotationrate'] = self._get_cached_rotation_rate(disk['serial'], f'/dev/{dev.sys_name}')
         else:
             disk['type'] = 'SSD'
             disk['rotationrate'] = None
@@ -183,6 +254,10 @@ class DeviceService(Service):
 
     @private
     def get_disk(self, name):
+        with self.disk_inventory_lock:
+            if self.disk_inventory is not None and name in self.disk_inventory:
+                return self._disk_copy(self.disk_inventory[name], False)
+
         context = pyudev.Context()
         try:
             block_device = pyudev.Devices.from_name(context, 'block', name)
@@ -213,6 +288,22 @@ class DeviceService(Service):
 
         return type, rotation_rate
 
+    def _get_cached_rotation_rate(self, serial, device_path):
+        if not serial:
+            return self._get_rotation_rate(device_path)
+
+        try:
+            return self.DISK_ROTATION_RATE_CACHE[serial]
+        except KeyError:
+            pass
+
+        rotation_rate = self._get_rotation_rate(device_path)
+        if device_path not in self.DISK_ROTATION_ERROR_LOG_CACHE:
+            # Only remember successful probes
+            self.DISK_ROTATION_RATE_CACHE[serial] = rotation_rate
+
+        return rotation_rate
+
     def _get_rotation_rate(self, device_path):
         try:
             disk = libsgio.SCSIDevice(device_path)
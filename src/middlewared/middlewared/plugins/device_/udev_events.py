@@ -24,7 +24,15 @@ def udev_events(middleware):
             monitor = pyudev.Monitor.from_netlink(context)
             monitor.filter_by(subsystem='block')
             monitor.filter_by(subsystem='net')
+            # Events might have been missed while we were not monitoring
+            middleware.call_sync('device.reset_disk_inventory')
             for device in iter(monitor.poll, None):
+                if device.subsystem == 'block':
+                    # Disk inventory must be up to date before hooks (i.e. `disk.sync`) query it
+                    middleware.call_sync(
+                        'device.disk_event', device.action, device.sys_name, device.device_type, device.device_path,
+                    )
+
                 middleware.call_hook_sync(
                     f'udev.{device.subsystem}', data={**dict(device), 'SYS_NAME': device.sys_name}
                 )
@@ -5,6 +5,15 @@ import pyudev
 from middlewared.service import CallError, private, Service
 
 
+def get_partition_for_disk(disk, partition):
+    if disk.startswith(('nvme', 'pmem')):
+        # FIXME: This is a hack for nvme/pmem disks, however let's please come up with a better way
+        # to link disks with their partitions
+        return f'{disk}p{partition}'
+    else:
+        return f'{disk}{partition}'
+
+
 class DiskService(Service):
 
     @private
@@ -141,9 +150,4 @@ class DiskService(Service):
 
     @private
     def get_partition_for_disk(self, disk, partition):
-        if disk.startswith(('nvme', 'pmem')):
-            # FIXME: This is a hack for nvme/pmem disks, however let's please come up with a better way
-            # to link disks with their partitions
-            return f'{disk}p{partition}'
-        else:
-            return f'{disk}{partition}'
+        return get_partition_for_disk(disk, partition)
@@ -131,6 +131,8 @@ class DiskService(Service, ServiceChangeMixin):
 
         uuids = self.middleware.call_sync('disk.get_valid_zfs_partition_type_uuids')
         options = {'send_events': False, 'ha_sync': False}
+        # Database changes are written in bulk, one transaction for each of the loops below
+        operations = []
         seen_disks = {}
         changed = set()
         deleted = set()
@@ -150,9 +152,7 @@ class DiskService(Service, ServiceChangeMixin):
                 # 2. or can't translate device to identifier
                 if not disk['disk_expiretime']:
                     disk['disk_expiretime'] = datetime.utcnow() + timedelta(days=self.DISK_EXPIRECACHE_DAYS)
-                    self.middleware.call_sync(
-                        'datastore.update', 'storage.disk', disk['disk_identifier'], disk, options
-                    )
+                    operations.append(['update', 'storage.disk', disk['disk_identifier'], disk, options])
                     changed.add(disk['disk_identifier'])
                 elif disk['disk_expiretime'] < datetime.utcnow():
                     # Disk expire time has surpassed, go ahead and remove it
@@ -161,7 +161,7 @@ class DiskService(Service, ServiceChangeMixin):
                             'kmip.reset_sed_disk_password', disk['disk_identifier'], disk['disk_kmip_uuid'],
                             background=True
                         )
-                    self.middleware.call_sync('datastore.delete', 'storage.disk', disk['disk_identifier'], options)
+                    operations.append(['delete', 'storage.disk', disk['disk_identifier'], options])
                     deleted.add(disk['disk_identifier'])
                 continue
             else:
@@ -179,18 +179,15 @@ class DiskService(Service, ServiceChangeMixin):
                 disk['disk_expiretime'] = datetime.utcnow() + timedelta(days=self.DISK_EXPIRECACHE_DAYS)
 
             if self._disk_changed(disk, original_disk):
-                self.middleware.call_sync('datastore.update', 'storage.disk', disk['disk_identifier'], disk, options)
+                operations.append(['update', 'storage.disk', disk['disk_identifier'], disk, options])
                 changed.add(disk['disk_identifier'])
 
-            try:
-                self.middleware.call_sync('enclosure.sync_disk', disk['disk_identifier'], encs)
-            except Exception:
-                self.logger.error(
-                    'Unhandled exception in enclosure.sync_disk for %r', disk['disk_identifier'], exc_info=True
-                )
-
             seen_disks[name] = disk
 
+        self._sync_all_flush(operations, [disk['disk_identifier'] for disk in seen_disks.values()], encs)
+
+        operations = []
+        synced_disks = []
         qs = None
         progress_percent = 70
         for name in filter(lambda x: x not in seen_disks, sys_disks):
@@ -217,20 +214,15 @@ class DiskService(Service, ServiceChangeMixin):
 
             if not new:
                 if self._disk_changed(disk, original_disk):
-                    self.middleware.call_sync(
-                        'datastore.update', 'storage.disk', disk['disk_identifier'], disk, options
-                    )
+                    operations.append(['update', 'storage.disk', disk['disk_identifier'], disk, options])
                     changed.add(disk['disk_identifier'])
             else:
-                self.middleware.call_sync('datastore.insert', 'storage.disk', disk, options)
+                operations.append(['insert', 'storage.disk', disk, options])
                 changed.add(disk['disk_identifier'])
 
-            try:
-                self.middleware.call_sync('enclosure.sync_disk', disk['disk_identifier'], encs)
-            except Exception:
-                self.logger.error(
-                    'Unhandled exception in enclosure.sync_disk for %r', disk['disk_identifier'], exc_info=True
-                )
+            synced_disks.append(disk['disk_identifier'])
+
+        self._sync_all_flush(operations, synced_disks, encs)
 
         if dif_formatted_disks:
             self.middleware.call_sync('alert.oneshot_create', 'DifFormatted', dif_formatted_disks)
@@ -263,6 +255,16 @@ class DiskService(Service, ServiceChangeMixin):
         job.set_progress(100, 'Syncing all disks complete')
         return 'OK'
 
+    def _sync_all_flush(self, operations, identifiers, encs):
+        if operations:
+            self.middleware.call_sync('datastore.bulk', operations)
+
+        for identifier in identifiers:
+            try:
+                self.middleware.call_sync('enclosure.sync_disk', identifier, encs)
+            except Exception:
+                self.logger.error('Unhandled exception in enclosure.sync_disk for %r', identifier, exc_info=True)
+
     def _disk_changed(self, disk, original_disk):
         # storage_disk.disk_size is a string
         return dict(disk, disk_size=None if disk.get('disk_size') is None else str(disk['disk_size'])) != original_disk
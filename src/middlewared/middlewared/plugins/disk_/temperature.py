@@ -1,16 +1,12 @@
-import asyncio
 import os
 import re
 import subprocess
 import time
 import math
 
-import async_timeout
-
 from middlewared.common.smart.smartctl import SMARTCTL_POWERMODES
 from middlewared.schema import Bool, Dict, Int, returns
 from middlewared.service import accepts, List, private, Ref, Service, Str
-from middlewared.utils.asyncio_ import asyncio_map
 from middlewared.utils.itertools import grouper
 
 
@@ -101,9 +97,8 @@ class DiskService(Service):
 
     @private
     async def temperature_uncached(self, name, powermode):
-        output = await self.middleware.call('disk.smartctl', name, ['-a', '-n', powermode.lower()], {'silent': True})
-        if output is not None:
-            return get_temperature(output)
+        if entry := await self.middleware.call('smart.collection.refresh', name, powermode):
+            return entry['temperature']
 
     @private
     async def reset_temperature_cache(self):
@@ -132,6 +127,8 @@ class DiskService(Service):
         Returns temperatures for a list of devices (runs in parallel).
         See `disk.temperature` documentation for more details.
         If `only_cached` is specified then this method only returns disk temperatures that exist in cache.
+
+        Temperatures are read from S.M.A.R.T. data snapshot that is shared with S.M.A.R.T. test results.
         """
         if len(names) == 0:
             names = await self.disks_for_temperature_monitoring()
@@ -146,14 +143,21 @@ class DiskService(Service):
                 )
             }
 
-        async def temperature(name):
-            try:
-                async with async_timeout.timeout(15):
-                    return await self.middleware.call('disk.temperature', name, options)
-            except asyncio.TimeoutError:
-                return None
-
-        return dict(zip(names, await asyncio_map(temperature, names, 8)))
+        snapshot = await self.middleware.call('smart.collection.get', names, {
+            'max_age': options['cache'],
+            'powermode': options['powermode'],
+            'timeout': 15,
+        })
+
+        temperatures = {}
+        for name, entry in snapshot.items():
+            if entry is None:
+                temperatures[name] = None
+            else:
+                temperatures[name] = entry['temperature']
+                self.cache[name] = (entry['temperature'], entry['collected_at'])
+
+        return temperatures
 
     @private
     def get_temp_value(self, value):
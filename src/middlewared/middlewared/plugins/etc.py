@@ -7,11 +7,15 @@ from middlewared.utils.mako import get_template
 
 import asyncio
 from collections import defaultdict
-import imp
+import copy
+import importlib.util
 import os
 import stat
+import time
 
 DEFAULT_ETC_PERMS = 0o644
+# Maximum number of groups generated concurrently by `etc.generate_checkpoint`
+CHECKPOINT_CONCURRENCY = 8
 
 
 class FileShouldNotExist(Exception):
@@ -22,13 +26,26 @@ class MakoRenderer(object):
 
     def __init__(self, service):
         self.service = service
+        # Compiled templates by path, reused until the template file changes
+        self.templates = {}
+
+    def get_template(self, path):
+        mtime = os.stat(f'{path}.mako').st_mtime_ns
+        cached = self.templates.get(path)
+        if cached is None or cached[0] != mtime:
+            # Get the template by its relative path
+            cached = mtime, get_template(
+                os.path.relpath(path, os.path.dirname(os.path.dirname(__file__))) + ".mako"
+            )
+            self.templates[path] = cached
+
+        return cached[1]
 
     async def render(self, path, ctx):
         try:
             # Mako is not asyncio friendly so run it within a thread
             def do():
-                # Get the template by its relative path
-                tmpl = get_template(os.path.relpath(path, os.path.dirname(os.path.dirname(__file__))) + ".mako")
+                tmpl = self.get_template(path)
 
                 # Render the template
                 return tmpl.render(
@@ -54,11 +71,24 @@ class PyRenderer(object):
 
     def __init__(self, service):
         self.service = service
+        # Loaded modules by path, reused until the module file changes
+        self.modules = {}
+
+    def get_module(self, path):
+        mtime = os.stat(f'{path}.py').st_mtime_ns
+        cached = self.modules.get(path)
+        if cached is None or cached[0] != mtime:
+            # Modules are not registered in `sys.modules` so that renderers sharing a file name do not clash
+            spec = importlib.util.spec_from_file_location(os.path.basename(path), f'{path}.py')
+            mod = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(mod)
+            cached = mtime, mod
+            self.modules[path] = cached
+
+        return cached[1]
 
     async def render(self, path, ctx):
-        name = os.path.basename(path)
-        find = imp.find_module(name, [os.path.dirname(path)])
-        mod = imp.load_module(name, *find)
+        mod = self.get_module(path)
         args = [self.service, self.service.middleware]
         if ctx is not None:
             args.append(ctx)
@@ -359,15 +389,33 @@ class EtcService(Service):
             'mako': MakoRenderer(self),
             'py': PyRenderer(self),
         }
+        self.timings = {}
+
+    async def gather_ctx(self, methods, ctx_cache=None):
+        """
+        Call context `methods` concurrently.
+
+        `ctx_cache` is shared by groups generated within a single checkpoint so that each distinct call is only
+        made once.
+        """
+        shared = ctx_cache is not None
+        if not shared:
+            ctx_cache = {}
 
-    async def gather_ctx(self, methods):
-        rv = {}
+        calls = []
         for m in methods:
             method = m['method']
             args = m.get('args', [])
-            rv[method] = await self.middleware.call(method, *args)
+            key = method, repr(args)
+            if key not in ctx_cache:
+                ctx_cache[key] = asyncio.ensure_future(self.middleware.call(method, *args))
+            calls.append((method, ctx_cache[key]))
 
-        return rv
+        results = await asyncio.gather(*[asyncio.shield(fut) for method, fut in calls])
+        if shared:
+            # Results are shared with other groups, renderers must be free to modify their context
+            results = copy.deepcopy(results)
+        return {method: result for (method, fut), result in zip(calls, results)}
 
     def set_etc_file_perms(self, fd, entry):
         perm_changed = False
@@ -417,72 +465,126 @@ class EtcService(Service):
         return perms_changed or contents_changed
 
     async def generate(self, name, checkpoint=None):
+        await self._generate(name, checkpoint)
+
+    async def _generate(self, name, checkpoint=None, ctx_cache=None):
         group = self.GROUPS.get(name)
         if group is None:
             raise ValueError('{0} group not found'.format(name))
 
         async with self.LOCKS[name]:
+            started_at = time.monotonic()
+
             if isinstance(group, dict):
-                ctx = await self.gather_ctx(group['ctx'])
                 entries = group['entries']
             else:
-                ctx = None
                 entries = group
 
-            for entry in entries:
-                renderer = self._renderers.get(entry['type'])
-                if renderer is None:
-                    raise ValueError(f'Unknown type: {entry["type"]}')
+            entries = [entry for entry in entries if self._entry_selected(entry, checkpoint)]
+            if not entries:
+                return
 
-                if 'platform' in entry and entry['platform'].upper() != osc.SYSTEM:
+            if isinstance(group, dict):
+                ctx = await self.gather_ctx(group['ctx'], ctx_cache)
+            else:
+                ctx = None
+
+            # Mako templates are rendered concurrently while python renderers (which may have side effects other
+            # entries depend on) are run one after another in the order they are listed
+            batch = []
+            for entry in entries:
+                if entry['type'] == 'mako':
+                    batch.append(entry)
                     continue
 
-                if checkpoint:
-                    checkpoint_system = f'checkpoint_{osc.SYSTEM.lower()}'
-                    if checkpoint_system in entry:
-                        entry_checkpoint = entry[checkpoint_system]
-                    else:
-                        entry_checkpoint = entry.get('checkpoint', 'initial')
-                    if entry_checkpoint != checkpoint:
-                        continue
-
-                path = os.path.join(self.files_dir, entry.get('local_path') or entry['path'])
-                entry_path = entry['path']
-                if entry_path.startswith('local/'):
-                    entry_path = entry_path[len('local/'):]
-                outfile = f'/etc/{entry_path}'
+                await asyncio.gather(*[self._generate_entry(e, ctx) for e in batch])
+                batch = []
+                await self._generate_entry(entry, ctx)
+            await asyncio.gather(*[self._generate_entry(e, ctx) for e in batch])
+
+            timing = self.timings.setdefault(name, {'count': 0, 'total_time': 0, 'max_time': 0})
+            duration = time.monotonic() - started_at
+            timing['count'] += 1
+            timing['total_time'] += duration
+            timing['max_time'] = max(timing['max_time'], duration)
+            timing['last_time'] = duration
+            timing['last_checkpoint'] = checkpoint
+
+    def _entry_selected(self, entry, checkpoint):
+        if entry['type'] not in self._renderers:
+            raise ValueError(f'Unknown type: {entry["type"]}')
+
+        if 'platform' in entry and entry['platform'].upper() != osc.SYSTEM:
+            return False
+
+        if checkpoint:
+            checkpoint_system = f'checkpoint_{osc.SYSTEM.lower()}'
+            if checkpoint_system in entry:
+                entry_checkpoint = entry[checkpoint_system]
+            else:
+                entry_checkpoint = entry.get('checkpoint', 'initial')
+            if entry_checkpoint != checkpoint:
+                return False
 
-                try:
-                    rendered = await renderer.render(path, ctx)
-                except FileShouldNotExist:
-                    try:
-                        await self.middleware.run_in_thread(os.unlink, outfile)
-                        self.logger.debug(f'{entry["type"]}:{entry["path"]} file removed.')
-                    except FileNotFoundError:
-                        pass
+        return True
 
-                    continue
-                except Exception:
-                    self.logger.error(f'Failed to render {entry["type"]}:{entry["path"]}', exc_info=True)
-                    continue
+    async def _generate_entry(self, entry, ctx):
+        renderer = self._renderers[entry['type']]
 
-                if rendered is None:
-                    continue
+        path = os.path.join(self.files_dir, entry.get('local_path') or entry['path'])
+        entry_path = entry['path']
+        if entry_path.startswith('local/'):
+            entry_path = entry_path[len('local/'):]
+        outfile = f'/etc/{entry_path}'
+
+        try:
+            rendered = await renderer.render(path, ctx)
+        except FileShouldNotExist:
+            try:
+                await self.middleware.run_in_thread(os.unlink, outfile)
+                self.logger.debug(f'{entry["type"]}:{entry["path"]} file removed.')
+            except FileNotFoundError:
+                pass
 
-                changes = await self.middleware.run_in_thread(self.make_changes, outfile, entry, rendered)
+            return
+        except Exception:
+            self.logger.error(f'Failed to render {entry["type"]}:{entry["path"]}', exc_info=True)
+            return
 
-                if not changes:
-                    self.logger.debug(f'No new changes for {outfile}')
+        if rendered is None:
+            return
+
+        changes = await self.middleware.run_in_thread(self.make_changes, outfile, entry, rendered)
+
+        if not changes:
+            self.logger.debug(f'No new changes for {outfile}')
 
     async def generate_checkpoint(self, checkpoint):
         if checkpoint not in await self.get_checkpoints():
             raise CallError(f'"{checkpoint}" not recognised')
 
-        for name in self.GROUPS.keys():
-            try:
-                await self.generate(name, checkpoint)
-            except Exception:
-                self.logger.error(f'Failed to generate {name} group', exc_info=True)
+        started_at = time.monotonic()
+        ctx_cache = {}
+        semaphore = asyncio.Semaphore(CHECKPOINT_CONCURRENCY)
+
+        async def generate(name):
+            async with semaphore:
+                try:
+                    await self._generate(name, checkpoint, ctx_cache)
+                except Exception:
+                    self.logger.error(f'Failed to generate {name} group', exc_info=True)
+
+        await asyncio.gather(*[generate(name) for name in self.GROUPS.keys()])
+        self.logger.debug('Generated %r checkpoint in %.2f seconds', checkpoint, time.monotonic() - started_at)
+
+    async def generate_stats(self):
+        """
+        Render timings (in seconds) of each group generated since middleware start.
+        """
+        return {
+            name: {**timing, 'mean_time': timing['total_time'] / timing['count']}
+            for name, timing in self.timings.items()
+        }
 
     async def get_checkpoints(self):
         return self.checkpoints
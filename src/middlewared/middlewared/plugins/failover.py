@@ -19,7 +19,7 @@ from middlewared.service import (
 import middlewared.sqlalchemy as sa
 from middlewared.plugins.auth import AuthService, SessionManagerCredentials
 from middlewared.plugins.config import FREENAS_DATABASE
-from middlewared.plugins.datastore.connection import DatastoreService
+from middlewared.plugins.datastore.connection import DatastoreService, checkpoint_database
 from middlewared.utils.contextlib import asyncnullcontext
 from middlewared.plugins.failover_.zpool_cachefile import ZPOOL_CACHE_FILE, ZPOOL_CACHE_FILE_OVERWRITE
 
@@ -377,23 +377,26 @@ class FailoverService(ConfigService):
 
     @private
     async def send_database(self):
-        await self.middleware.run_in_executor(DatastoreService.thread_pool, self._send_database)
+        # Until the database is received by the remote node an item that we put into `SQL_QUEUE` must be the last one
+        # so no one is allowed to write neither to the database nor to the journal (this is the same lock
+        # `datastore.checkpoint` holds, it can't be called here as it would acquire it again).
+        async with DatastoreService.write_lock:
+            await self.middleware.run_in_executor(DatastoreService.thread_pool, self._prepare_send_database)
 
-    def _send_database(self):
-        # We are in the `DatastoreService` thread so until the end of this method an item that we put into `SQL_QUEUE`
-        # will be the last one and no one else is able to write neither to the database nor to the journal.
+            token = await self.middleware.call('failover.call_remote', 'auth.generate_token')
+            await self.middleware.call('failover.sendfile', token, FREENAS_DATABASE, FREENAS_DATABASE + '.sync')
+            await self.middleware.call('failover.call_remote', 'failover.receive_database')
 
+    def _prepare_send_database(self):
         # Journal thread will see that this is special value and will clear journal.
         SQL_QUEUE.put(None)
 
-        token = self.middleware.call_sync('failover.call_remote', 'auth.generate_token')
-        self.middleware.call_sync('failover.sendfile', token, FREENAS_DATABASE, FREENAS_DATABASE + '.sync')
-        self.middleware.call_sync('failover.call_remote', 'failover.receive_database')
+        # Make sure the database file we are going to send contains all the committed transactions
+        checkpoint_database()
 
     @private
     def receive_database(self):
-        os.rename(FREENAS_DATABASE + '.sync', FREENAS_DATABASE)
-        self.middleware.call_sync('datastore.setup')
+        self.middleware.call_sync('datastore.replace', FREENAS_DATABASE + '.sync', True)
 
     @private
     def send_small_file(self, path, dest=None):
@@ -1,20 +1,27 @@
 from asyncio import ensure_future
-from pickle import dump, load
-from os import rename
+from pickle import dumps, loads, PROTO
+from collections import deque
 from errno import ECONNREFUSED, ECONNRESET
 from queue import Queue, Empty
 from threading import Thread
 from logging import getLogger
 from contextlib import suppress
-from time import sleep
+from struct import Struct
+from zlib import crc32
+import os
+import time
 from prctl import set_name
 
-from middlewared.service import CallError
+from middlewared.service import CallError, Service
 from middlewared.plugins.failover_.journal_exceptions import UnableToDetermineOSVersion, OSVersionMismatch
 
 logger = getLogger(__name__)
 SQL_QUEUE = Queue()
 JOURNAL_THREAD = None
+# Maximum number of statements replayed on the other node with a single call (in a single transaction)
+JOURNAL_BATCH_SIZE = 500
+# Length and CRC32 of the pickled record that follows
+JOURNAL_RECORD_HEADER = Struct('!II')
 
 
 class JournalSync:
@@ -26,6 +33,7 @@ class JournalSync:
         self._update_failover_status()
 
         self.last_query_failed = False  # this only affects logging
+        self.last_sync = None
 
     def process(self):
         if self.failover_status != 'MASTER':
@@ -76,16 +84,17 @@ class JournalSync:
 
     def _flush_journal(self):
         while self.journal:
-            query, params = self.journal.peek()
+            count, queries, params = self.journal.peek_batch()
 
             try:
-                self.middleware.call_sync('failover.call_remote', 'datastore.sql', [query, params])
+                # The other node runs the whole batch in a single transaction
+                self.middleware.call_sync('failover.call_remote', 'datastore.sql', [queries, params])
             except Exception as e:
                 if isinstance(e, CallError) and e.errno in [ECONNREFUSED, ECONNRESET]:
                     logger.trace('Skipping journal sync, node down')
                 else:
                     if not self.last_query_failed:
-                        logger.exception('Failed to run query %s: %r', query, e)
+                        logger.exception('Failed to run queries %s: %r', queries, e)
                         self.last_query_failed = True
 
                     self.middleware.call_sync('alert.oneshot_create', 'FailoverSyncFailed', None)
@@ -96,10 +105,19 @@ class JournalSync:
 
                 self.middleware.call_sync('alert.oneshot_delete', 'FailoverSyncFailed', None)
 
-                self.journal.shift()
+                self.journal.shift(count)
+                self.last_sync = time.time()
 
         return True
 
+    def stats(self):
+        return {
+            **self.journal.lag(),
+            'failover_status': self.failover_status,
+            'last_sync': self.last_sync,
+            'last_query_failed': self.last_query_failed,
+        }
+
     def _consume_queue_nonblocking(self):
         while True:
             try:
@@ -142,55 +160,177 @@ class JournalSync:
 
 
 class Journal:
+    """
+    Append-only journal of SQL queries that still have to be replayed on the other node.
+
+    Each record is a length and CRC32 framed pickle of `(timestamp, item)` appended to `path`. Offset of the first
+    record which was not synced yet is stored in `cursor_path`. Once every record is synced the journal is
+    truncated.
+    """
+
     path = '/data/ha-journal'
+    cursor_path = '/data/ha-journal.cursor'
 
     def __init__(self):
-        self.journal = []
-        with suppress(FileNotFoundError):
-            with open(self.path, 'rb') as f:
-                try:
-                    self.journal = load(f)
-                except EOFError:
-                    # file is empty
-                    pass
-                except Exception:
-                    logger.warning('Failed to read journal', exc_info=True)
-
-        self.persisted_journal = self.journal.copy()
+        # `[item, timestamp, end offset of its record or None if it was not written yet]`
+        self.entries = deque()
+        self.size = 0
+        self.cursor = 0
+        self.persisted_cursor = 0
+        self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            self._load()
+        except Exception:
+            logger.warning('Failed to read journal', exc_info=True)
+            self.entries.clear()
+            self._truncate()
 
     def __bool__(self):
-        return bool(self.journal)
+        return bool(self.entries)
 
     def __iter__(self):
-        for query, params in self.journal:
-            yield query, params
+        for item, timestamp, end in list(self.entries):
+            yield item
 
     def __len__(self):
-        return len(self.journal)
+        return len(self.entries)
 
     def peek(self):
-        return self.journal[0]
+        return self.entries[0][0]
+
+    def peek_batch(self, max_statements=JOURNAL_BATCH_SIZE):
+        """
+        Return `(count, queries, params)` for as many leading items as fit in `max_statements` (but at least one).
+        Items queued by `datastore.bulk` (a list of queries and a list of their params) are flattened.
+        """
+        count = 0
+        queries = []
+        params = []
+        for item, timestamp, end in self.entries:
+            query, binds = item
+            if isinstance(query, list):
+                item_queries, item_params = query, binds
+            else:
+                item_queries, item_params = [query], [binds]
+
+            if count and len(queries) + len(item_queries) > max_statements:
+                break
 
-    def shift(self):
-        self.journal = self.journal[1:]
+            count += 1
+            queries.extend(item_queries)
+            params.extend(item_params)
+
+        return count, queries, params
+
+    def shift(self, count=1):
+        for i in range(count):
+            item, timestamp, end = self.entries.popleft()
+            if end is not None:
+                self.cursor = end
 
     def append(self, item):
-        self.journal.append(item)
+        self.entries.append([item, time.time(), None])
 
     def clear(self):
-        self.journal = []
+        self.entries.clear()
 
     def write(self):
-        if self.persisted_journal != self.journal:
-            self._write()
-            self.persisted_journal = self.journal.copy()
+        if not any(end is not None for item, timestamp, end in self.entries) and self.size:
+            # Everything that was written is synced already
+            self._truncate()
+
+        pending = [entry for entry in self.entries if entry[2] is None]
+        if pending:
+            data = bytearray()
+            for entry in pending:
+                record = dumps((entry[1], entry[0]))
+                data += JOURNAL_RECORD_HEADER.pack(len(record), crc32(record)) + record
+                entry[2] = self.size + len(data)
+
+            # All the queries received since the last write are persisted with a single fsync
+            os.pwrite(self.fd, data, self.size)
+            os.fdatasync(self.fd)
+            self.size += len(data)
+
+        if self.cursor != self.persisted_cursor:
+            self._write_cursor()
+
+    def lag(self):
+        """
+        Number of unsynced items and statements, size of their records and age of the oldest one (in seconds).
+        """
+        # Called from outside of the journal thread, copying a deque is atomic
+        entries = list(self.entries)
+        return {
+            'items': len(entries),
+            'statements': sum(len(item[0]) if isinstance(item[0], list) else 1 for item, timestamp, end in entries),
+            'bytes': self.size - self.cursor,
+            'age': time.time() - entries[0][1] if entries else 0,
+        }
+
+    def _load(self):
+        with suppress(FileNotFoundError), open(self.cursor_path, 'rb') as f:
+            self.cursor = self.persisted_cursor = int(f.read().strip() or 0)
+
+        with open(self.path, 'rb') as f:
+            data = f.read()
+
+        if data[:1] == PROTO:
+            # Journal written by previous versions (a pickled list of items), no record can be this long
+            for item in loads(data):
+                self.append(item)
+            self.size = 0
+            self.cursor = 0
+            self._truncate()
+            self.write()
+            return
 
-    def _write(self):
-        tmp_file = f'{self.path}.tmp'
-        with open(tmp_file, 'wb') as f:
-            dump(self.journal, f)
+        self.size = len(data)
+        if self.cursor > self.size:
+            # Journal was truncated but the cursor was not reset yet
+            self.cursor = 0
 
-        rename(tmp_file, self.path)
+        offset = self.cursor
+        while offset < self.size:
+            if offset + JOURNAL_RECORD_HEADER.size > self.size:
+                break
+            length, checksum = JOURNAL_RECORD_HEADER.unpack_from(data, offset)
+            end = offset + JOURNAL_RECORD_HEADER.size + length
+            record = data[offset + JOURNAL_RECORD_HEADER.size:end]
+            if end > self.size or crc32(record) != checksum:
+                break
+
+            timestamp, item = loads(record)
+            self.entries.append([item, timestamp, end])
+            offset = end
+
+        if offset < self.size:
+            logger.warning('Discarding %d bytes of incomplete journal record', self.size - offset)
+            os.ftruncate(self.fd, offset)
+            os.fdatasync(self.fd)
+            self.size = offset
+
+    def _truncate(self):
+        os.ftruncate(self.fd, 0)
+        os.fdatasync(self.fd)
+        self.size = 0
+        self.cursor = 0
+        for entry in self.entries:
+            entry[2] = None
+        self._write_cursor()
+
+    def _write_cursor(self):
+        tmp_file = f'{self.cursor_path}.tmp'
+        with open(tmp_file, 'w') as f:
+            f.write(str(self.cursor))
+            f.flush()
+            os.fsync(f.fileno())
+
+        os.rename(tmp_file, self.cursor_path)
+        self.persisted_cursor = self.cursor
+
+    def close(self):
+        os.close(self.fd)
 
 
 class JournalSyncThread(Thread):
@@ -204,6 +344,7 @@ class JournalSyncThread(Thread):
         self.daemon = True
         self.middleware = kwargs.get('middleware')
         self.sql_queue = kwargs.get('sql_queue')
+        self.journal_sync = None
 
     def run(self):
         set_name('journal_sync_thread')
@@ -211,11 +352,12 @@ class JournalSyncThread(Thread):
         alert = True
         retry_timeout = 5
         while True:
+            journal = None
             try:
                 journal = Journal()
-                journal_sync = JournalSync(self.middleware, self.sql_queue, journal)
+                self.journal_sync = JournalSync(self.middleware, self.sql_queue, journal)
                 while True:
-                    journal_sync.process()
+                    self.journal_sync.process()
                     alert = True
             except UnableToDetermineOSVersion:
                 if alert:
@@ -227,8 +369,28 @@ class JournalSyncThread(Thread):
                     alert = False
             except Exception:
                 logger.warning('Failed to sync journal. Retrying ever %d seconds', retry_timeout, exc_info=True)
+            finally:
+                if journal is not None:
+                    journal.close()
+
+            time.sleep(retry_timeout)
+
+
+class FailoverJournalService(Service):
+
+    class Config:
+        namespace = 'failover.journal'
+        private = True
+
+    def stats(self):
+        """
+        Replication lag of the HA journal: items and statements not yet applied on the other node, size of their
+        records and age of the oldest one (in seconds). `null` if the journal is not being synced.
+        """
+        if JOURNAL_THREAD is None or JOURNAL_THREAD.journal_sync is None:
+            return None
 
-            sleep(retry_timeout)
+        return JOURNAL_THREAD.journal_sync.stats()
 
 
 def hook_datastore_execute_write(middleware, sql, params, options):
@@ -15,6 +15,7 @@ from middlewared.event import EventSource
 from middlewared.plugins.pwenc import PWENC_FILE_SECRET
 from middlewared.plugins.cluster_linux.utils import CTDBConfig, FuseConfig
 from middlewared.plugins.filesystem_ import chflags, dosmode, stat_x
+from middlewared.plugins.filesystem_.listdir import DirectoryListing
 from middlewared.schema import accepts, Bool, Dict, Float, Int, List, Ref, returns, Path, Str
 from middlewared.service import private, CallError, filterable_returns, filterable, Service, job
 from middlewared.utils import filter_list
@@ -224,6 +225,9 @@ class FilesystemService(Service):
           acl(bool): extended ACL is present on file
           is_mountpoint(bool): path is a mountpoint
           is_ctldir(bool): path is within special .zfs directory
+
+        Filters, `order_by` and pagination on `name`, `path` and `type` are applied before the
+        entries are examined, and only attributes listed in `select` are computed.
         """
 
         path = self.resolve_cluster_path(path)
@@ -237,65 +241,7 @@ class FilesystemService(Service):
         if 'ix-applications' in path.parts:
             raise CallError('Ix-applications is a system managed dataset and its contents cannot be listed')
 
-        stat_opts = {"file_only": False, "dir_only": False}
-        for filter in filters:
-            if filter[0] not in ['type']:
-                continue
-
-            if filter[1] != '=' and filter[2] not in ['DIRECTORY', 'FILE']:
-                continue
-
-            if filter[2] == 'DIRECTORY':
-                stat_opts["dir_only"] = True
-            else:
-                stat_opts["file_only"] = True
-
-        rv = []
-        if stat_opts["dir_only"] and stat_opts["file_only"]:
-            return rv
-
-        only_top_level = path.absolute() == pathlib.Path('/mnt')
-        for entry in path.iterdir():
-            st = self.statx_entry_impl(entry, stat_opts)
-            if st is None:
-                continue
-
-            if only_top_level and not entry.is_mount():
-                # sometimes (on failures) the top-level directory
-                # where the zpool is mounted does not get removed
-                # after the zpool is exported. WebUI calls this
-                # specifying `/mnt` as the path. This is used when
-                # configuring shares in the "Path" drop-down. To
-                # prevent shares from being configured to point to
-                # a path that doesn't exist on a zpool, we'll
-                # filter these here.
-                continue
-            if 'ix-applications' in entry.parts:
-                continue
-
-            etype = st['etype']
-            stat = st['st']
-            realpath = entry.resolve().as_posix() if etype == 'SYMLINK' else entry.absolute().as_posix()
-
-            data = {
-                'name': entry.name,
-                'path': entry.as_posix().replace(
-                    f'{FuseConfig.FUSE_PATH_BASE.value}/', FuseConfig.FUSE_PATH_SUBST.value
-                ),
-                'realpath': realpath,
-                'type': etype,
-                'size': stat.stx_size,
-                'mode': stat.stx_mode,
-                'acl': False if self.acl_is_trivial(realpath) else True,
-                'uid': stat.stx_uid,
-                'gid': stat.stx_gid,
-                'is_mountpoint': entry.is_mount(),
-                'is_ctldir': st['is_ctldir'],
-            }
-
-            rv.append(data)
-
-        return filter_list(rv, filters=filters or [], options=options or {})
+        return DirectoryListing(path, self.acl_is_trivial).query(filters or [], options or {})
 
     @accepts(Str('path'))
     @returns(Dict(
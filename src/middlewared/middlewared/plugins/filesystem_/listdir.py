@@ -0,0 +1,214 @@
+import itertools
+import os
+import pathlib
+
+from middlewared.plugins.cluster_linux.utils import FuseConfig
+from middlewared.plugins.zfs_.utils import ZFSCTL
+from middlewared.utils import filter_getattrs, filter_list
+from middlewared.utils.query_filters import compile_filters
+
+from . import stat_x
+
+ENTRY_ATTRS = ('name', 'path', 'realpath', 'type', 'size', 'mode', 'acl', 'uid', 'gid', 'is_mountpoint', 'is_ctldir')
+# Attributes known from the directory listing itself. Filters, ordering and pagination using only these are
+# applied before any entry inode is read.
+LISTING_ATTRS = {'name', 'path', 'type'}
+STAT_ATTRS = {'size', 'mode', 'uid', 'gid'}
+
+
+def query_attrs(names):
+    return {name.lstrip('-').split('.', 1)[0] for name in names}
+
+
+class DirectoryListing:
+    """
+    Lazily evaluated listing of directory `path` for `filesystem.listdir`.
+
+    Checks which only depend on the directory (its ancestors being within `.zfs`, its device and inode for
+    mountpoint detection) are done once for all of its entries.
+    """
+
+    def __init__(self, path, acl_is_trivial):
+        self.path = path
+        self.acl_is_trivial = acl_is_trivial
+        self.only_top_level = path.absolute() == pathlib.Path('/mnt')
+        self._stat = None
+        self._is_ctldir = None
+
+    @property
+    def stat(self):
+        if self._stat is None:
+            self._stat = os.stat(self.path)
+        return self._stat
+
+    @property
+    def is_ctldir(self):
+        if self._is_ctldir is None:
+            self._is_ctldir = False
+            path = self.path.absolute()
+            while path.as_posix() != '/':
+                if path.name == '.zfs' and path.stat().st_ino == ZFSCTL.INO_ROOT:
+                    self._is_ctldir = True
+                    break
+
+                path = path.parent
+
+        return self._is_ctldir
+
+    def entry_type(self, entry):
+        if entry.is_symlink():
+            return 'SYMLINK'
+        elif entry.is_dir(follow_symlinks=False):
+            return 'DIRECTORY'
+        elif entry.is_file(follow_symlinks=False):
+            return 'FILE'
+        else:
+            return 'OTHER'
+
+    def entry_is_mountpoint(self, entry):
+        try:
+            if not entry.is_dir():
+                return False
+
+            st = entry.stat()
+        except OSError:
+            return False
+
+        return st.st_dev != self.stat.st_dev or st.st_ino == self.stat.st_ino
+
+    def entry_is_ctldir(self, entry):
+        if self.is_ctldir:
+            return True
+
+        if entry.name != '.zfs':
+            return False
+
+        try:
+            return entry.stat().st_ino == ZFSCTL.INO_ROOT
+        except OSError:
+            return False
+
+    def rows(self):
+        """
+        Generate rows with `LISTING_ATTRS` of directory entries (and `entry` which is its `os.DirEntry`).
+        """
+        with os.scandir(self.path) as it:
+            for entry in it:
+                if entry.name == 'ix-applications':
+                    continue
+
+                try:
+                    etype = self.entry_type(entry)
+                except FileNotFoundError:
+                    continue
+
+                if etype == 'SYMLINK' and not os.path.exists(entry.path):
+                    # Dangling symlinks are not listed
+                    continue
+
+                if self.only_top_level and not self.entry_is_mountpoint(entry):
+                    # sometimes (on failures) the top-level directory
+                    # where the zpool is mounted does not get removed
+                    # after the zpool is exported. WebUI calls this
+                    # specifying `/mnt` as the path. This is used when
+                    # configuring shares in the "Path" drop-down. To
+                    # prevent shares from being configured to point to
+                    # a path that doesn't exist on a zpool, we'll
+                    # filter these here.
+                    continue
+
+                yield {
+                    'name': entry.name,
+                    'path': entry.path.replace(
+                        f'{FuseConfig.FUSE_PATH_BASE.value}/', FuseConfig.FUSE_PATH_SUBST.value
+                    ),
+                    'type': etype,
+                    'entry': entry,
+                }
+
+    def expand(self, row, attrs):
+        """
+        Build `filesystem.listdir` entry for `row` with `attrs` only. Returns `None` if entry no longer exists.
+        """
+        entry = row['entry']
+        etype = row['type']
+        data = {}
+
+        if attrs & STAT_ATTRS:
+            try:
+                if etype == 'SYMLINK':
+                    st = stat_x.statx(entry.path)
+                else:
+                    st = stat_x.statx(
+                        entry.path, {'flags': stat_x.ATFlags.STATX_SYNC_AS_STAT | stat_x.ATFlags.SYMLINK_NOFOLLOW}
+                    )
+            except FileNotFoundError:
+                return None
+        else:
+            st = None
+
+        realpath = None
+        if attrs & {'realpath', 'acl'}:
+            entry_path = pathlib.Path(entry.path)
+            realpath = entry_path.resolve().as_posix() if etype == 'SYMLINK' else entry_path.absolute().as_posix()
+
+        for attr in ENTRY_ATTRS:
+            if attr not in attrs:
+                continue
+
+            if attr in LISTING_ATTRS:
+                data[attr] = row[attr]
+            elif attr == 'realpath':
+                data[attr] = realpath
+            elif attr in STAT_ATTRS:
+                data[attr] = getattr(st, f'stx_{attr}')
+            elif attr == 'acl':
+                data[attr] = not self.acl_is_trivial(realpath)
+            elif attr == 'is_mountpoint':
+                data[attr] = self.entry_is_mountpoint(entry)
+            elif attr == 'is_ctldir':
+                data[attr] = self.entry_is_ctldir(entry)
+
+        return data
+
+    def query(self, filters, options):
+        """
+        Equivalent of `filter_list` over all the expanded entries of the directory.
+
+        When `filters` and `order_by` only use `LISTING_ATTRS`, pagination is applied to the listing and only the
+        returned page is expanded, and only with the attributes requested by `select`. Without `order_by` and
+        `count`, the directory is not read past the requested page.
+        """
+        select = options.get('select') or []
+        attrs = query_attrs(select) or set(ENTRY_ATTRS)
+        filter_attrs = query_attrs(filter_getattrs(filters))
+        order_attrs = query_attrs(options.get('order_by') or [])
+
+        if not (filter_attrs | order_attrs) <= LISTING_ATTRS:
+            attrs |= filter_attrs | order_attrs
+            return filter_list(
+                [data for data in map(lambda row: self.expand(row, attrs), self.rows()) if data is not None],
+                filters, options,
+            )
+
+        offset = options.get('offset') or 0
+        limit = 1 if options.get('get') else options.get('limit') or 0
+        if options.get('order_by') or options.get('count'):
+            rows = filter_list(list(self.rows()), filters, {
+                k: v for k, v in [
+                    ('order_by', options.get('order_by')), ('count', options.get('count')),
+                    ('offset', offset), ('limit', limit),
+                ] if v
+            })
+            if options.get('count'):
+                return rows
+        else:
+            rows = self.rows()
+            if (predicate := compile_filters(filters)) is not None:
+                rows = filter(predicate, rows)
+            rows = list(itertools.islice(rows, offset, offset + limit if limit else None))
+
+        return filter_list(
+            [data for data in map(lambda row: self.expand(row, attrs), rows) if data is not None],
+            [], {k: options[k] for k in ('select', 'get') if k in options},
+        )
@@ -3,18 +3,28 @@ import asyncio
 import errno
 import datetime
 import subprocess
+import time
+from collections import OrderedDict
 
 from middlewared.schema import accepts, Bool, Dict, Int, Patch, Ref, Str, LDAP_DN, OROperator
 from middlewared.service import CallError, TDBWrapCRUDService, job, private, ValidationErrors, filterable
 from middlewared.plugins.directoryservices import SSL
 import middlewared.sqlalchemy as sa
 from middlewared.utils import run, filter_list
+from middlewared.utils.lang import undefined
 from middlewared.validators import Range
-from middlewared.plugins.smb import SMBCmd, SMBPath, WBCErr
+from middlewared.plugins.smb import SMBCmd, SMBPath
 
 
 SID_LOCAL_USER_PREFIX = "S-1-22-1-"
 SID_LOCAL_GROUP_PREFIX = "S-1-22-2-"
+# SID_NAME_USE reported by winbind for SIDs it could not resolve
+SID_NAME_UNKNOWN = 8
+# Bounds of the cache of winbind lookups (unix id <-> SID, SID -> name, name -> SID)
+RESOLVER_CACHE_SIZE = 65536
+RESOLVER_CACHE_TTL = 600
+# Maximum number of ids passed to a single wbinfo invocation
+WBINFO_BATCH_SIZE = 1000
 
 """
 See MS-DTYP 2.4.2.4
@@ -208,6 +218,51 @@ class IdmapBackend(enum.Enum):
         return self.value['has_secrets']
 
 
+class IdmapResolverCache:
+    """
+    LRU cache of successful winbind lookups. Entries expire after `ttl` seconds and the whole cache is dropped
+    whenever idmap configuration changes or winbindd is restarted.
+    """
+
+    def __init__(self, maxsize=RESOLVER_CACHE_SIZE, ttl=RESOLVER_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        try:
+            expires, value = self.entries[key]
+        except KeyError:
+            self.misses += 1
+            return undefined
+
+        if expires < time.monotonic():
+            self.entries.pop(key)
+            self.misses += 1
+            return undefined
+
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        self.entries[key] = (time.monotonic() + self.ttl, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+
+    def stats(self):
+        return {'entries': len(self.entries), 'hits': self.hits, 'misses': self.misses}
+
+
+resolver_cache = IdmapResolverCache()
+
+
 class IdmapDomainModel(sa.Model):
     __tablename__ = 'directoryservice_idmap_domain'
 
@@ -961,53 +1016,117 @@ class IdmapDomainService(TDBWrapCRUDService):
 
     @private
     async def name_to_sid(self, name):
+        if (sid := resolver_cache.get(('NAME', name))) is not undefined:
+            return sid
+
         wb = await run([SMBCmd.WBINFO.value, '--name-to-sid', name], check=False)
         if wb.returncode != 0:
             self.logger.debug("wbinfo failed with error: %s",
                               wb.stderr.decode().strip())
+            return wb.stdout.decode().strip()
 
-        return wb.stdout.decode().strip()
+        sid = wb.stdout.decode().strip()
+        resolver_cache.put(('NAME', name), sid)
+        return sid
 
     @private
     async def sid_to_name(self, sid):
         """
         Last two characters of name string encode the account type.
         """
-        wb = await run([SMBCmd.WBINFO.value, '--sid-to-name', sid], check=False)
-        if wb.returncode != 0:
-            raise CallError(f'wbinfo failed with error: {wb.stderr.decode().strip()}')
+        if (name := (await self.sids_to_names([sid]))[0]) is None:
+            raise CallError(f'wbinfo failed to convert {sid} to name')
 
-        out = wb.stdout.decode().strip()
-        return {"name": out[:-2], "type": int(out[-2:])}
+        return name
 
     @private
     async def sid_to_unixid(self, sid_str):
-        rv = None
-        gid = None
-        uid = None
+        return (await self.sids_to_unixids([sid_str]))[0]
+
+    @private
+    async def wbinfo_batch(self, option, values):
+        """
+        Run `wbinfo --<option>=<comma-separated values>` (one invocation per `WBINFO_BATCH_SIZE` values) and return
+        its output line for each of `values` (`None` if it could not be resolved).
+        """
+        out = []
+        for i in range(0, len(values), WBINFO_BATCH_SIZE):
+            batch = values[i:i + WBINFO_BATCH_SIZE]
+            wb = await run([SMBCmd.WBINFO.value, f'--{option}={",".join(batch)}'], check=False)
+            lines = wb.stdout.decode().splitlines()
+            if wb.returncode == 0 and len(lines) == len(batch):
+                out.extend(lines)
+            elif len(batch) == 1:
+                self.logger.debug("wbinfo --%s %s failed with error: %s", option, batch[0], wb.stderr.decode().strip())
+                out.append(None)
+            else:
+                # Winbind rejects the whole batch if any of the values is invalid
+                for value in batch:
+                    out.extend(await self.wbinfo_batch(option, [value]))
+
+        return out
 
-        if sid_str.startswith(SID_LOCAL_USER_PREFIX):
-            return {"id_type": "USER", "id": int(sid_str.strip(SID_LOCAL_USER_PREFIX))}
+    @private
+    async def sids_to_names(self, sids):
+        """
+        Bulk version of `idmap.sid_to_name`. Returns `{"name", "type"}` (or `None` if it can not be resolved) for
+        each of `sids`.
+        """
+        out = [resolver_cache.get(('SID2NAME', sid)) for sid in sids]
+        missing = list(dict.fromkeys(sid for sid, name in zip(sids, out) if name is undefined))
+        resolved = {}
+        for sid, line in zip(missing, await self.wbinfo_batch('lookup-sids', missing)):
+            # i.e. `S-1-5-21-...-1104 -> DOMAIN\user 1`
+            lookup = line.split(' -> ', 1)[1].rsplit(' ', 1) if line and ' -> ' in line else []
+            if len(lookup) != 2 or not lookup[1].isdigit() or int(lookup[1]) == SID_NAME_UNKNOWN:
+                # Do not cache failed lookups, SID might become resolvable once the domain is reachable
+                resolved[sid] = None
+                continue
 
-        elif sid_str.startswith(SID_LOCAL_GROUP_PREFIX):
-            return {"id_type": "GROUP", "id": int(sid_str.strip(SID_LOCAL_GROUP_PREFIX))}
+            resolved[sid] = {"name": lookup[0], "type": int(lookup[1])}
+            resolver_cache.put(('SID2NAME', sid), resolved[sid])
 
-        wb = await run([SMBCmd.WBINFO.value, '--sid-to-gid', sid_str], check=False)
-        if wb.returncode == 0:
-            gid = int(wb.stdout.decode().strip())
+        return [resolved[sid] if name is undefined else name for sid, name in zip(sids, out)]
 
-        wb = await run([SMBCmd.WBINFO.value, '--sid-to-uid', sid_str], check=False)
-        if wb.returncode == 0:
-            uid = int(wb.stdout.decode().strip())
+    @private
+    async def sids_to_unixids(self, sids):
+        """
+        Bulk version of `idmap.sid_to_unixid`. Returns `{"id_type", "id"}` (or `None` if it can not be resolved) for
+        each of `sids`.
+        """
+        out = []
+        for sid in sids:
+            if sid.startswith(SID_LOCAL_USER_PREFIX):
+                out.append({"id_type": "USER", "id": int(sid[len(SID_LOCAL_USER_PREFIX):])})
+            elif sid.startswith(SID_LOCAL_GROUP_PREFIX):
+                out.append({"id_type": "GROUP", "id": int(sid[len(SID_LOCAL_GROUP_PREFIX):])})
+            else:
+                out.append(resolver_cache.get(('SID2ID', sid)))
+
+        missing = list(dict.fromkeys(sid for sid, unixid in zip(sids, out) if unixid is undefined))
+        resolved = {}
+        for sid, line in zip(missing, await self.wbinfo_batch('sids-to-unix-ids', missing)):
+            # i.e. `S-1-5-21-...-1104 -> uid/gid 90001104`
+            mapping = line.split(' -> ', 1)[1].split() if line and ' -> ' in line else []
+            if len(mapping) != 2 or mapping[0] not in ('uid', 'gid', 'uid/gid'):
+                resolved[sid] = None
+                continue
 
-        if gid and (gid == uid):
-            rv = {"id_type": "BOTH", "id": gid}
-        elif gid:
-            rv = {"id_type": "GROUP", "id": gid}
-        elif uid:
-            rv = {"id_type": "USER", "id": uid}
+            resolved[sid] = {
+                "id_type": {'uid': 'USER', 'gid': 'GROUP', 'uid/gid': 'BOTH'}[mapping[0]],
+                "id": int(mapping[1]),
+            }
+            resolver_cache.put(('SID2ID', sid), resolved[sid])
 
-        return rv
+        return [resolved[sid] if unixid is undefined else unixid for sid, unixid in zip(sids, out)]
+
+    @private
+    async def clear_resolver_cache(self):
+        resolver_cache.clear()
+
+    @private
+    async def resolver_cache_stats(self):
+        return resolver_cache.stats()
 
     @private
     @filterable
@@ -1075,29 +1194,48 @@ class IdmapDomainService(TDBWrapCRUDService):
         S-1-22-2 (groups). This is not returned by wbinfo, but for consistency
         with what appears when viewed over SMB protocol we'll do the same here.
         """
-        unixid = data.get("id")
-        id = IDType[data.get("id_type", "GROUP")]
+        return (await self.unixids_to_sids([data]))[0]
 
-        if id == IDType.USER:
-            wb = await run([SMBCmd.WBINFO.value, '--uid-to-sid', str(unixid)], check=False)
-        else:
-            wb = await run([SMBCmd.WBINFO.value, '--gid-to-sid', str(unixid)], check=False)
+    @private
+    async def unixids_to_sids(self, ids):
+        """
+        Bulk version of `idmap.unixid_to_sid`. Returns SID (or `None` if it can not be resolved) for each
+        `{"id", "id_type"}` of `ids`.
+        """
+        keys = [
+            ('UNIXID', 'USER' if IDType[data.get("id_type", "GROUP")] == IDType.USER else 'GROUP', data.get("id"))
+            for data in ids
+        ]
+        out = [resolver_cache.get(key) for key in keys]
+        missing = list(dict.fromkeys(key for key, sid in zip(keys, out) if sid is undefined))
+        resolved = {}
+        for key, line in zip(missing, await self.wbinfo_batch('unix-ids-to-sids', [
+            f'{"u" if id_type == "USER" else "g"}{unixid}' for _, id_type, unixid in missing
+        ])):
+            if line is not None and line.startswith('S-'):
+                resolved[key] = line.strip()
+                resolver_cache.put(key, resolved[key])
+            else:
+                resolved[key] = None
 
-        if wb.returncode != 0:
-            self.logger.warning("Could not convert [%d] to SID: %s",
-                                unixid, wb.stderr.decode().strip())
-            if WBCErr.DOMAIN_NOT_FOUND.err() in wb.stderr.decode():
-                is_local = await self.middleware.call(
-                    f'{"user" if id == IDType.USER else "group"}.query',
-                    [("uid" if id == IDType.USER else "gid", '=', unixid)],
-                    {"count": True}
+        # Accounts winbind knows nothing about might still be local ones
+        for id_type in ('USER', 'GROUP'):
+            unmapped = [key[2] for key in missing if resolved[key] is None and key[1] == id_type]
+            if not unmapped:
+                continue
+
+            id_key = 'uid' if id_type == 'USER' else 'gid'
+            for account in await self.middleware.call(
+                f'{id_type.lower()}.query', [(id_key, 'in', unmapped)], {'select': [id_key]}
+            ):
+                resolved[('UNIXID', id_type, account[id_key])] = (
+                    f'S-1-22-{1 if id_type == "USER" else 2}-{account[id_key]}'
                 )
-                if is_local:
-                    return f'S-1-22-{1 if id == IDType.USER else 2}-{unixid}'
 
-            return None
+        for key in filter(lambda key: resolved[key] is None, missing):
+            self.logger.warning("Could not convert %s [%d] to SID", key[1].lower(), key[2])
 
-        return wb.stdout.decode().strip()
+        return [resolved[key] if sid is undefined else sid for key, sid in zip(keys, out)]
 
     @private
     async def get_idmap_info(self, ds, id):
@@ -1255,6 +1393,7 @@ class IdmapDomainService(TDBWrapCRUDService):
 
     @private
     async def synchronize(self, restart=True):
+        resolver_cache.clear()
         config_idmap = await self.query()
         idmaps = await self.idmap_to_smbconf(config_idmap)
         to_check = (await self.middleware.call('smb.reg_globals'))['idmap']
@@ -0,0 +1,23 @@
+from middlewared.service import Service
+
+from .k8s import informers_stats, reset_shared_client, stop_informers
+
+
+class KubernetesCacheService(Service):
+
+    class Config:
+        namespace = 'k8s.cache'
+        private = True
+
+    async def stats(self):
+        """
+        State of the watch-backed caches `k8s.*.query` methods are served from.
+        """
+        return informers_stats()
+
+    async def reset(self):
+        """
+        Drop cached k8s objects and the shared API client. They are re-created by the next query.
+        """
+        await stop_informers()
+        await reset_shared_client()
@@ -8,7 +8,7 @@ from kubernetes_asyncio import watch
 from middlewared.service import CRUDService, filterable, private
 from middlewared.utils import filter_list
 
-from .k8s import api_client
+from .k8s import api_client, list_objects
 from .utils import NODE_NAME
 
 
@@ -24,22 +24,9 @@ class KubernetesEventService(CRUDService):
         label_selector = options.get('extra', {}).get('label_selector')
         field_selector = options.get('extra', {}).get('field_selector')
         namespace = options.get('extra', {}).get('namespace')
-        kwargs = {
-            k: v for k, v in [
-                ('label_selector', label_selector),
-                ('field_selector', field_selector),
-                ('namespace', namespace),
-            ] if v
-        }
-        async with api_client() as (api, context):
-            if namespace:
-                method = context['core_api'].list_namespaced_event
-            else:
-                method = context['core_api'].list_event_for_all_namespaces
-            return filter_list(
-                [d.to_dict() for d in (await method(**kwargs)).items],
-                filters, options
-            )
+        return filter_list(
+            await list_objects('Event', namespace, label_selector, field_selector), filters, options
+        )
 
     @private
     async def setup_k8s_events(self):
@@ -1,5 +1,13 @@
 from . import cluster, exceptions, nodes, service_accounts
-from .api_client import api_client
+from .api_client import api_client, reset_shared_client
+from .informer import (
+    cache_object, HELM_SECRET_TYPE, informers_stats, list_objects, namespace_from_filters, relist_informer,
+    stop_informers,
+)
 
 
-__all__ = ['api_client', 'cluster', 'exceptions', 'nodes', 'service_accounts']
+__all__ = [
+    'api_client', 'cache_object', 'cluster', 'exceptions', 'HELM_SECRET_TYPE', 'informers_stats', 'list_objects',
+    'namespace_from_filters', 'nodes', 'relist_informer', 'reset_shared_client', 'service_accounts',
+    'stop_informers',
+]
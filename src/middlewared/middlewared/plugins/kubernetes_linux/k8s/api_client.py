@@ -1,3 +1,6 @@
+import asyncio
+import os
+
 from contextlib import asynccontextmanager
 from kubernetes_asyncio import client, config
 from kubernetes_asyncio.client.api_client import ApiClient
@@ -6,15 +9,22 @@ from .nodes import get_node
 from .utils import KUBECONFIG_FILE
 
 
-@asynccontextmanager
-async def api_client(context=None, api_client_kwargs=None):
-    await config.load_kube_config(config_file=KUBECONFIG_FILE)
-    context = context or {}
-    context['core_api'] = True
-    api_client_kwargs = api_client_kwargs or {}
-    api_client_kwargs.setdefault('request_timeout', 50)
-    api_cl = ApiClient(**api_client_kwargs)
-    user_context = {
+# Replaced shared clients are closed after this many seconds so that requests still using them can finish
+CLIENT_CLOSE_DELAY = 60
+SHARED_CLIENT = {'client': None, 'apis': None, 'kubeconfig': None}
+SHARED_CLIENT_LOCK = asyncio.Lock()
+
+
+def _kubeconfig_stat():
+    try:
+        st = os.stat(KUBECONFIG_FILE)
+    except FileNotFoundError:
+        return None
+    return st.st_ino, st.st_mtime_ns, st.st_size
+
+
+def _apis(api_cl):
+    return {
         'core_api': client.CoreV1Api(api_cl),
         'apps_api': client.AppsV1Api(api_cl),
         'storage_api': client.StorageV1Api(api_cl),
@@ -24,6 +34,51 @@ async def api_client(context=None, api_client_kwargs=None):
         'extensions_api': client.ApiextensionsV1Api(api_cl),
     }
 
+
+async def _close_later(api_cl):
+    await asyncio.sleep(CLIENT_CLOSE_DELAY)
+    await api_cl.close()
+
+
+async def get_shared_client():
+    """
+    Return `(ApiClient, apis)` shared by all the callers. Its connection pool is reused between calls and it is
+    only re-created when kubeconfig changes.
+    """
+    async with SHARED_CLIENT_LOCK:
+        kubeconfig = _kubeconfig_stat()
+        if SHARED_CLIENT['client'] is None or SHARED_CLIENT['kubeconfig'] != kubeconfig:
+            await config.load_kube_config(config_file=KUBECONFIG_FILE)
+            if SHARED_CLIENT['client'] is not None:
+                asyncio.ensure_future(_close_later(SHARED_CLIENT['client']))
+
+            api_cl = ApiClient(request_timeout=50)
+            SHARED_CLIENT.update({'client': api_cl, 'apis': _apis(api_cl), 'kubeconfig': kubeconfig})
+
+        return SHARED_CLIENT['client'], SHARED_CLIENT['apis']
+
+
+async def reset_shared_client():
+    async with SHARED_CLIENT_LOCK:
+        if SHARED_CLIENT['client'] is not None:
+            asyncio.ensure_future(_close_later(SHARED_CLIENT['client']))
+        SHARED_CLIENT.update({'client': None, 'apis': None, 'kubeconfig': None})
+
+
+@asynccontextmanager
+async def api_client(context=None, api_client_kwargs=None):
+    context = context or {}
+    context['core_api'] = True
+    if api_client_kwargs:
+        # Custom client settings, use a dedicated client
+        await config.load_kube_config(config_file=KUBECONFIG_FILE)
+        api_client_kwargs.setdefault('request_timeout', 50)
+        api_cl = ApiClient(**api_client_kwargs)
+        user_context = _apis(api_cl)
+    else:
+        api_cl, user_context = await get_shared_client()
+        user_context = user_context.copy()
+
     try:
         for k in filter(lambda k: context[k], context):
             if k == 'node':
@@ -31,4 +86,5 @@ async def api_client(context=None, api_client_kwargs=None):
 
         yield api_cl, user_context
     finally:
-        await api_cl.close()
+        if api_client_kwargs:
+            await api_cl.close()
@@ -0,0 +1,335 @@
+import asyncio
+import copy
+import logging
+import re
+import time
+
+from collections import defaultdict
+from kubernetes_asyncio.client.exceptions import ApiException
+from kubernetes_asyncio.watch import Watch
+
+from middlewared.utils import get
+
+from .api_client import get_shared_client
+
+
+logger = logging.getLogger(__name__)
+
+# Seconds after which API server ends a watch, it is then resumed from the last seen resource version
+WATCH_TIMEOUT = 300
+HELM_SECRET_TYPE = 'helm.sh/release.v1'
+RE_CAMEL_CASE = re.compile(r'(?<!^)(?=[A-Z])')
+RE_SELECTOR_REQUIREMENT = re.compile(r'^\s*(!?)\s*([\w./-]+)\s*(?:(==|=|!=)\s*([\w.-]*))?\s*$')
+
+
+def parse_selector(selector):
+    """
+    Parse equality-based label/field `selector` into a list of `(key, op, value)` requirements where `op` is one
+    of `=`, `!=`, `exists` or `!exists`.
+
+    Returns `None` for selectors which are not supported (i.e. set-based ones).
+    """
+    requirements = []
+    for requirement in filter(None, (selector or '').split(',')):
+        if not (m := RE_SELECTOR_REQUIREMENT.match(requirement)):
+            return None
+
+        negate, key, op, value = m.groups()
+        if op is None:
+            requirements.append((key, '!exists' if negate else 'exists', None))
+        elif negate:
+            return None
+        else:
+            requirements.append((key, '!=' if op == '!=' else '=', value))
+
+    return requirements
+
+
+def field_value(obj, key):
+    # Field selectors use API (camel case) attribute names while cached objects are `to_dict()` serialized
+    value = get(obj, '.'.join(RE_CAMEL_CASE.sub('_', part).lower() for part in key.split('.')))
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return str(value).lower()
+    return str(value)
+
+
+def matches(requirements, values):
+    for key, op, value in requirements:
+        if op == 'exists':
+            if key not in values:
+                return False
+        elif op == '!exists':
+            if key in values:
+                return False
+        elif op == '=':
+            if values.get(key) != value:
+                return False
+        elif values.get(key) == value:
+            return False
+
+    return True
+
+
+class Informer:
+    """
+    Cache of all objects of a single resource kind, populated by listing them and kept up to date by watching
+    changes from the resource version of the list.
+
+    Objects are stored serialized with `to_dict()` and are indexed by namespace and labels.
+    """
+
+    def __init__(self, kind, api, list_method, field_selector=None):
+        self.kind = kind
+        self.api = api
+        self.list_method = list_method
+        self.field_selector = field_selector
+        self.lock = asyncio.Lock()
+        self.synced = False
+        self.task = None
+        self.resource_version = None
+        self.objects = {}
+        self.by_namespace = defaultdict(set)
+        self.by_label = defaultdict(set)
+        self.lists = 0
+        self.events = 0
+        self.synced_at = None
+
+    async def list_func(self):
+        return getattr((await get_shared_client())[1][self.api], self.list_method)
+
+    @property
+    def list_kwargs(self):
+        return {'field_selector': self.field_selector} if self.field_selector else {}
+
+    async def ensure_synced(self):
+        if self.synced:
+            return
+
+        async with self.lock:
+            if self.synced:
+                return
+
+            await self.relist()
+            self.synced = True
+            self.synced_at = time.monotonic()
+            if self.task is None or self.task.done():
+                self.task = asyncio.ensure_future(self.watch())
+
+    async def relist(self):
+        result = await (await self.list_func())(**self.list_kwargs)
+        self.lists += 1
+        self.objects = {}
+        self.by_namespace = defaultdict(set)
+        self.by_label = defaultdict(set)
+        for obj in result.items:
+            self.upsert(obj.to_dict())
+        self.resource_version = result.metadata.resource_version
+
+    async def watch(self):
+        try:
+            while True:
+                try:
+                    async with Watch().stream(
+                        await self.list_func(), resource_version=self.resource_version,
+                        timeout_seconds=WATCH_TIMEOUT, _request_timeout=WATCH_TIMEOUT + 30, **self.list_kwargs,
+                    ) as stream:
+                        async for event in stream:
+                            self.process_event(event)
+                except ApiException as e:
+                    if e.status != 410:
+                        raise
+
+                    # Resource version we resumed from is too old
+                    async with self.lock:
+                        await self.relist()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.debug('Watch of %r failed', self.kind, exc_info=True)
+        finally:
+            # Until watch is restarted, cache might miss updates
+            self.synced = False
+
+    def process_event(self, event):
+        self.events += 1
+        raw = event['raw_object']
+        self.resource_version = raw['metadata']['resourceVersion']
+        if event['type'] in ('ADDED', 'MODIFIED'):
+            # Object might have been relisted in a newer version than the watch has seen so far
+            self.upsert_newer(event['object'].to_dict())
+        elif event['type'] == 'DELETED':
+            self.remove(raw['metadata']['uid'])
+
+    def upsert(self, obj):
+        uid = obj['metadata']['uid']
+        self.remove(uid)
+        self.objects[uid] = obj
+        self.by_namespace[obj['metadata']['namespace']].add(uid)
+        for label in (obj['metadata']['labels'] or {}).items():
+            self.by_label[label].add(uid)
+
+    def upsert_newer(self, obj):
+        """
+        Upsert `obj` unless a newer version of it is already cached.
+        """
+        if (cached := self.objects.get(obj['metadata']['uid'])) is not None and is_older(
+            obj['metadata']['resource_version'], cached['metadata']['resource_version'],
+        ):
+            return
+
+        self.upsert(obj)
+
+    def remove(self, uid):
+        if (obj := self.objects.pop(uid, None)) is None:
+            return
+
+        self.by_namespace[obj['metadata']['namespace']].discard(uid)
+        for label in (obj['metadata']['labels'] or {}).items():
+            self.by_label[label].discard(uid)
+
+    def select(self, namespace=None, label_selector=None, field_selector=None):
+        """
+        Return cached objects matching arguments (which have the same meaning as in the API list calls) or `None`
+        if selectors can't be evaluated from the cache.
+
+        Returned objects are shared with the cache and must not be modified.
+        """
+        labels = parse_selector(label_selector)
+        fields = parse_selector(field_selector)
+        if labels is None or fields is None or any(op in ('exists', '!exists') for key, op, value in fields):
+            return None
+
+        candidates = None
+        if namespace:
+            candidates = set(self.by_namespace.get(namespace, set()))
+        for key, op, value in labels:
+            if op == '=':
+                uids = self.by_label.get((key, value), set())
+                candidates = set(uids) if candidates is None else candidates & uids
+
+        if candidates is None:
+            objects = list(self.objects.values())
+        else:
+            objects = [self.objects[uid] for uid in candidates]
+
+        return [
+            obj for obj in objects
+            if matches(labels, obj['metadata']['labels'] or {}) and matches(
+                fields, {key: field_value(obj, key) for key, op, value in fields}
+            )
+        ]
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+        self.synced = False
+        self.objects = {}
+        self.by_namespace = defaultdict(set)
+        self.by_label = defaultdict(set)
+
+    def stats(self):
+        return {
+            'kind': self.kind,
+            'synced': self.synced,
+            'objects': len(self.objects),
+            'resource_version': self.resource_version,
+            'lists': self.lists,
+            'events': self.events,
+        }
+
+
+INFORMERS = {
+    informer.kind: informer for informer in (
+        Informer('Deployment', 'apps_api', 'list_deployment_for_all_namespaces'),
+        Informer('Event', 'core_api', 'list_event_for_all_namespaces'),
+        # Helm stores every revision of a chart release in a secret of this type
+        Informer(
+            'HelmReleaseSecret', 'core_api', 'list_secret_for_all_namespaces',
+            field_selector=f'type={HELM_SECRET_TYPE}',
+        ),
+        Informer('Pod', 'core_api', 'list_pod_for_all_namespaces'),
+        Informer('Service', 'core_api', 'list_service_for_all_namespaces'),
+        Informer('StatefulSet', 'apps_api', 'list_stateful_set_for_all_namespaces'),
+    )
+}
+
+
+def namespace_from_filters(filters):
+    """
+    Namespace all objects matching query-filters `filters` belong to (if there is such a filter).
+    """
+    for f in filters or []:
+        if len(f) == 3 and list(f[:2]) == ['metadata.namespace', '='] and isinstance(f[2], str):
+            return f[2]
+
+
+async def list_objects(kind, namespace=None, label_selector=None, field_selector=None):
+    """
+    List objects of `kind` serialized with `to_dict()` from its informer cache. Arguments have the same meaning as
+    in the API list calls, selectors not supported by the cache are evaluated by API server.
+
+    Returned objects are copies which can be modified by the caller.
+    """
+    informer = INFORMERS[kind]
+    await informer.ensure_synced()
+    if (objects := informer.select(namespace, label_selector, field_selector)) is not None:
+        return copy.deepcopy(objects)
+
+    kwargs = {k: v for k, v in [('label_selector', label_selector), ('field_selector', field_selector)] if v}
+    if informer.field_selector:
+        kwargs['field_selector'] = ','.join(filter(None, [informer.field_selector, field_selector]))
+    return [
+        d.to_dict() for d in (await (await informer.list_func())(**kwargs)).items
+        if not namespace or d.metadata.namespace == namespace
+    ]
+
+
+def is_older(resource_version, other):
+    """
+    Whether `resource_version` is older than `other`. Resource versions are opaque strings so only numeric ones (which
+    they are in practice) are compared.
+    """
+    if resource_version and other and resource_version.isdigit() and other.isdigit():
+        return int(resource_version) < int(other)
+
+    return False
+
+
+def cache_object(kind, obj):
+    """
+    Store `obj` returned by a create/update API call in its informer cache so that it is visible to subsequent
+    queries even before the watch catches up.
+
+    `obj` is not stored if the watch has already cached a newer version of it.
+    """
+    informer = INFORMERS[kind]
+    if informer.synced:
+        informer.upsert_newer(obj.to_dict())
+
+
+async def relist_informer(kind):
+    """
+    List objects of `kind` into its informer cache again. This is used for objects which are changed outside of
+    middlewared (so they can't be stored with `cache_object`) when the watch might not have caught up yet.
+    """
+    informer = INFORMERS[kind]
+    if informer.synced:
+        async with informer.lock:
+            await informer.relist()
+
+
+async def stop_informers():
+    for informer in INFORMERS.values():
+        await informer.stop()
+
+
+def informers_stats():
+    return [informer.stats() for informer in INFORMERS.values()]
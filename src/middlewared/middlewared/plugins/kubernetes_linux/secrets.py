@@ -7,7 +7,7 @@ from middlewared.schema import Dict, List, Ref, Str
 from middlewared.service import accepts, CallError, CRUDService, filterable
 from middlewared.utils import filter_list
 
-from .k8s import api_client
+from .k8s import api_client, HELM_SECRET_TYPE, list_objects, namespace_from_filters, relist_informer
 
 
 class KubernetesSecretService(CRUDService):
@@ -22,6 +22,12 @@ class KubernetesSecretService(CRUDService):
         extra = options.get('extra', {})
         label_selector = extra.get('label_selector')
         field_selector = extra.get('field_selector')
+        if field_selector == f'type={HELM_SECRET_TYPE}' and not label_selector:
+            # Helm release secrets are read by every `chart.release.query` so they are served from a watch cache
+            return filter_list(
+                await list_objects('HelmReleaseSecret', namespace_from_filters(filters)), filters, options
+            )
+
         kwargs = {k: v for k, v in [('label_selector', label_selector), ('field_selector', field_selector)] if v}
         async with api_client() as (api, context):
             if len(filters) == 1 and len(filters[0]) == 3 and list(filters[0])[:2] == ['metadata.namespace', '=']:
@@ -31,6 +37,13 @@ class KubernetesSecretService(CRUDService):
 
             return filter_list([d.to_dict() for d in (await func()).items], filters, options)
 
+    async def relist_helm_release_secrets(self):
+        """
+        Helm release secrets are written by `helm` outside of middlewared, this must be called once a `helm`
+        command finishes so that queries made right after it do not read previous revisions from the watch cache.
+        """
+        await relist_informer('HelmReleaseSecret')
+
     @accepts(
         Dict(
             'secret_create',
@@ -4,7 +4,7 @@ from middlewared.service import accepts, CallError, CRUDService, filterable
 from middlewared.schema import Dict, Str
 from middlewared.utils import filter_list
 
-from .k8s import api_client
+from .k8s import api_client, list_objects, namespace_from_filters
 
 
 class KubernetesServicesService(CRUDService):
@@ -15,15 +15,7 @@ class KubernetesServicesService(CRUDService):
 
     @filterable
     async def query(self, filters, options):
-        async with api_client() as (api, context):
-            return filter_list(
-                [
-                    d.to_dict() for d in (
-                        await context['core_api'].list_service_for_all_namespaces()
-                    ).items
-                ],
-                filters, options
-            )
+        return filter_list(await list_objects('Service', namespace_from_filters(filters)), filters, options)
 
     @accepts(
         Str('name'),
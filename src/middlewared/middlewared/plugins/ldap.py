@@ -1223,6 +1223,8 @@ class LDAPService(TDBWrapConfigService):
 
         if (self.middleware.call_sync('ldap.config'))['disable_freenas_cache']:
             self.middleware.call_sync('cache.put', 'LDAP_cache', cache_data)
+            self.middleware.call_sync('dscache.replace', self._config.namespace.upper(), 'USER', [])
+            self.middleware.call_sync('dscache.replace', self._config.namespace.upper(), 'GROUP', [])
             self.logger.debug('LDAP cache is disabled. Bypassing cache fill.')
             return
 
@@ -1232,6 +1234,7 @@ class LDAPService(TDBWrapConfigService):
         local_uid_list = list(u['uid'] for u in self.middleware.call_sync('user.query'))
         local_gid_list = list(g['gid'] for g in self.middleware.call_sync('group.query'))
 
+        users = []
         for u in pwd_list:
             is_local_user = True if u.pw_uid in local_uid_list else False
             if is_local_user:
@@ -1262,9 +1265,12 @@ class LDAPService(TDBWrapConfigService):
                 'nt_name': None,
                 'sid': None,
             }
-            self.middleware.call_sync('dscache.insert', self._config.namespace.upper(), 'USER', entry)
+            users.append(entry)
             user_next_index += 1
 
+        self.middleware.call_sync('dscache.replace', self._config.namespace.upper(), 'USER', users)
+
+        groups = []
         for g in grp_list:
             is_local_user = True if g.gr_gid in local_gid_list else False
             if is_local_user:
@@ -1285,9 +1291,11 @@ class LDAPService(TDBWrapConfigService):
                 'nt_name': None,
                 'sid': None,
             }
-            self.middleware.call_sync('dscache.insert', self._config.namespace.upper(), 'GROUP', entry)
+            groups.append(entry)
             group_next_index += 1
 
+        self.middleware.call_sync('dscache.replace', self._config.namespace.upper(), 'GROUP', groups)
+
     @private
     async def get_cache(self):
         users = await self.middleware.call('dscache.entries', self._config.namespace.upper(), 'USER')
@@ -21,6 +21,8 @@ from io import BytesIO
 from middlewared.alert.base import AlertCategory, AlertClass, AlertLevel, SimpleOneShotAlertClass
 from middlewared.plugins.boot import BOOT_POOL_NAME_VALID
 from middlewared.plugins.zfs import ZFSSetPropertyError
+from middlewared.plugins.zfs_.dataset_query import filter_pushdown_filters
+from middlewared.plugins.zfs_.inventory import INVENTORY_MAX_AGE, inventory_can_serve
 from middlewared.plugins.zfs_.validation_utils import validate_dataset_name, validate_pool_name
 from middlewared.schema import (
     accepts, Attribute, Bool, Cron,
@@ -3026,12 +3028,16 @@ class PoolDatasetService(CRUDService):
         `query-options.extra.snapshots_properties` can be specified to list out properties which should be retrieved
         for snapshot(s) related to each dataset. By default only name of the snapshot would be retrieved, however
         if `null` is specified all properties of the snapshot would be retrieved in this case.
+
+        `query-options.extra.inventory` can be set to serve datasets from the in-memory datasets inventory which is
+        kept up to date from ZFS events instead of querying ZFS. It is only used when `query-options.extra.properties`
+        are specified and are all kept by the inventory and snapshots are not requested. Space accounting properties
+        can be up to `query-options.extra.inventory_max_age` seconds old (60 by default) unless
+        `query-options.extra.inventory_force_refresh` is set.
         """
         # Optimization for cases in which they can be filtered at zfs.dataset.query
-        zfsfilters = []
         filters = filters or []
-        if len(filters) == 1 and len(filters[0]) == 3 and list(filters[0][:2]) == ['id', '=']:
-            zfsfilters.append(copy.deepcopy(filters[0]))
+        zfsfilters = filter_pushdown_filters(filters)
 
         internal_datasets_filters = self.middleware.call_sync('pool.dataset.internal_datasets_filters')
         filters.extend(internal_datasets_filters)
@@ -3040,8 +3046,17 @@ class PoolDatasetService(CRUDService):
         props = extra.get('properties')
         snapshots = extra.get('snapshots')
         snapshots_recursive = extra.get('snapshots_recursive')
-        return filter_list(
-            self.__transform(self.middleware.call_sync(
+        if extra.get('inventory') and retrieve_children and not snapshots and inventory_can_serve(props):
+            datasets = self.middleware.call_sync('zfs.inventory.datasets_query', zfsfilters, {
+                'extra': {
+                    'flat': extra.get('flat', True),
+                    'properties': props,
+                    'max_age': extra.get('inventory_max_age', INVENTORY_MAX_AGE),
+                    'force_refresh': extra.get('inventory_force_refresh', False),
+                }
+            })
+        else:
+            datasets = self.middleware.call_sync(
                 'zfs.dataset.query', zfsfilters, {
                     'extra': {
                         'flat': extra.get('flat', True),
@@ -3052,8 +3067,10 @@ class PoolDatasetService(CRUDService):
                         'snapshots_properties': extra.get('snapshots_properties', [])
                     }
                 }
-            ), retrieve_children, internal_datasets_filters,
-            ), filters, options
+            )
+
+        return filter_list(
+            self.__transform(datasets, retrieve_children, internal_datasets_filters), filters, options
         )
 
     def _internal_user_props(self):
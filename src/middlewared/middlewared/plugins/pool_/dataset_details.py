@@ -1,4 +1,6 @@
+import asyncio
 import os
+from collections import defaultdict
 
 from middlewared.service import Service, private
 from middlewared.schema import accepts, List, returns
@@ -6,6 +8,48 @@ from middlewared.plugins.zfs_.utils import ZFSCTL
 from middlewared.utils.osc.linux.mount import getmntinfo
 
 
+class AttachmentIndex:
+    """
+    Consumers of datasets indexed by dataset name, path and mount source of the path they consume.
+    """
+
+    def __init__(self):
+        self.entries = []
+        self.by_dataset = defaultdict(list)
+        self.by_path = defaultdict(list)
+
+    def add(self, entry, dataset=None, path=None, mount_info=None, unique=True):
+        """
+        `entry` matches a dataset if it is `dataset`, if `path` is the dataset's mountpoint or if `path` resides on
+        the dataset according to `mount_info`. Unless `unique` is unset, an entry is returned once for a dataset even
+        if more than one of these match.
+        """
+        pos = len(self.entries)
+        self.entries.append((entry, unique))
+        if mount_info and mount_info.get('mount_source') is not None:
+            self.by_dataset[mount_info['mount_source']].append(pos)
+        if dataset is not None:
+            self.by_dataset[dataset].append(pos)
+        if path is not None:
+            self.by_path[path].append(pos)
+
+    def lookup(self, ds):
+        positions = self.by_dataset.get(ds['id'], [])
+        if ds['mountpoint'] is not None and ds['mountpoint'] in self.by_path:
+            positions = positions + self.by_path[ds['mountpoint']]
+
+        rv = []
+        seen = set()
+        for pos in sorted(positions):
+            entry, unique = self.entries[pos]
+            if unique:
+                if pos in seen:
+                    continue
+                seen.add(pos)
+            rv.append(entry)
+        return rv
+
+
 class PoolDatasetService(Service):
 
     class Config:
@@ -168,6 +212,7 @@ class PoolDatasetService(Service):
         options = {
             'extra': {
                 'flat': False,
+                'inventory': True,
                 'order_by': 'name',
                 'properties': [
                     'used',
@@ -201,24 +246,28 @@ class PoolDatasetService(Service):
             self.collapse_datasets(dataset, collapsed)
 
         mntinfo = getmntinfo()
-        info = self.build_details(mntinfo)
+        info = self.build_details(self.middleware.call_sync('pool.dataset.details_consumers'), mntinfo)
+        zvol_snapshot_counts = self.middleware.call_sync(
+            'zfs.inventory.snapshot_counts', [i['id'] for i in collapsed if i['type'] == 'VOLUME'],
+        )
+        mount_options = {info['mountpoint']: info['super_opts'] for info in mntinfo.values()}
         for i in collapsed:
-            snapshot_count, locked = self.get_snapcount_and_encryption_status(i, mntinfo)
-            atime, case = self.get_atime_and_casesensitivity(i, mntinfo)
+            snapshot_count, locked = self.get_snapcount_and_encryption_status(i, mntinfo, zvol_snapshot_counts)
+            atime, case = self.get_atime_and_casesensitivity(i, mount_options)
             i['snapshot_count'] = snapshot_count
             i['locked'] = locked
             i['atime'] = atime
             i['casesensitive'] = case
             i['thick_provisioned'] = any((i['reservation']['value'], i['refreservation']['value']))
-            i['nfs_shares'] = self.get_nfs_shares(i, info['nfs'])
-            i['smb_shares'] = self.get_smb_shares(i, info['smb'])
-            i['iscsi_shares'] = self.get_iscsi_shares(i, info['iscsi'])
-            i['vms'] = self.get_vms(i, info['vm'])
-            i['apps'] = self.get_apps(i, info['app'])
-            i['replication_tasks_count'] = self.get_repl_tasks_count(i, info['repl'])
-            i['snapshot_tasks_count'] = self.get_snapshot_tasks_count(i, info['snap'])
-            i['cloudsync_tasks_count'] = self.get_cloudsync_tasks_count(i, info['cloud'])
-            i['rsync_tasks_count'] = self.get_rsync_tasks_count(i, info['rsync'])
+            i['nfs_shares'] = info['nfs'].lookup(i)
+            i['smb_shares'] = info['smb'].lookup(i)
+            i['iscsi_shares'] = info['iscsi'].lookup(i)
+            i['vms'] = info['vm'].lookup(i)
+            i['apps'] = info['app'].lookup(i)
+            i['replication_tasks_count'] = len(info['repl'].lookup(i))
+            i['snapshot_tasks_count'] = len(info['snap'].lookup(i))
+            i['cloudsync_tasks_count'] = len(info['cloud'].lookup(i))
+            i['rsync_tasks_count'] = len(info['rsync'].lookup(i))
 
         return datasets
 
@@ -243,102 +292,141 @@ class PoolDatasetService(Service):
         return mount_info
 
     @private
-    def get_atime_and_casesensitivity(self, ds, mntinfo):
+    def get_atime_and_casesensitivity(self, ds, mount_options):
         atime = case = True
-        for devid, info in filter(lambda x: x[1]['mountpoint'] == ds['mountpoint'], mntinfo.items()):
-            atime = not ('NOATIME' in info['super_opts'])
-            case = 'CASESENSITIVE' in info['super_opts']
+        if (super_opts := mount_options.get(ds['mountpoint'])) is not None:
+            atime = not ('NOATIME' in super_opts)
+            case = 'CASESENSITIVE' in super_opts
 
         return atime, case
 
     @private
-    def build_details(self, mntinfo):
+    async def details_consumers(self):
+        """
+        Retrieve everything which can be consuming a dataset concurrently.
+        """
+        keys, calls = zip(*{
+            'iscsi_targetextent': ('iscsi.targetextent.query',),
+            'iscsi_target': ('iscsi.target.query',),
+            'iscsi_extent': ('iscsi.extent.query',),
+            'nfs': ('sharing.nfs.query',),
+            'smb': ('sharing.smb.query',),
+            'repl': ('datastore.query', 'storage.replication', [], {'prefix': 'repl_'}),
+            'snap': ('datastore.query', 'storage.task', [], {'prefix': 'task_'}),
+            'cloud': ('datastore.query', 'tasks.cloudsync'),
+            'rsync': ('rsynctask.query',),
+            'vm': ('datastore.query', 'vm.device', [['dtype', 'in', ['RAW', 'DISK']]]),
+            'app': ('chart.release.get_consumed_host_paths',),
+        }.items())
+        return dict(zip(keys, await asyncio.gather(*[self.middleware.call(*call) for call in calls])))
+
+    @private
+    def build_details(self, consumers, mntinfo):
+        """
+        Build indexes of everything consuming datasets so that each dataset can be matched against them
+        without iterating over all of the consumers.
+        """
         results = {
-            'iscsi': [], 'nfs': [], 'smb': [],
-            'repl': [], 'snap': [], 'cloud': [],
-            'rsync': [], 'vm': [], 'app': []
+            'iscsi': AttachmentIndex(), 'nfs': AttachmentIndex(), 'smb': AttachmentIndex(),
+            'repl': AttachmentIndex(), 'snap': AttachmentIndex(), 'cloud': AttachmentIndex(),
+            'rsync': AttachmentIndex(), 'vm': AttachmentIndex(), 'app': AttachmentIndex(),
         }
 
         # iscsi
-        t_to_e = self.middleware.call_sync('iscsi.targetextent.query')
-        t = {i['id']: i for i in self.middleware.call_sync('iscsi.target.query')}
-        e = {i['id']: i for i in self.middleware.call_sync('iscsi.extent.query')}
-        for i in filter(lambda x: x['target'] in t and t[x['target']]['groups'] and x['extent'] in e, t_to_e):
+        t = {i['id']: i for i in consumers['iscsi_target']}
+        e = {i['id']: i for i in consumers['iscsi_extent']}
+        for i in filter(
+            lambda x: x['target'] in t and t[x['target']]['groups'] and x['extent'] in e,
+            consumers['iscsi_targetextent'],
+        ):
             """
             1. make sure target's and extent's id exist in the target to extent table
             2. make sure the target has `groups` entry since, without it, it's impossible
                 that it's being shared via iscsi
             """
-            results['iscsi'].append({
-                'extent': e[i['extent']],
-                'target': t[i['target']],
-                'mount_info': self.get_mount_info(e[i['extent']]['path'], mntinfo),
-            })
+            extent = e[i['extent']]
+            if extent['type'] == 'DISK':
+                # we store extent information prefixed with `zvol/` (i.e. zvol/tank/zvol01).
+                results['iscsi'].add({
+                    'enabled': extent['enabled'],
+                    'type': 'DISK',
+                    'path': f'/dev/{extent["path"]}',
+                }, dataset=extent['path'].removeprefix('zvol/'))
+            elif extent['type'] == 'FILE':
+                # this isn't common but possible, you can share a "file"
+                # via iscsi which means it's not a dataset but a file inside
+                # a dataset so we need to find the source dataset for the file
+                results['iscsi'].add({
+                    'enabled': extent['enabled'],
+                    'type': 'FILE',
+                    'path': extent['path'],
+                }, mount_info=self.get_mount_info(extent['path'], mntinfo))
 
         # nfs and smb
-        for key in ('nfs', 'smb'):
-            for share in self.middleware.call_sync(f'sharing.{key}.query'):
-                share['mount_info'] = self.get_mount_info(share['path'], mntinfo)
-                results[key].append(share)
+        for share in consumers['nfs']:
+            results['nfs'].add(
+                {'enabled': share['enabled'], 'path': share['path']},
+                path=share['path'], mount_info=self.get_mount_info(share['path'], mntinfo),
+            )
+        for share in consumers['smb']:
+            results['smb'].add(
+                {'enabled': share['enabled'], 'path': share['path'], 'share_name': share['name']},
+                path=share['path'], mount_info=self.get_mount_info(share['path'], mntinfo),
+            )
 
         # replication
-        options = {'prefix': 'repl_'}
-        for task in self.middleware.call_sync('datastore.query', 'storage.replication', [], options):
+        for task in filter(lambda x: x['direction'] == 'PUSH', consumers['repl']):
+            # we only care about replication tasks that are configured to push
             # replication can only be configured on a dataset so getting mount info is unnecessary
-            results['repl'].append(task)
+            for src_ds in task['source_datasets']:
+                results['repl'].add(task, dataset=src_ds, unique=False)
 
         # snapshots
-        for task in self.middleware.call_sync('datastore.query', 'storage.task', [], {'prefix': 'task_'}):
+        for task in consumers['snap']:
             # snapshots can only be configured on a dataset so getting mount info is unnecessary
-            results['snap'].append(task)
-
-        # cloud sync
-        for task in self.middleware.call_sync('datastore.query', 'tasks.cloudsync'):
-            task['mount_info'] = self.get_mount_info(task['path'], mntinfo)
-            results['cloud'].append(task)
+            results['snap'].add(task, dataset=task['dataset'])
 
-        # rsync
-        for task in self.middleware.call_sync('rsynctask.query'):
-            task['mount_info'] = self.get_mount_info(task['path'], mntinfo)
-            results['rsync'].append(task)
+        # cloud sync and rsync
+        for key in ('cloud', 'rsync'):
+            for task in filter(lambda x: x['direction'] == 'PUSH', consumers[key]):
+                # we only care about tasks that are configured to push
+                results[key].add(task, path=task['path'], mount_info=self.get_mount_info(task['path'], mntinfo))
 
         # vm
-        for vm in self.middleware.call_sync('datastore.query', 'vm.device', [['dtype', 'in', ['RAW', 'DISK']]]):
+        for vm in consumers['vm']:
+            entry = {'name': vm['vm']['name'], 'path': vm['attributes']['path']}
             if vm['dtype'] == 'DISK':
                 # disk type is always a zvol
-                vm['zvol'] = vm['attributes']['path'].removeprefix('/dev/zvol/')
+                results['vm'].add(entry, dataset=vm['attributes']['path'].removeprefix('/dev/zvol/'), path=entry['path'])
             else:
                 # raw type is always a file
-                vm['mount_info'] = self.get_mount_info(vm['attributes']['path'], mntinfo)
-
-            results['vm'].append(vm)
+                results['vm'].add(
+                    entry, path=entry['path'], mount_info=self.get_mount_info(vm['attributes']['path'], mntinfo),
+                )
 
         # app
-        for app_name, paths in self.middleware.call_sync('chart.release.get_consumed_host_paths').items():
+        for app_name, paths in consumers['app'].items():
             # We want to filter out any other paths which might be consumed to improve performance here
             # and avoid unnecessary mount info calls i.e /proc /sys /etc/ etc
             for path in filter(
                 lambda x: x.startswith('/mnt/') and 'ix-applications/' not in x,
                 paths
             ):
-                results['app'].append({
-                    'name': app_name,
-                    'path': path,
-                    'mount_info': self.get_mount_info(path, mntinfo),
-                })
+                results['app'].add(
+                    {'name': app_name, 'path': path}, path=path, mount_info=self.get_mount_info(path, mntinfo),
+                )
 
         return results
 
     @private
-    def get_snapcount_and_encryption_status(self, ds, mntinfo):
+    def get_snapcount_and_encryption_status(self, ds, mntinfo, zvol_snapshot_counts):
         snap_count = 0
         locked = False
-        if ds['type'] == 'FILESYSTEM':
-            # FIXME: determining zvol snapshot count requires iterating over
-            # all snapshots for a given zvol and then counting them which is
-            # painful. This will be moot when this is merged upstream
-            # https://github.com/openzfs/zfs/pull/13635
-
+        if ds['type'] == 'VOLUME':
+            # zvols have no `.zfs/snapshot` directory so we count their snapshots
+            # using zfs inventory which is kept up to date using zfs events
+            snap_count = zvol_snapshot_counts.get(ds['id'], 0)
+        elif ds['type'] == 'FILESYSTEM':
             try:
                 st = os.stat(f'{ds["mountpoint"]}/.zfs/snapshot')
             except FileNotFoundError:
@@ -359,104 +447,3 @@ class PoolDatasetService(Service):
                     locked = ds['encrypted']
 
         return snap_count, locked
-
-    @private
-    def get_nfs_shares(self, ds, nfsshares):
-        nfs_shares = []
-        for share in nfsshares:
-            if share['path'] == ds['mountpoint'] or share['mount_info'].get('mount_source') == ds['id']:
-                nfs_shares.append({'enabled': share['enabled'], 'path': share['path']})
-
-        return nfs_shares
-
-    @private
-    def get_smb_shares(self, ds, smbshares):
-        smb_shares = []
-        for share in smbshares:
-            if share['path'] == ds['mountpoint'] or share['mount_info'].get('mount_source') == ds['id']:
-                smb_shares.append({
-                    'enabled': share['enabled'],
-                    'path': share['path'],
-                    'share_name': share['name']
-                })
-
-        return smb_shares
-
-    @private
-    def get_iscsi_shares(self, ds, iscsishares):
-        iscsi_shares = []
-        for share in iscsishares:
-            if share['extent']['type'] == 'DISK' and share['extent']['path'].removeprefix('zvol/') == ds['id']:
-                # we store extent information prefixed with `zvol/` (i.e. zvol/tank/zvol01).
-                iscsi_shares.append({
-                    'enabled': share['extent']['enabled'],
-                    'type': 'DISK',
-                    'path': f'/dev/{share["extent"]["path"]}',
-                })
-            elif share['extent']['type'] == 'FILE' and share['mount_info'].get('mount_source') == ds['id']:
-                # this isn't common but possible, you can share a "file"
-                # via iscsi which means it's not a dataset but a file inside
-                # a dataset so we need to find the source dataset for the file
-                iscsi_shares.append({
-                    'enabled': share['extent']['enabled'],
-                    'type': 'FILE',
-                    'path': share['extent']['path'],
-                })
-
-        return iscsi_shares
-
-    @private
-    def get_repl_tasks_count(self, ds, repltasks):
-        count = 0
-        for repl in filter(lambda x: x['direction'] == 'PUSH', repltasks):
-            # we only care about replication tasks that are configured to push
-            for src_ds in filter(lambda x: x == ds['id'], repl['source_datasets']):
-                count += 1
-
-        return count
-
-    @private
-    def get_snapshot_tasks_count(self, ds, snaptasks):
-        return len([i for i in snaptasks if i['dataset'] == ds['id']])
-
-    @private
-    def get_cloudsync_tasks_count(self, ds, cldtasks):
-        count = 0
-        for i in filter(lambda x: x['direction'] == 'PUSH', cldtasks):
-            # we only care about cloud sync tasks that are configured to push
-            if i['path'] == ds['mountpoint'] or i['mount_info'].get('mount_source') == ds['id']:
-                count += 1
-
-        return count
-
-    @private
-    def get_rsync_tasks_count(self, ds, rsynctasks):
-        count = 0
-        for i in filter(lambda x: x['direction'] == 'PUSH', rsynctasks):
-            # we only care about rsync tasks that are configured to push
-            if i['path'] == ds['mountpoint'] or i['mount_info'].get('mount_source') == ds['id']:
-                count += 1
-
-        return count
-
-    @private
-    def get_vms(self, ds, _vms):
-        vms = []
-        for i in _vms:
-            if (
-                'zvol' in i and i['zvol'] == ds['id'] or
-                i['attributes']['path'] == ds['mountpoint'] or
-                i.get('mount_info', {}).get('mount_source') == ds['id']
-            ):
-                vms.append({'name': i['vm']['name'], 'path': i['attributes']['path']})
-
-        return vms
-
-    @private
-    def get_apps(self, ds, _apps):
-        apps = []
-        for app in _apps:
-            if app['path'] == ds['mountpoint'] or app['mount_info'].get('mount_source') == ds['id']:
-                apps.append({'name': app['name'], 'path': app['path']})
-
-        return apps
@@ -1,5 +1,6 @@
 import psutil
-import time
+import queue
+import threading
 
 import humanfriendly
 
@@ -82,7 +83,8 @@ class RealtimeEventSource(EventSource):
             data['usage'] = 0
         return data
 
-    def get_memory_info(self, arc_size):
+    @staticmethod
+    def get_memory_info(arc_size):
         with open("/proc/meminfo") as f:
             meminfo = {
                 s[0]: humanfriendly.parse_size(s[1], binary=True)
@@ -123,81 +125,170 @@ class RealtimeEventSource(EventSource):
 
     def run_sync(self):
         interval = self.arg['interval']
-        cp_time_last = None
-        cp_times_last = None
-        last_iface_stats = {}
-        last_disk_stats = {}
-        internal_interfaces = tuple(self.middleware.call_sync('interface.internal_interfaces'))
-
-        while not self._cancel_sync.is_set():
-            data = {}
-
-            # ZFS ARC Size (raw value is in Bytes)
-            data['zfs'] = ZfsArcStats().read()
-
-            # Virtual memory use
-            data['memory'] = self.get_memory_info(data['zfs']['arc_size'])
-            data['virtual_memory'] = psutil.virtual_memory()._asdict()
-
-            # Get CPU usage %
-            data['cpu'] = {}
-            num_times = 10
-            with open('/proc/stat') as f:
-                stat = f.read()
-            cp_times = []
-            cp_time = []
-            for line in stat.split('\n'):
-                bits = line.split()
-                if bits[0].startswith('cpu'):
-                    line_ints = [int(i) for i in bits[1:]]
-                    # cpu has a sum of all cpus
-                    if bits[0] == 'cpu':
-                        cp_time = line_ints
-                    # cpuX is for each core
-                    else:
-                        cp_times += line_ints
-                else:
-                    break
-
-            if cp_time and cp_times and cp_times_last:
-                # Get the difference of times between the last check and the current one
-                # cp_time has a list with user, nice, system, interrupt and idle
-                cp_diff = list(map(lambda x: x[0] - x[1], zip(cp_times, cp_times_last)))
-                cp_nums = int(len(cp_times) / num_times)
-                for i in range(cp_nums):
-                    data['cpu'][i] = self.get_cpu_usages(cp_diff[i * num_times:i * num_times + num_times])
-
-                cp_diff = list(map(lambda x: x[0] - x[1], zip(cp_time, cp_time_last)))
-                data['cpu']['average'] = self.get_cpu_usages(cp_diff)
-
-            cp_time_last = cp_time
-            cp_times_last = cp_times
-
-            # CPU temperature
-            data['cpu']['temperature_celsius'] = self.middleware.call_sync('reporting.cpu_temperatures')
-            data['cpu']['temperature'] = {k: 2732 + int(v * 10) for k, v in data['cpu']['temperature_celsius'].items()}
-
-            # Interface IO Stats
-            with IfStats(interval, last_iface_stats, internal_interfaces) as ifstat:
-                if not last_iface_stats:
-                    # means this is the first time iface stats are being gathered so
-                    # get the results but don't set anything yet since we need to
-                    # calculate the difference between the iterations
-                    last_iface_stats, new = ifstat
+        samples = queue.Queue()
+        sampler = get_sampler(self.middleware, interval)
+        sampler.subscribe(samples)
+        try:
+            while not self._cancel_sync.is_set():
+                try:
+                    data = samples.get(timeout=interval)
+                except queue.Empty:
+                    continue
+
+                if isinstance(data, Exception):
+                    raise data
+
+                self.send_event('ADDED', fields=data)
+        finally:
+            sampler.unsubscribe(samples)
+
+
+class RealtimeSampler:
+    """
+    Collects `reporting.realtime` statistics every `interval` seconds in a single thread and publishes the same
+    snapshot to all subscribed queues. The thread is started with the first subscriber and stopped once the last
+    one unsubscribes.
+    """
+
+    def __init__(self, middleware, interval):
+        self.middleware = middleware
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.subscribers = set()
+        self.stop_event = None
+
+    def subscribe(self, samples):
+        with self.lock:
+            self.subscribers.add(samples)
+            if self.stop_event is None:
+                self.stop_event = threading.Event()
+                threading.Thread(
+                    target=self.run, args=(self.stop_event,), daemon=True,
+                    name=f'reporting_realtime_{self.interval}',
+                ).start()
+
+    def unsubscribe(self, samples):
+        with self.lock:
+            self.subscribers.discard(samples)
+            if not self.subscribers and self.stop_event is not None:
+                self.stop_event.set()
+                self.stop_event = None
+
+    def publish(self, stop_event, data):
+        with self.lock:
+            if stop_event.is_set():
+                # Last subscriber is gone (and a new sampling thread might have been started already)
+                return
+
+            subscribers = list(self.subscribers)
+
+        for samples in subscribers:
+            samples.put(data)
+
+    def run(self, stop_event):
+        state = None
+        while not stop_event.is_set():
+            try:
+                if state is None:
+                    state = RealtimeSamplerState(tuple(self.middleware.call_sync('interface.internal_interfaces')))
+
+                data = self.sample(state)
+            except Exception as e:
+                self.publish(stop_event, e)
+            else:
+                self.publish(stop_event, data)
+
+            stop_event.wait(self.interval)
+
+    def sample(self, state):
+        data = {}
+
+        # ZFS ARC Size (raw value is in Bytes)
+        data['zfs'] = ZfsArcStats().read()
+
+        # Virtual memory use
+        data['memory'] = RealtimeEventSource.get_memory_info(data['zfs']['arc_size'])
+        data['virtual_memory'] = psutil.virtual_memory()._asdict()
+
+        # Get CPU usage %
+        data['cpu'] = {}
+        num_times = 10
+        with open('/proc/stat') as f:
+            stat = f.read()
+        cp_times = []
+        cp_time = []
+        for line in stat.split('\n'):
+            bits = line.split()
+            if bits[0].startswith('cpu'):
+                line_ints = [int(i) for i in bits[1:]]
+                # cpu has a sum of all cpus
+                if bits[0] == 'cpu':
+                    cp_time = line_ints
+                # cpuX is for each core
                 else:
-                    last_iface_stats, data['interfaces'] = ifstat
+                    cp_times += line_ints
+            else:
+                break
 
-            # Disk IO Stats
-            if not last_disk_stats:
-                # means this is the first time disk stats are being gathered so
+        if cp_time and cp_times and state.cp_times_last:
+            # Get the difference of times between the last check and the current one
+            # cp_time has a list with user, nice, system, interrupt and idle
+            cp_diff = list(map(lambda x: x[0] - x[1], zip(cp_times, state.cp_times_last)))
+            cp_nums = int(len(cp_times) / num_times)
+            for i in range(cp_nums):
+                data['cpu'][i] = RealtimeEventSource.get_cpu_usages(cp_diff[i * num_times:i * num_times + num_times])
+
+            cp_diff = list(map(lambda x: x[0] - x[1], zip(cp_time, state.cp_time_last)))
+            data['cpu']['average'] = RealtimeEventSource.get_cpu_usages(cp_diff)
+
+        state.cp_time_last = cp_time
+        state.cp_times_last = cp_times
+
+        # CPU temperature
+        data['cpu']['temperature_celsius'] = self.middleware.call_sync('reporting.cpu_temperatures')
+        data['cpu']['temperature'] = {k: 2732 + int(v * 10) for k, v in data['cpu']['temperature_celsius'].items()}
+
+        # Interface IO Stats
+        with IfStats(self.interval, state.last_iface_stats, state.internal_interfaces) as ifstat:
+            if not state.last_iface_stats:
+                # means this is the first time iface stats are being gathered so
                 # get the results but don't set anything yet since we need to
                 # calculate the difference between the iterations
-                last_disk_stats, new = DiskStats(interval, last_disk_stats).read()
+                state.last_iface_stats, new = ifstat
             else:
-                last_disk_stats, data['disks'] = DiskStats(interval, last_disk_stats).read()
+                state.last_iface_stats, data['interfaces'] = ifstat
+
+        # Disk IO Stats
+        if not state.last_disk_stats:
+            # means this is the first time disk stats are being gathered so
+            # get the results but don't set anything yet since we need to
+            # calculate the difference between the iterations
+            state.last_disk_stats, new = DiskStats(self.interval, state.last_disk_stats).read()
+        else:
+            state.last_disk_stats, data['disks'] = DiskStats(self.interval, state.last_disk_stats).read()
+
+        return data
+
+
+class RealtimeSamplerState:
+    def __init__(self, internal_interfaces):
+        self.internal_interfaces = internal_interfaces
+        self.cp_time_last = None
+        self.cp_times_last = None
+        self.last_iface_stats = {}
+        self.last_disk_stats = {}
+
+
+SAMPLERS = {}
+SAMPLERS_LOCK = threading.Lock()
+
+
+def get_sampler(middleware, interval):
+    with SAMPLERS_LOCK:
+        if interval not in SAMPLERS:
+            SAMPLERS[interval] = RealtimeSampler(middleware, interval)
 
-            self.send_event('ADDED', fields=data)
-            time.sleep(interval)
+        return SAMPLERS[interval]
 
 
 def setup(middleware):
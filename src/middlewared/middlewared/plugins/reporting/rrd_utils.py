@@ -10,19 +10,68 @@ from typing import Optional
 
 import humanfriendly
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+try:
+    import rrdtool
+except ImportError:
+    rrdtool = None
+
 from middlewared.service_exception import CallError, ErrnoMixin
 
 
 RRD_BASE_DIR_PATH = '/var/db/collectd/rrd'
 RRD_BASE_PATH = os.path.join(RRD_BASE_DIR_PATH, 'localhost')
+RRDCACHED_SOCKET = 'unix:/var/run/rrdcached.sock'
 RE_COLON = re.compile('(.+):(.+)$')
-RE_LAST_UPDATE = re.compile(r'last_update = (\d+)')
 RE_NAME = re.compile(r'(%name_(\d+)%)')
 RE_NAME_NUMBER = re.compile(r'(.+?)(\d+)$')
 RE_RRDPLUGIN = re.compile(r'^(?P<name>.+)Plugin$')
 RRD_PLUGINS = {}
 
 
+def rrd_last_update(rrd_file):
+    """
+    Time of the last update of `rrd_file` (after flushing it through rrdcached) or `None` if it can't be read.
+    """
+    if rrdtool is not None:
+        try:
+            return rrdtool.last('--daemon', RRDCACHED_SOCKET, rrd_file)
+        except rrdtool.OperationalError:
+            return None
+
+    cp = subprocess.run(
+        ['rrdtool', 'last', '--daemon', RRDCACHED_SOCKET, rrd_file], capture_output=True, encoding='utf-8',
+    )
+    if cp.returncode == 0 and cp.stdout.strip().isdigit():
+        return int(cp.stdout)
+
+
+def rrd_xport(args):
+    """
+    Equivalent of `rrdtool xport --json <args>`, in-process if rrdtool python bindings are available.
+    """
+    if rrdtool is not None:
+        try:
+            data = rrdtool.xport(*args)
+        except rrdtool.OperationalError as e:
+            raise RuntimeError(f'Failed to export RRD data: {e}')
+
+        return {
+            'meta': {k: data['meta'][k] for k in ('start', 'end', 'step', 'legend')},
+            'data': [list(row) for row in data['data']],
+        }
+
+    cp = subprocess.run(['rrdtool', 'xport', '--json'] + args, capture_output=True)
+    if cp.returncode != 0:
+        raise RuntimeError(f'Failed to export RRD data: {cp.stderr.decode()}')
+
+    return json.loads(cp.stdout)
+
+
 class RRDMeta(type):
 
     def __new__(cls, name, bases, dct):
@@ -68,6 +117,11 @@ class RRDBase(object, metaclass=RRDMeta):
         'mean': statistics.mean,
         'max': max,
     }
+    NUMPY_AGG_MAP = {
+        'min': 'nanmin',
+        'mean': 'nanmean',
+        'max': 'nanmax',
+    }
 
     def __init__(self, middleware):
         self.middleware = middleware
@@ -205,15 +259,7 @@ class RRDBase(object, metaclass=RRDMeta):
 
     def export(self, identifier, starttime, endtime, aggregate=True):
         for rrd_file in self.get_rrd_files(identifier):
-            cp = subprocess.run([
-                'rrdtool',
-                'info',
-                '--daemon', 'unix:/var/run/rrdcached.sock',
-                rrd_file,
-            ], capture_output=True, encoding='utf-8')
-
-            if m := RE_LAST_UPDATE.search(cp.stdout):
-                last_update = int(m.group(1))
+            if (last_update := rrd_last_update(rrd_file)) is not None:
                 now = time.time()
                 if last_update > now + 1800:  # Tolerance for small system time adjustments
                     raise CallError(
@@ -223,19 +269,12 @@ class RRDBase(object, metaclass=RRDMeta):
                     )
 
         args = [
-            'rrdtool',
-            'xport',
-            '--daemon', 'unix:/var/run/rrdcached.sock',
-            '--json',
+            '--daemon', RRDCACHED_SOCKET,
             '--end', endtime,
             '--start', starttime,
         ]
         args.extend(self.get_defs(identifier))
-        cp = subprocess.run(args, capture_output=True)
-        if cp.returncode != 0:
-            raise RuntimeError(f'Failed to export RRD data: {cp.stderr.decode()}')
-
-        data = json.loads(cp.stdout)
+        data = rrd_xport(args)
         data = dict(
             name=self.name,
             identifier=identifier,
@@ -245,15 +284,34 @@ class RRDBase(object, metaclass=RRDMeta):
         )
 
         if self.aggregations and aggregate:
-            # Transpose the data matrix and remove null values
-            transposed = [list(filter(None.__ne__, i)) for i in zip(*data['data'])]
-            for agg in self.aggregations:
-                if agg in self.AGG_MAP:
-                    data['aggregations'][agg] = [
-                        (self.AGG_MAP[agg](i) if i else None)
-                        for i in transposed
-                    ]
-                else:
-                    raise RuntimeError(f'Aggregation {agg!r} is invalid.')
+            data['aggregations'] = self.aggregate(data['data'])
 
         return data
+
+    def aggregate(self, rows):
+        """
+        Calculate `self.aggregations` for every column of `rows` ignoring null values.
+        """
+        for agg in self.aggregations:
+            if agg not in self.AGG_MAP:
+                raise RuntimeError(f'Aggregation {agg!r} is invalid.')
+
+        if numpy is None or not rows:
+            # Transpose the data matrix and remove null values
+            transposed = [list(filter(None.__ne__, i)) for i in zip(*rows)]
+            return {
+                agg: [(self.AGG_MAP[agg](i) if i else None) for i in transposed]
+                for agg in self.aggregations
+            }
+
+        matrix = numpy.array(rows, dtype=float)  # Null values become NaN
+        has_values = (~numpy.isnan(matrix)).any(axis=0)
+        # Columns without any values are left out so that numpy does not warn about all-NaN slices
+        matrix = matrix[:, has_values]
+        has_values = has_values.tolist()
+        result = {}
+        for agg in self.aggregations:
+            values = iter(getattr(numpy, self.NUMPY_AGG_MAP[agg])(matrix, axis=0).tolist())
+            result[agg] = [(next(values) if has else None) for has in has_values]
+
+        return result
@@ -1,3 +1,4 @@
+from concurrent.futures import ThreadPoolExecutor
 import copy
 import errno
 
@@ -10,6 +11,9 @@ from middlewared.validators import Range
 
 from .rrd_utils import RRD_PLUGINS
 
+# Maximum number of graphs exported concurrently by a single `reporting.get_data`/`reporting.get_all` call
+EXPORT_WORKERS = 8
+
 
 class ReportingModel(sa.Model):
     __tablename__ = 'system_reporting'
@@ -254,26 +258,37 @@ class ReportingService(ConfigService):
 
         """
         starttime, endtime = self.__rquery_to_start_end(query)
-        rv = []
+        exports = []
         for i in graphs:
             try:
-                rrd = self.__rrds[i['name']]
+                exports.append((self.__rrds[i['name']], i['identifier']))
             except KeyError:
                 raise CallError(f'Graph {i["name"]!r} not found.', errno.ENOENT)
-            rv.append(
-                rrd.export(i['identifier'], starttime, endtime, aggregate=query['aggregate'])
-            )
-        return rv
+        return self.__export(exports, starttime, endtime, query['aggregate'])
 
     @private
     @accepts(Ref('reporting_query'))
     def get_all(self, query):
         starttime, endtime = self.__rquery_to_start_end(query)
-        rv = []
+        exports = []
         for rrd in self.__rrds.values():
             idents = rrd.get_identifiers()
             if idents is None:
                 idents = [None]
             for ident in idents:
-                rv.append(rrd.export(ident, starttime, endtime, aggregate=query['aggregate']))
-        return rv
+                exports.append((rrd, ident))
+        return self.__export(exports, starttime, endtime, query['aggregate'])
+
+    def __export(self, exports, starttime, endtime, aggregate):
+        """
+        Export `(rrd, identifier)` pairs concurrently, results are returned in the same order.
+        """
+        def export(item):
+            rrd, identifier = item
+            return rrd.export(identifier, starttime, endtime, aggregate=aggregate)
+
+        if len(exports) <= 1:
+            return list(map(export, exports))
+
+        with ThreadPoolExecutor(min(len(exports), EXPORT_WORKERS), 'RRDExport') as executor:
+            return list(executor.map(export, exports))
@@ -35,3 +35,15 @@ class IdmapService(SimpleService):
             return
 
         return await self._systemd_unit("winbind", "reload")
+
+    async def after_start(self):
+        await self.middleware.call("idmap.clear_resolver_cache")
+
+    async def after_stop(self):
+        await self.middleware.call("idmap.clear_resolver_cache")
+
+    async def after_restart(self):
+        await self.middleware.call("idmap.clear_resolver_cache")
+
+    async def after_reload(self):
+        await self.middleware.call("idmap.clear_resolver_cache")
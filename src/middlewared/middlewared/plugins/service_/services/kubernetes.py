@@ -21,6 +21,8 @@ class KubernetesService(SimpleService):
     async def clear_chart_releases_cache(self):
         await self.middleware.call('chart.release.clear_cached_chart_releases')
         await self.middleware.call('chart.release.clear_portal_cache')
+        await self.middleware.call('chart.release.clear_decoded_releases_cache')
+        await self.middleware.call('k8s.cache.reset')
 
     async def unmount_kubelet_dataset(self):
         if os.path.ismount(self.kubelet_mountpoint):
@@ -1,6 +1,5 @@
 import asyncio
 from datetime import datetime, timedelta, timezone
-import functools
 import re
 import time
 
@@ -12,7 +11,7 @@ from middlewared.schema import accepts, Bool, Cron, Datetime, Dict, Int, Float,
 from middlewared.service import (
     CRUDService, filterable, filterable_returns, filter_list, job, private, SystemServiceService, ValidationErrors
 )
-from middlewared.service_exception import CallError, MatchNotFound
+from middlewared.service_exception import CallError
 import middlewared.sqlalchemy as sa
 from middlewared.utils.asyncio_ import asyncio_map
 
@@ -23,19 +22,6 @@ RE_TIME_SCSIPRINT_EXTENDED = re.compile(r'Please wait (\d+) minutes for test to
 RE_OF_TEST_REMAINING = re.compile(r'([0-9]+)% of test remaining')
 
 
-async def annotate_disk_smart_tests(middleware, tests_filter, disk):
-    if disk["disk"] is None:
-        return
-
-    output = await middleware.call("disk.smartctl", disk["disk"], ["-a"], {"silent": True})
-    if output is None:
-        return
-
-    tests = parse_smart_selftest_results(output) or []
-    current_test = parse_current_smart_selftest(output)
-    return dict(tests=filter_list(tests, tests_filter), current_test=current_test, **disk)
-
-
 def parse_smart_selftest_results(stdout):
     tests = []
 
@@ -494,6 +480,9 @@ class SMARTTestService(CRUDService):
                 # scsiprint.cpp does not always print expected result time
                 expected_result_time = datetime.utcnow() + timedelta(minutes=1)
 
+            # Test results have changed
+            await self.middleware.call('smart.collection.invalidate', disk['disk'])
+
             if expected_result_time:
                 output['expected_result_time'] = expected_result_time
                 output['job'] = (
@@ -534,6 +523,9 @@ class SMARTTestService(CRUDService):
 
         `options.extra.tests_filter` is an optional filter for tests results.
 
+        Results are read from S.M.A.R.T. data collected within the last 290 seconds (data shared with disk
+        temperature monitoring).
+
         .. examples(websocket)::
 
           Get all disks tests results
@@ -619,19 +611,28 @@ class SMARTTestService(CRUDService):
         get = options.pop("get", False)
         tests_filter = options["extra"].pop("tests_filter", [])
 
-        disks = filter_list(
-            [dict(disk, disk=disk["name"]) for disk in (await self.disk_choices(True)).values()],
-            filters,
-            options,
-        )
+        disks = [
+            disk for disk in filter_list(
+                [dict(disk, disk=disk["name"]) for disk in (await self.disk_choices(True)).values()],
+                filters,
+                options,
+            )
+            if disk["disk"] is not None
+        ]
+
+        # Shared with disk temperature monitoring
+        snapshot = await self.middleware.call("smart.collection.get", [disk["disk"] for disk in disks])
 
         return filter_list(
-            list(filter(
-                None,
-                await asyncio_map(functools.partial(annotate_disk_smart_tests, self.middleware, tests_filter),
-                                  disks,
-                                  16)
-            )),
+            [
+                dict(
+                    tests=filter_list(snapshot[disk["disk"]]["tests"], tests_filter),
+                    current_test=snapshot[disk["disk"]]["current_test"],
+                    **disk,
+                )
+                for disk in disks
+                if snapshot[disk["disk"]] is not None
+            ],
             [],
             {"get": get},
         )
@@ -647,15 +648,10 @@ class SMARTTestService(CRUDService):
         end_monotime = start_monotime + (expected_result_time - start).total_seconds()
 
         while True:
-            try:
-                current_test = (await self.middleware.call(
-                    'smart.test.results',
-                    [['disk', '=', disk['disk']]],
-                    {'get': True}
-                ))['current_test']
-            except MatchNotFound:
+            if (entry := await self.middleware.call('smart.collection.refresh', disk['disk'])) is None:
                 raise CallError(f'No S.M.A.R.T. test results found for {disk["disk"]}')
 
+            current_test = entry['current_test']
             if current_test is None:
                 return
 
@@ -0,0 +1,133 @@
+import asyncio
+import copy
+import time
+
+import async_timeout
+
+from middlewared.common.smart.smartctl import SMARTCTL_POWERMODES
+from middlewared.plugins.disk_.temperature import get_temperature
+from middlewared.plugins.smart import parse_current_smart_selftest, parse_smart_selftest_results
+from middlewared.schema import accepts, Dict, Int, List, Str
+from middlewared.service import Service
+from middlewared.utils.asyncio_ import asyncio_map
+
+# A little less than collectd polling interval of 300 seconds so that every poll collects fresh data
+SNAPSHOT_MAX_AGE = 290
+COLLECTION_CONCURRENCY = 16
+
+
+def parse_smartctl_output(name, serial, output):
+    """
+    Parse `smartctl -a` `output` of disk `name` into a snapshot entry.
+    """
+    return {
+        'disk': name,
+        'serial': serial,
+        'collected_at': time.monotonic(),
+        'temperature': get_temperature(output),
+        'tests': parse_smart_selftest_results(output) or [],
+        'current_test': parse_current_smart_selftest(output),
+    }
+
+
+class SMARTCollectionService(Service):
+    """
+    Snapshot of S.M.A.R.T. data of all the disks that temperature monitoring and self-test results are served from.
+
+    `smartctl -a` is run at most once per disk per `max_age` seconds (no matter how many consumers ask for it) and
+    its output is parsed once.
+    """
+
+    class Config:
+        namespace = 'smart.collection'
+        private = True
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Disk serial (or name for disks without serial) -> snapshot entry
+        self.snapshot = {}
+        # (key, powermode) -> future of running collection
+        self.pending = {}
+        self.collections = 0
+
+    @accepts(
+        List('names', items=[Str('name')]),
+        Dict(
+            'options',
+            Int('max_age', default=SNAPSHOT_MAX_AGE, null=True),
+            Str('powermode', enum=SMARTCTL_POWERMODES, default=SMARTCTL_POWERMODES[0]),
+            Int('timeout', default=None, null=True),
+        ),
+    )
+    async def get(self, names, options):
+        """
+        Returns snapshot entries of disks `names` (`null` for disks with S.M.A.R.T. data unavailable).
+
+        Entries older than `max_age` seconds (all of them if it is `null`) are collected again using `powermode`.
+        Disks which do not finish collection in `timeout` seconds are reported as unavailable.
+        """
+        keys = await self._keys(names)
+        now = time.monotonic()
+
+        async def entry(name):
+            if options['max_age'] is not None:
+                cached = self.snapshot.get(keys[name])
+                if cached is not None and cached['collected_at'] > now - options['max_age']:
+                    return dict(copy.deepcopy(cached), disk=name)
+
+            return await self._collect(name, keys[name], options['powermode'], options['timeout'])
+
+        return dict(zip(names, await asyncio_map(entry, names, COLLECTION_CONCURRENCY)))
+
+    @accepts(Str('name'), Str('powermode', enum=SMARTCTL_POWERMODES, default=SMARTCTL_POWERMODES[0]))
+    async def refresh(self, name, powermode):
+        """
+        Collect S.M.A.R.T. data of disk `name` now and return its snapshot entry.
+        """
+        return (await self.get([name], {'max_age': None, 'powermode': powermode}))[name]
+
+    async def invalidate(self, name):
+        """
+        Make next `get` collect S.M.A.R.T. data of disk `name` again (i.e. after a self-test was started).
+        """
+        self.snapshot.pop((await self._keys([name]))[name], None)
+
+    def stats(self):
+        return {
+            'disks': len(self.snapshot),
+            'pending': len(self.pending),
+            'collections': self.collections,
+        }
+
+    async def _keys(self, names):
+        devices = await self.middleware.call('device.get_disks')
+        return {name: (devices.get(name) or {}).get('serial') or name for name in names}
+
+    async def _collect(self, name, key, powermode, timeout):
+        pending_key = (key, powermode)
+        if (future := self.pending.get(pending_key)) is None:
+            future = self.pending[pending_key] = asyncio.ensure_future(self._run(name, key, powermode))
+            future.add_done_callback(
+                lambda f: self.pending.pop(pending_key) if self.pending.get(pending_key) is f else None
+            )
+
+        try:
+            # Other consumers might be waiting for the same collection, do not cancel it on timeout
+            async with async_timeout.timeout(timeout):
+                entry = await asyncio.shield(future)
+        except asyncio.TimeoutError:
+            return None
+
+        if entry is not None:
+            return dict(copy.deepcopy(entry), disk=name)
+
+    async def _run(self, name, key, powermode):
+        output = await self.middleware.call(
+            'disk.smartctl', name, ['-a', '-n', powermode.lower()], {'silent': True},
+        )
+        self.collections += 1
+        if output is None:
+            return None
+
+        entry = self.snapshot[key] = parse_smartctl_output(name, key, output)
+        return entry
@@ -53,6 +53,12 @@ class ShareSec(CRUDService):
         # Share name is always enclosed in brackets. Remove them.
         parsed_share_sd['share_name'] = sd_lines[0][1:-1]
 
+        if options.get('resolve_sids', True) is True:
+            # Resolve all SIDs at once, lookups of individual entries below are then served from idmap cache
+            await self.middleware.call('idmap.sids_to_names', [
+                m.group('ae_who_sid') for m in map(RE_SHAREACLENTRY.match, sd_lines[5:]) if m is not None
+            ])
+
         # ACL entries begin at line 5 in the Security Descriptor
         for i in sd_lines[5:]:
             acl_entry = {}
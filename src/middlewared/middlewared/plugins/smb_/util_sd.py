@@ -204,6 +204,10 @@ class SMBService(Service):
     @private
     async def smb_to_nfsv4(self, sd, ignore_errors=False):
         acl_out = {"uid": None, "gid": None, "acl": []}
+        # Resolve all trustees at once, lookups of individual entries below are then served from idmap cache
+        await self.middleware.call('idmap.sids_to_unixids', [
+            x['trustee']['sid'] for x in sd['dacl'] if x['trustee']['sid'] not in ACLPrincipal.sids()
+        ])
         for x in sd['dacl']:
             entry = {'tag': None, 'id': None, 'type': None, 'perms': {}, 'flags': {}}
             entry['perms'] = ACLPerms.convert('SMB', x['access_mask']['special'])
@@ -4,7 +4,7 @@ from middlewared.service_exception import CallError, MatchNotFound
 from middlewared.utils import filter_list
 from .connection import TDBMixin
 from .schema import SchemaMixin
-from .wrapper import TDBPath
+from .wrapper import TDBPath, tdb_path
 
 import ctdb
 import errno
@@ -13,7 +13,7 @@ import os
 import threading
 
 from base64 import b64encode, b64decode
-from contextlib import contextmanager
+from contextlib import contextmanager, suppress
 
 
 class TDBService(Service, TDBMixin, SchemaMixin):
@@ -178,6 +178,54 @@ class TDBService(Service, TDBMixin, SchemaMixin):
 
         return data
 
+    @accepts(Dict(
+        'tdb-replace',
+        Str('name', required=True),
+        List('ops', required=True),
+        Ref('tdb-options'),
+    ))
+    def replace(self, data):
+        """
+        Replace contents of tdb file with the result of `ops` (as in `tdb.batch_ops`) applied to an empty file.
+
+        New contents are written to a shadow file in a single transaction which is then renamed over the original
+        one so readers only ever see either the old or the new contents.
+        """
+        name = data['name']
+        options = data['tdb-options']
+        self.validate_tdb_options(name, options)
+        if options['cluster']:
+            raise CallError(f'{name}: clustered tdb files can not be replaced', errno.EINVAL)
+
+        shadow_path = f'{tdb_path(name, options)}.shadow'
+        with suppress(FileNotFoundError):
+            # Left over by an interrupted replace
+            os.unlink(shadow_path)
+
+        shadow = self._get_handle(shadow_path, None, {**options, 'backend': 'CUSTOM'}, self.logger)
+        try:
+            output = self._batch_ops(shadow, data['ops'])
+        except Exception:
+            self._close_handle(shadow)
+            os.unlink(shadow_path)
+            raise
+
+        self._close_handle(shadow)
+        entry = self.handles.setdefault(name, {
+            'name': name,
+            'lock': threading.RLock(),
+            'handle_internal': None,
+            'options': options.copy()
+        })
+        with entry['lock']:
+            os.rename(shadow_path, tdb_path(name, options))
+            if entry['handle_internal'] is not None:
+                # Next `get_connection` opens the new file
+                self._close_handle(entry['handle_internal'])
+                entry['handle_internal'] = None
+
+        return output
+
     @accepts(Dict(
         'tdb-wipe',
         Str('name', required=True),
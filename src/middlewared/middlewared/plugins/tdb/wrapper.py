@@ -14,6 +14,14 @@ class TDBPath(enum.Enum):
     CUSTOM = ''
 
 
+def tdb_path(name, options):
+    tdb_type = options.get('backend', 'PERSISTENT')
+    if tdb_type == 'CUSTOM':
+        return name
+
+    return f'{TDBPath[tdb_type].value}/{name}.tdb'
+
+
 class TDBWrap(object):
     hdl = None
     name = None
@@ -101,13 +109,11 @@ class TDBWrap(object):
 
     def __init__(self, name, options, logger):
         self.name = str(name)
-        tdb_type = options.get('backend', 'PERSISTENT')
         tdb_flags = tdb.DEFAULT
         open_flags = os.O_CREAT | os.O_RDWR
         open_mode = 0o600
 
-        if tdb_type != 'CUSTOM':
-            name = f'{TDBPath[tdb_type].value}/{name}.tdb'
+        name = tdb_path(name, options)
 
         self.full_path = name
         self.hdl = tdb.Tdb(name, 0, tdb_flags, open_flags, open_mode)
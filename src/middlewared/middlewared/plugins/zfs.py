@@ -3,10 +3,12 @@ import errno
 import os
 import subprocess
 from collections import defaultdict
-from copy import deepcopy
 
 import libzfs
 
+from middlewared.plugins.zfs_.dataset_query import (
+    dataset_query_properties, dataset_query_roots, flatten_datasets, flatten_datasets_filtered,
+)
 from middlewared.plugins.zfs_.utils import zvol_path_to_name, unlocked_zvols_fast
 from middlewared.plugins.zfs_.validation_utils import validate_snapshot_name
 from middlewared.schema import accepts, Any, Bool, Dict, Int, List, Ref, Str
@@ -503,7 +505,7 @@ class ZFSDatasetService(CRUDService):
         ]
 
     def flatten_datasets(self, datasets):
-        return sum([[deepcopy(ds)] + self.flatten_datasets(ds.get('children') or []) for ds in datasets], [])
+        return flatten_datasets(datasets)
 
     @filterable
     def query(self, filters, options):
@@ -552,27 +554,31 @@ class ZFSDatasetService(CRUDService):
             user_properties = False
             props = []
 
+        # Only serialize properties which are going to be returned or are required for filtering
+        props, user_properties = dataset_query_properties(props, user_properties, filters, options)
+        # Start iterating from datasets which can match `filters` instead of all datasets in the system
+        roots = dataset_query_roots(filters, flat)
+        if roots == []:
+            return filter_list([], filters, options)
+
         with libzfs.ZFS() as zfs:
-            # Handle `id` filter specially to avoiding getting all datasets
             kwargs = dict(
                 props=props, user_props=user_properties, snapshots=snapshots, retrieve_children=retrieve_children,
                 snapshots_recursive=snapshots_recursive, snapshot_props=snapshots_properties
             )
-            if filters and filters[0][0] == 'id':
-                if filters[0][1] == '=':
-                    kwargs['datasets'] = [filters[0][2]]
-                if filters[0][1] == 'in':
-                    kwargs['datasets'] = filters[0][2]
+            if roots is not None:
+                kwargs['datasets'] = roots
 
             datasets = zfs.datasets_serialized(**kwargs)
             if flat:
-                datasets = self.flatten_datasets(datasets)
+                # Only datasets matching `filters` are copied into the flat list
+                datasets = flatten_datasets_filtered(datasets, filters)
             else:
                 datasets = list(datasets)
 
         return filter_list(datasets, filters, options)
 
-    def query_for_quota_alert(self):
+    async def query_for_quota_alert(self):
         options = {
             'extra': {
                 'properties': [
@@ -593,7 +599,7 @@ class ZFSDatasetService(CRUDService):
         }
         return [
             {k: v for k, v in i['properties'].items() if k in options['extra']['properties']}
-            for i in self.query([], options)
+            for i in await self.middleware.call('zfs.inventory.datasets_query', [], options)
         ]
 
     @accepts(
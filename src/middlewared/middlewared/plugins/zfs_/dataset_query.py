@@ -0,0 +1,168 @@
+from copy import deepcopy
+
+from middlewared.utils import filter_getattrs, partition
+from middlewared.utils.query_filters import compile_filters
+
+# Keys of a serialized dataset that do not depend on retrieved properties
+PUSHDOWN_ATTRS = {'id', 'name', 'pool', 'type'}
+
+
+def _id_prefix_root(prefix):
+    """
+    Dataset whose subtree contains every dataset with name starting with `prefix`.
+    """
+    if prefix.endswith('/'):
+        return prefix[:-1]
+    elif '/' in prefix:
+        return prefix.rsplit('/', 1)[0]
+
+
+def _filter_roots(f, flat):
+    """
+    Return list of datasets (including their children) which are a superset of datasets matching filter `f` or
+    `None` if that can't be determined.
+    """
+    if len(f) == 2:
+        if f[0] != 'OR' or not flat:
+            return None
+
+        roots = []
+        for or_filter in f[1]:
+            or_roots = _filter_roots(or_filter, flat)
+            if or_roots is None:
+                return None
+            roots.extend(or_roots)
+        return roots
+
+    if len(f) != 3:
+        return None
+
+    name, op, value = f
+    if name in ('id', 'name') and isinstance(value, str):
+        if op == '=':
+            return [value]
+        elif op == '^' and flat:
+            root = _id_prefix_root(value)
+            return [root] if root else None
+    elif name in ('id', 'name') and op == 'in' and isinstance(value, (list, tuple)):
+        if all(isinstance(v, str) for v in value):
+            return list(value)
+    elif name == 'pool' and isinstance(value, str):
+        if op == '=':
+            return [value]
+    elif name == 'pool' and op == 'in' and isinstance(value, (list, tuple)):
+        if all(isinstance(v, str) for v in value):
+            return list(value)
+
+    return None
+
+
+def _optimize_roots(roots):
+    """
+    Remove datasets which are children of other datasets already in `roots`.
+    """
+    rv = []
+    for name in sorted(set(roots), key=len):
+        if not any(name.startswith(f'{existing}/') for existing in rv):
+            rv.append(name)
+    return rv
+
+
+def dataset_query_roots(filters, flat=True):
+    """
+    Determine which datasets libzfs should start iterating from to satisfy `filters`.
+
+    Returns `None` if all datasets need to be iterated.
+
+    Hierarchical (non-flat) output is filtered on top level datasets only so for it we only push down filters
+    which keep the same top level datasets: `pool` filters and a leading `id` filter (historical behavior).
+    """
+    for i, f in enumerate(filters or []):
+        if not flat and not (
+            len(f) == 3 and f[1] in ('=', 'in') and (f[0] == 'pool' or (f[0] == 'id' and i == 0))
+        ):
+            continue
+
+        roots = _filter_roots(f, flat)
+        if roots is not None:
+            return _optimize_roots(roots) if flat else list(roots)
+
+    return None
+
+
+def _referenced_properties(attrs):
+    props = set()
+    for attr in attrs:
+        if attr == 'mountpoint':
+            props.add('mountpoint')
+        else:
+            # Parse escaped dots the same way `filter_list` does, i.e. `properties.org\\.freenas:description`
+            name, path = partition(attr)
+            if name == 'properties' and path:
+                props.add(partition(path)[0])
+    return props
+
+
+def dataset_query_properties(props, user_props, filters, options):
+    """
+    Narrow down properties to retrieve when `select` query-option does not include them.
+
+    Returns a tuple of (`props`, `user_props`).
+    """
+    select = options.get('select')
+    if not select or 'properties' in select:
+        return props, user_props
+
+    referenced = _referenced_properties(
+        filter_getattrs(list(filters or [])) | set(select) | {o.lstrip('-') for o in options.get('order_by') or []}
+    )
+    if props is None:
+        props = sorted(p for p in referenced if ':' not in p)
+    else:
+        props = [p for p in props if p in referenced]
+
+    return props, user_props and any(':' in p for p in referenced)
+
+
+def filter_pushdown_filters(filters):
+    """
+    Return filters which only reference attributes that are present in `zfs.dataset.query` as well as
+    in its consumers' output so they can be evaluated while querying libzfs.
+    """
+    rv = []
+    for f in filters or []:
+        try:
+            attrs = filter_getattrs([f])
+        except ValueError:
+            continue
+
+        if attrs and attrs <= PUSHDOWN_ATTRS:
+            rv.append(deepcopy(f))
+
+    return rv
+
+
+def flatten_datasets(datasets, predicate=None):
+    """
+    Flatten hierarchical datasets so that each dataset becomes a separate entry still containing its children.
+
+    Every entry is a separate copy so that consumers are free to modify them. If `predicate` is specified, only
+    datasets matching it are copied and returned.
+    """
+    rv = []
+    stack = list(reversed(datasets))
+    while stack:
+        ds = stack.pop()
+        if predicate is None or predicate(ds):
+            rv.append(deepcopy(ds))
+        stack.extend(reversed(ds.get('children') or []))
+    return rv
+
+
+def flatten_datasets_filtered(datasets, filters):
+    try:
+        predicate = compile_filters(filters)
+    except ValueError:
+        # Let `filter_list` report malformed filters
+        predicate = None
+    return flatten_datasets(datasets, predicate)
@@ -0,0 +1,298 @@
+import asyncio
+import copy
+import time
+
+from middlewared.plugins.zfs_.dataset_query import flatten_datasets
+from middlewared.service import Service, filterable
+from middlewared.utils import filter_list
+
+# Properties kept up to date for every dataset in the inventory. These cover `pool.dataset.details` and
+# quota alerts, consumers asking for properties outside of this list should query libzfs directly.
+INVENTORY_PROPERTIES = [
+    'available',
+    'compression',
+    'dedup',
+    'encryption',
+    'encryptionroot',
+    'keyformat',
+    'keystatus',
+    'mounted',
+    'mountpoint',
+    'name',
+    'quota',
+    'refquota',
+    'refreservation',
+    'reservation',
+    'sync',
+    'used',
+    'usedbychildren',
+    'usedbydataset',
+    'usedbysnapshots',
+    'volsize',
+]
+# Space accounting properties change without any zfs event being generated so by default they are re-read if they
+# are older than this
+INVENTORY_MAX_AGE = 60
+INVENTORY_SPACE_PROPERTIES = ['available', 'used', 'usedbychildren', 'usedbydataset', 'usedbysnapshots']
+# History events for which only the dataset in question (and its descendants) need to be reloaded
+DATASET_HISTORY_EVENTS = ('clone', 'create', 'inherit', 'receive', 'rollback', 'set')
+INVENTORY_LOCK = asyncio.Lock()
+POOL_EVENTS = (
+    'sysevent.fs.zfs.config_sync',
+    'sysevent.fs.zfs.pool_create',
+    'sysevent.fs.zfs.pool_destroy',
+    'sysevent.fs.zfs.pool_import',
+)
+
+
+def inventory_can_serve(props):
+    """
+    Whether the inventory keeps all of the dataset properties in `props`. User properties are always kept.
+    """
+    return props is not None and {p for p in props if ':' not in p} <= set(INVENTORY_PROPERTIES)
+
+
+def is_child_or_same(name, parent):
+    return name == parent or name.startswith(f'{parent}/')
+
+
+def snapshot_entry(name):
+    dataset, snapshot_name = name.split('@', 1)
+    return {
+        'id': name,
+        'name': name,
+        'pool': dataset.split('/', 1)[0],
+        'dataset': dataset,
+        'snapshot_name': snapshot_name,
+        'type': 'SNAPSHOT',
+    }
+
+
+class ZFSInventoryService(Service):
+
+    class Config:
+        namespace = 'zfs.inventory'
+        private = True
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.datasets = {}
+        self.snapshots = {}
+        # Datasets whose subtree (datasets and snapshots) has changed since the last refresh
+        self.dirty = set()
+        self.built_at = None
+        self.space_refreshed_at = None
+        # Events received while inventory is being refreshed, `None` if it is not
+        self.pending_events = None
+
+    async def refresh(self, force=False, max_age=INVENTORY_MAX_AGE):
+        """
+        Make sure inventory is up to date.
+
+        Inventory is rebuilt completely if `force` is set or if it was invalidated (i.e. zfs events might have been
+        missed), otherwise only datasets changed since the last refresh (as reported by zfs events) are reloaded and
+        space accounting properties are re-read if they are older than `max_age` seconds (`None` to skip them).
+        """
+        async with INVENTORY_LOCK:
+            self.pending_events = []
+            try:
+                if force or self.built_at is None:
+                    await self.rebuild()
+                else:
+                    if self.dirty:
+                        roots = self.dirty.copy()
+                        self.dirty.clear()
+                        await self.reload(roots)
+
+                    if max_age is not None and time.monotonic() - self.space_refreshed_at > max_age:
+                        await self.refresh_space()
+            finally:
+                events, self.pending_events = self.pending_events, None
+                # Query results swapped in might have been retrieved before these events happened
+                for data in events:
+                    self.apply_event(data)
+
+    async def rebuild(self):
+        self.dirty.clear()
+        built_at = time.monotonic()
+        datasets = await self.query_datasets([])
+        snapshots = await self.middleware.call('zfs.snapshot.query', [], {'select': ['name']})
+
+        self.datasets = {ds['id']: ds for ds in datasets}
+        self.snapshots = {snap['name']: snapshot_entry(snap['name']) for snap in snapshots}
+        self.built_at = self.space_refreshed_at = built_at
+
+    async def refresh_space(self):
+        refreshed_at = time.monotonic()
+        datasets = await self.query_datasets([], INVENTORY_SPACE_PROPERTIES, False)
+        if {ds['id'] for ds in datasets} != set(self.datasets):
+            # Datasets were created or destroyed without the inventory being notified
+            await self.rebuild()
+            return
+
+        for ds in datasets:
+            self.datasets[ds['id']]['properties'].update(ds['properties'])
+        self.space_refreshed_at = refreshed_at
+
+    async def reload(self, roots):
+        roots = [
+            name for name in sorted(roots, key=len)
+            if not any(is_child_or_same(name, parent) for parent in roots if parent != name)
+        ]
+        datasets = await self.query_datasets([['id', 'in', roots]])
+        snapshots = await self.middleware.call(
+            'zfs.snapshot.query', [['dataset', 'in', [ds['id'] for ds in datasets]]], {'select': ['name']},
+        ) if datasets else []
+
+        for name in filter(lambda i: any(is_child_or_same(i, root) for root in roots), list(self.datasets)):
+            self.datasets.pop(name)
+        for name in filter(
+            lambda i: any(is_child_or_same(i.split('@', 1)[0], root) for root in roots), list(self.snapshots)
+        ):
+            self.snapshots.pop(name)
+
+        self.datasets.update({ds['id']: ds for ds in datasets})
+        self.snapshots.update({snap['name']: snapshot_entry(snap['name']) for snap in snapshots})
+
+    async def query_datasets(self, filters, properties=INVENTORY_PROPERTIES, user_properties=True):
+        datasets = []
+        stack = await self.middleware.call('zfs.dataset.query', filters, {
+            'extra': {
+                'flat': False, 'properties': properties, 'user_properties': user_properties, 'snapshots': False,
+            },
+        })
+        while stack:
+            ds = stack.pop()
+            stack.extend(ds.pop('children', None) or [])
+            datasets.append(ds)
+        return datasets
+
+    def hierarchical(self, datasets):
+        """
+        Convert flat list of datasets to the hierarchical format of `zfs.dataset.query`.
+        """
+        by_id = {}
+        roots = []
+        for ds in sorted(datasets, key=lambda i: i['id']):
+            ds['children'] = []
+            by_id[ds['id']] = ds
+            parent = by_id.get(ds['id'].rsplit('/', 1)[0]) if '/' in ds['id'] else None
+            if parent is None:
+                roots.append(ds)
+            else:
+                parent['children'].append(ds)
+        return roots
+
+    @filterable
+    async def datasets_query(self, filters, options):
+        """
+        Query datasets from the inventory.
+
+        `query-options.extra.properties` is a subset of `INVENTORY_PROPERTIES` which should be returned (all by
+        default) and `query-options.extra.user_properties` controls if user properties are returned.
+
+        `query-options.extra.flat` controls whether a flat list (default) or hierarchical structure with `children`
+        is returned.
+
+        `query-options.extra.max_age` (seconds) and `query-options.extra.force_refresh` control how stale
+        returned data can be.
+        """
+        extra = options.get('extra', {})
+        await self.refresh(extra.get('force_refresh', False), extra.get('max_age', INVENTORY_MAX_AGE))
+
+        props = extra.get('properties')
+        user_props = extra.get('user_properties', True)
+        flat = extra.get('flat', True)
+
+        datasets = [
+            dict(ds, properties={
+                k: v for k, v in ds['properties'].items()
+                if (':' in k and user_props) or (':' not in k and (props is None or k in props))
+            })
+            for ds in self.datasets.values()
+        ]
+
+        if flat:
+            # Same format as flat `zfs.dataset.query` output, every dataset still contains its children
+            return filter_list(flatten_datasets(self.hierarchical(datasets)), filters, options)
+
+        return filter_list(copy.deepcopy(self.hierarchical(datasets)), filters, options)
+
+    @filterable
+    async def snapshots_query(self, filters, options):
+        """
+        Query snapshots (names only) from the inventory.
+
+        Supports same `query-options.extra` staleness attributes as `zfs.inventory.datasets_query`.
+        """
+        extra = options.get('extra', {})
+        await self.refresh(extra.get('force_refresh', False), extra.get('max_age', INVENTORY_MAX_AGE))
+        return filter_list([snap.copy() for snap in self.snapshots.values()], filters, options)
+
+    async def snapshot_counts(self, datasets):
+        """
+        Return snapshot count for each of `datasets`.
+        """
+        # Snapshots are kept up to date from zfs events, space accounting properties are not needed
+        await self.refresh(max_age=None)
+        counts = {ds: 0 for ds in datasets}
+        for snap in self.snapshots.values():
+            if snap['dataset'] in counts:
+                counts[snap['dataset']] += 1
+        return counts
+
+    async def invalidate(self):
+        self.built_at = None
+
+    async def process_event(self, data):
+        if self.pending_events is not None:
+            self.pending_events.append(data)
+
+        self.apply_event(data)
+
+    def apply_event(self, data):
+        event_id = data['class']
+        if event_id in POOL_EVENTS:
+            self.built_at = None
+            return
+
+        if event_id != 'sysevent.fs.zfs.history_event' or not data.get('history_dsname'):
+            return
+
+        name = data['history_dsname']
+        event_type = data.get('history_internal_name')
+        if '@' in name:
+            if event_type == 'snapshot':
+                self.snapshots[name] = snapshot_entry(name)
+            elif event_type == 'destroy':
+                self.snapshots.pop(name, None)
+            elif event_type == 'rename':
+                self.dirty.add(name.split('@', 1)[0])
+        elif event_type == 'destroy':
+            for ds_name in filter(lambda i: is_child_or_same(i, name), list(self.datasets)):
+                self.datasets.pop(ds_name)
+            for snap_name in filter(lambda i: is_child_or_same(i.split('@', 1)[0], name), list(self.snapshots)):
+                self.snapshots.pop(snap_name)
+        elif event_type in DATASET_HISTORY_EVENTS:
+            self.dirty.add(name)
+        else:
+            # i.e. `rename` or `promote` can affect datasets outside of `name` subtree
+            self.dirty.add(name.split('/', 1)[0])
+
+
+async def zfs_events_hook(middleware, data):
+    await middleware.call('zfs.inventory.process_event', data)
+
+
+async def pool_post_export(middleware, pool, options):
+    await middleware.call('zfs.inventory.invalidate')
+
+
+async def pool_post_import(middleware, pool):
+    await middleware.call('zfs.inventory.invalidate')
+
+
+async def setup(middleware):
+    middleware.register_hook('zfs.pool.events', zfs_events_hook)
+    middleware.register_hook('pool.post_export', pool_post_export, sync=True)
+    middleware.register_hook('pool.post_import', pool_post_import, sync=True)
@@ -0,0 +1,37 @@
+from collections import defaultdict
+from threading import Lock
+
+import pytest
+
+from middlewared.client.client import Client, Job
+
+
+def client():
+    c = Client.__new__(Client)
+    c._jobs = defaultdict(dict)
+    c._jobs_lock = Lock()
+    return c
+
+
+@pytest.mark.parametrize("fields", [
+    {"id": 1, "progress": {"percent": 50}},
+    {"id": 1, "state": "RUNNING", "progress": {"percent": 50}},
+])
+def test_jobs_callback_progress_of_unseen_job(fields):
+    c = client()
+
+    c._jobs_callback("CHANGED", id=1, fields=fields)
+
+    assert c._jobs == {}
+
+
+def test_jobs_callback_progress_of_awaited_job():
+    c = client()
+    job = Job(c, 1)
+
+    c._jobs_callback("CHANGED", id=1, fields={"id": 1, "progress": {"percent": 50}})
+    assert c._jobs[1]["progress"] == {"percent": 50}
+    assert not job.event.is_set()
+
+    c._jobs_callback("CHANGED", id=1, fields={"id": 1, "method": "test.method", "state": "SUCCESS", "result": 1})
+    assert job.result() == 1
@@ -0,0 +1,77 @@
+import gzip
+import json
+from base64 import b64encode
+from unittest.mock import patch
+
+import pytest
+
+from middlewared.plugins.chart_releases_linux import secrets_management
+from middlewared.plugins.chart_releases_linux.secrets_management import (
+    DECODED_RELEASES, decode_release, latest_revisions, prune_decoded_releases,
+)
+
+
+def release_secret(release, revision, resource_version='1', namespace=None, chart_version='1.0.0'):
+    data = {
+        'name': release, 'version': revision, 'config': {'revision': revision}, 'manifest': 'kind: Pod',
+        'chart': {'metadata': {'version': chart_version}, 'templates': []},
+    }
+    return {
+        'metadata': {
+            'name': f'sh.helm.release.v1.{release}.v{revision}',
+            'namespace': namespace or f'ix-{release}',
+            'labels': {'name': release, 'owner': 'helm', 'version': str(revision)},
+            'resource_version': resource_version,
+        },
+        'data': {'release': b64encode(b64encode(gzip.compress(json.dumps(data).encode()))).decode()},
+    }
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    DECODED_RELEASES.clear()
+    yield
+    DECODED_RELEASES.clear()
+
+
+def test_decode_release():
+    release = decode_release(release_secret('plex', 1))
+    assert release == {
+        'name': 'plex', 'version': 1, 'config': {'revision': 1}, 'chart_metadata': {'version': '1.0.0'},
+    }
+
+
+def test_decode_release_cached_by_resource_version():
+    secret = release_secret('plex', 1)
+    with patch.object(secrets_management.json, 'loads', wraps=json.loads) as loads:
+        decode_release(secret)['config']['revision'] = 5
+        assert decode_release(secret)['config'] == {'revision': 1}
+        assert loads.call_count == 1
+
+        release = decode_release(release_secret('plex', 1, resource_version='2', chart_version='2.0.0'))
+        assert release['chart_metadata'] == {'version': '2.0.0'}
+        assert loads.call_count == 2
+
+
+def test_prune_decoded_releases():
+    for secret in (release_secret('plex', 1), release_secret('plex', 2), release_secret('emby', 1)):
+        decode_release(secret)
+
+    prune_decoded_releases(['metadata.namespace', '=', 'ix-plex'], {('ix-plex', 'sh.helm.release.v1.plex.v2')})
+    assert set(DECODED_RELEASES) == {('ix-plex', 'sh.helm.release.v1.plex.v2'), ('ix-emby', 'sh.helm.release.v1.emby.v1')}
+
+    prune_decoded_releases(['metadata.namespace', '^', 'ix-'], set())
+    assert DECODED_RELEASES == {}
+
+
+def test_latest_revisions():
+    secrets = [release_secret('plex', 9), release_secret('plex', 10), release_secret('emby', 3)]
+    assert sorted(s['metadata']['name'] for s in latest_revisions(secrets)) == [
+        'sh.helm.release.v1.emby.v3', 'sh.helm.release.v1.plex.v10',
+    ]
+
+
+def test_latest_revisions_unlabelled():
+    secrets = [release_secret('plex', 1), release_secret('plex', 2)]
+    secrets[0]['metadata']['labels'] = None
+    assert latest_revisions(secrets) == secrets
@@ -1,4 +1,4 @@
-from unittest.mock import Mock
+from unittest.mock import Mock, patch
 
 import pytest
 
@@ -16,3 +16,56 @@ def test_get_type_and_rotation_rate(host_type, disk_data, get_rotation_rate, res
     d.HOST_TYPE = host_type
     d._get_rotation_rate = get_rotation_rate
     assert d._get_type_and_rotation_rate(disk_data, None) == result
+
+
+def test_get_disks_from_inventory():
+    d = DeviceService(None)
+    d._list_disks = Mock(return_value={"sda": {"name": "sda", "parts": [{"name": "sda1"}]}})
+
+    assert d.get_disks() == {"sda": {"name": "sda", "parts": []}}
+    d.get_disks(True)["sda"]["parts"][0]["name"] = "sdb1"
+    assert d.get_disks(True) == {"sda": {"name": "sda", "parts": [{"name": "sda1"}]}}
+    assert d.get_disk("sda") == {"name": "sda", "parts": []}
+    d._list_disks.assert_called_once_with()
+
+
+@pytest.mark.parametrize("event,inventory", [
+    (("add", "sdb", "disk", "/devices/host1/block/sdb"), {"sda": "old", "sdb": "new"}),
+    (("change", "sda", "disk", "/devices/host0/block/sda"), {"sda": "new"}),
+    (("add", "sda1", "partition", "/devices/host0/block/sda/sda1"), {"sda": "new"}),
+    (("remove", "sda1", "partition", "/devices/host0/block/sda/sda1"), {"sda": "new"}),
+    (("remove", "sda", "disk", "/devices/host0/block/sda"), {}),
+    (("add", "sr0", "disk", "/devices/host2/block/sr0"), {"sda": "old"}),
+    (("move", "sdc", "disk", "/devices/host0/block/sdc"), None),
+])
+def test_disk_event(event, inventory):
+    d = DeviceService(None)
+    d.disk_inventory = {"sda": "old"}
+    d.get_disk_details = Mock(return_value="new")
+
+    with patch("middlewared.plugins.device_.device_info.pyudev"):
+        d.disk_event(*event)
+
+    assert d.disk_inventory == inventory
+
+
+def test_disk_event_before_inventory_is_populated():
+    d = DeviceService(None)
+    d.get_disk_details = Mock()
+
+    d.disk_event("add", "sda", "disk", "/devices/host0/block/sda")
+
+    assert d.disk_inventory is None
+    d.get_disk_details.assert_not_called()
+
+
+def test_rotation_rate_cached_by_serial():
+    d = DeviceService(None)
+    d._get_rotation_rate = Mock(return_value="7200")
+
+    with patch.object(DeviceService, "DISK_ROTATION_RATE_CACHE", {}):
+        assert d._get_cached_rotation_rate("SERIAL", "/dev/sda") == "7200"
+        assert d._get_cached_rotation_rate("SERIAL", "/dev/sdb") == "7200"
+        assert d._get_cached_rotation_rate("", "/dev/sdc") == "7200"
+
+    assert d._get_rotation_rate.call_count == 2
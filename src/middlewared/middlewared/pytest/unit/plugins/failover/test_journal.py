@@ -1,69 +1,138 @@
 import errno
+import pickle
 from unittest.mock import MagicMock, Mock, patch
 
+import pytest
+
 from middlewared.plugins.failover_.journal import Journal, JournalSync
 from middlewared.service import CallError
 from middlewared.pytest.unit.middleware import Middleware
 
 
-def test__journal_write__empty__no_write():
-    with patch("middlewared.plugins.failover.os.path.exists", Mock(return_value=False)):
-        journal = Journal()
-        journal._write = Mock()
+@pytest.fixture()
+def journal_path(tmp_path):
+    with patch.object(Journal, "path", str(tmp_path / "ha-journal")):
+        with patch.object(Journal, "cursor_path", str(tmp_path / "ha-journal.cursor")):
+            yield tmp_path / "ha-journal"
+
+
+def reopen(journal):
+    journal.close()
+    return Journal()
+
+
+def test__journal_write__empty__no_write(journal_path):
+    journal = Journal()
 
     journal.write()
 
-    journal._write.assert_not_called()
+    assert journal_path.stat().st_size == 0
 
 
-def test__journal_write__append_clear__no_write():
-    with patch("middlewared.plugins.failover.os.path.exists", Mock(return_value=False)):
-        journal = Journal()
-        journal._write = Mock()
+def test__journal_write__append_clear__no_write(journal_path):
+    journal = Journal()
 
-    journal.append(Mock())
+    journal.append(("UPDATE a SET b = ?", [1]))
     journal.clear()
     journal.write()
 
-    journal._write.assert_not_called()
+    assert journal_path.stat().st_size == 0
 
 
-def test__journal_write__append_shift__no_write():
-    with patch("middlewared.plugins.failover.os.path.exists", Mock(return_value=False)):
-        journal = Journal()
-        journal._write = Mock()
+def test__journal_write__append_shift__no_write(journal_path):
+    journal = Journal()
 
-    journal.append(Mock())
+    journal.append(("UPDATE a SET b = ?", [1]))
     journal.shift()
     journal.write()
 
-    journal._write.assert_not_called()
+    assert journal_path.stat().st_size == 0
 
 
-def test__journal_write__append_append_shift__write():
-    with patch("middlewared.plugins.failover.os.path.exists", Mock(return_value=False)):
-        journal = Journal()
-        journal._write = Mock()
+def test__journal_write__append_append_shift__write(journal_path):
+    journal = Journal()
 
-    journal.append(Mock())
-    journal.append(Mock())
+    journal.append(("UPDATE a SET b = ?", [1]))
+    journal.append(("UPDATE a SET b = ?", [2]))
     journal.shift()
     journal.write()
 
-    journal._write.assert_called_once()
+    assert list(reopen(journal)) == [("UPDATE a SET b = ?", [2])]
+
+
+def test__journal_write__append_only(journal_path):
+    journal = Journal()
+    journal.append(("UPDATE a SET b = ?", [1]))
+    journal.write()
+    size = journal_path.stat().st_size
+
+    journal.append(("UPDATE a SET b = ?", [2]))
+    journal.write()
+
+    assert journal_path.stat().st_size == 2 * size
+    assert list(reopen(journal)) == [("UPDATE a SET b = ?", [1]), ("UPDATE a SET b = ?", [2])]
 
 
-def test__journal_write__append_shift_append__write():
-    with patch("middlewared.plugins.failover.os.path.exists", Mock(return_value=False)):
-        journal = Journal()
-        journal._write = Mock()
+def test__journal_write__cursor(journal_path):
+    journal = Journal()
+    for i in range(3):
+        journal.append(("UPDATE a SET b = ?", [i]))
+    journal.write()
 
-    journal.append(Mock())
     journal.shift()
-    journal.append(Mock())
     journal.write()
 
-    journal._write.assert_called_once()
+    assert list(reopen(journal)) == [("UPDATE a SET b = ?", [1]), ("UPDATE a SET b = ?", [2])]
+
+
+def test__journal_write__synced__truncate(journal_path):
+    journal = Journal()
+    journal.append(("UPDATE a SET b = ?", [1]))
+    journal.write()
+
+    journal.shift()
+    journal.append(("UPDATE a SET b = ?", [2]))
+    journal.write()
+
+    journal = reopen(journal)
+    assert journal.cursor == 0
+    assert list(journal) == [("UPDATE a SET b = ?", [2])]
+
+
+def test__journal_load__incomplete_record(journal_path):
+    journal = Journal()
+    journal.append(("UPDATE a SET b = ?", [1]))
+    journal.append(("UPDATE a SET b = ?", [2]))
+    journal.write()
+    journal.close()
+
+    with open(journal_path, "r+b") as f:
+        f.truncate(journal_path.stat().st_size - 1)
+
+    assert list(Journal()) == [("UPDATE a SET b = ?", [1])]
+
+
+def test__journal_load__legacy_format(journal_path):
+    with open(journal_path, "wb") as f:
+        pickle.dump([("UPDATE a SET b = ?", [1])], f)
+
+    journal = Journal()
+
+    assert list(journal) == [("UPDATE a SET b = ?", [1])]
+    assert list(reopen(journal)) == [("UPDATE a SET b = ?", [1])]
+
+
+def test__journal_peek_batch(journal_path):
+    journal = Journal()
+    journal.append(("UPDATE a SET b = ?", [1]))
+    journal.append((["UPDATE a SET b = ?", "DELETE FROM a"], [[2], []]))
+    journal.append(("UPDATE a SET b = ?", [3]))
+
+    assert journal.peek_batch(3) == (
+        2, ["UPDATE a SET b = ?", "UPDATE a SET b = ?", "DELETE FROM a"], [[1], [2], []],
+    )
+    assert journal.peek_batch(1) == (1, ["UPDATE a SET b = ?"], [[1]])
+    assert journal.lag()["statements"] == 4
 
 
 def test__journal_sync__flush_journal():
@@ -73,15 +142,17 @@ def test__journal_sync__flush_journal():
     middleware['alert.oneshot_delete'] = Mock()
     journal = MagicMock()
     journal.__bool__.side_effect = [True, False]
-    journal.peek.return_value = [Mock(), Mock()]
+    journal.peek_batch.return_value = (1, [Mock()], [Mock()])
     journal_sync = JournalSync(middleware, Mock(), journal)
 
     assert journal_sync._flush_journal()
 
-    middleware['failover.call_remote'].assert_called_once_with('datastore.sql', journal.peek.return_value)
+    middleware['failover.call_remote'].assert_called_once_with(
+        'datastore.sql', list(journal.peek_batch.return_value[1:])
+    )
     assert not journal_sync.last_query_failed
     middleware['alert.oneshot_delete'].assert_called_once_with('FailoverSyncFailed', None)
-    journal.shift.assert_called_once()
+    journal.shift.assert_called_once_with(1)
 
 
 def test__journal_sync__flush_journal__error():
@@ -91,7 +162,7 @@ def test__journal_sync__flush_journal__error():
     middleware['alert.oneshot_create'] = Mock()
     journal = MagicMock()
     journal.__bool__.side_effect = [True, False]
-    journal.peek.return_value = [Mock(), Mock()]
+    journal.peek_batch.return_value = (1, [Mock()], [Mock()])
     journal_sync = JournalSync(middleware, Mock(), journal)
 
     assert not journal_sync._flush_journal()
@@ -107,7 +178,7 @@ def test__journal_sync__flush_journal__network_error():
     middleware['failover.call_remote'] = Mock(side_effect=CallError('Connection refused', errno.ECONNREFUSED))
     journal = MagicMock()
     journal.__bool__.side_effect = [True, False]
-    journal.peek.return_value = [Mock(), Mock()]
+    journal.peek_batch.return_value = (1, [Mock()], [Mock()])
     journal_sync = JournalSync(middleware, Mock(), journal)
 
     assert not journal_sync._flush_journal()
@@ -0,0 +1,112 @@
+from unittest.mock import AsyncMock, Mock, patch
+
+import pytest
+
+from middlewared.plugins.kubernetes_linux.k8s.informer import (
+    cache_object, Informer, parse_selector, relist_informer,
+)
+
+
+class FakeObject:
+    def __init__(self, uid, namespace, labels=None, phase='Running', resource_version='1'):
+        self.data = {
+            'metadata': {
+                'uid': uid, 'name': uid, 'namespace': namespace, 'labels': labels,
+                'resource_version': resource_version,
+            },
+            'status': {'phase': phase},
+        }
+
+    def to_dict(self):
+        return self.data
+
+
+def event(type_, obj):
+    metadata = obj.data['metadata']
+    return {
+        'type': type_,
+        'object': obj,
+        'raw_object': {'metadata': {'uid': metadata['uid'], 'resourceVersion': metadata['resource_version']}},
+    }
+
+
+@pytest.mark.parametrize('selector,result', [
+    (None, []),
+    ('app=plex', [('app', '=', 'plex')]),
+    ('app==plex, tier!=db', [('app', '=', 'plex'), ('tier', '!=', 'db')]),
+    ('app.kubernetes.io/name=plex,!release', [('app.kubernetes.io/name', '=', 'plex'), ('release', '!exists', None)]),
+    ('app in (plex, emby)', None),
+])
+def test_parse_selector(selector, result):
+    assert parse_selector(selector) == result
+
+
+def test_informer_select():
+    informer = Informer('Pod', 'core_api', 'list_pod_for_all_namespaces')
+    for obj in (
+        FakeObject('a', 'ix-plex', {'app': 'plex'}),
+        FakeObject('b', 'ix-plex', {'app': 'plex', 'tier': 'db'}, phase='Pending'),
+        FakeObject('c', 'ix-emby', {'app': 'emby'}),
+        FakeObject('d', 'kube-system'),
+    ):
+        informer.upsert(obj.to_dict())
+
+    def select(*args, **kwargs):
+        return sorted(o['metadata']['uid'] for o in informer.select(*args, **kwargs))
+
+    assert select() == ['a', 'b', 'c', 'd']
+    assert select('ix-plex') == ['a', 'b']
+    assert select(label_selector='app=plex,tier!=db') == ['a']
+    assert select(label_selector='tier') == ['b']
+    assert select('ix-emby', label_selector='app=plex') == []
+    assert select(field_selector='status.phase=Pending') == ['b']
+    assert select(field_selector='metadata.namespace!=kube-system') == ['a', 'b', 'c']
+    assert informer.select(label_selector='app notin (plex)') is None
+
+
+def test_informer_process_event():
+    informer = Informer('Pod', 'core_api', 'list_pod_for_all_namespaces')
+    informer.process_event(event('ADDED', FakeObject('a', 'ix-plex', {'app': 'plex'}, resource_version='2')))
+    informer.process_event(event('MODIFIED', FakeObject('a', 'ix-plex', {'app': 'emby'}, resource_version='3')))
+    assert informer.resource_version == '3'
+    assert informer.select(label_selector='app=plex') == []
+    assert [o['metadata']['uid'] for o in informer.select(label_selector='app=emby')] == ['a']
+
+    informer.process_event(event('DELETED', FakeObject('a', 'ix-plex', {'app': 'emby'}, resource_version='4')))
+    assert informer.objects == {}
+    assert informer.select('ix-plex') == []
+
+
+@pytest.mark.parametrize('resource_version,phase', [
+    ('9', 'Running'),
+    ('10', 'Pending'),
+    ('11', 'Pending'),
+])
+def test_cache_object_does_not_overwrite_newer(resource_version, phase):
+    informer = Informer('Pod', 'core_api', 'list_pod_for_all_namespaces')
+    informer.synced = True
+    informer.upsert(FakeObject('a', 'ix-plex', resource_version='10').to_dict())
+
+    with patch.dict('middlewared.plugins.kubernetes_linux.k8s.informer.INFORMERS', {'Pod': informer}):
+        cache_object('Pod', FakeObject('a', 'ix-plex', phase='Pending', resource_version=resource_version))
+
+    assert informer.objects['a']['status']['phase'] == phase
+
+
+@pytest.mark.asyncio
+async def test_relist_informer():
+    informer = Informer('HelmReleaseSecret', 'core_api', 'list_secret_for_all_namespaces')
+    informer.synced = True
+    informer.upsert(FakeObject('a', 'ix-plex', {'version': '1'}, resource_version='10').to_dict())
+    result = Mock(items=[FakeObject('a', 'ix-plex', {'version': '2'}, resource_version='12')])
+    result.metadata.resource_version = '12'
+    informer.list_func = AsyncMock(return_value=AsyncMock(return_value=result))
+
+    with patch.dict('middlewared.plugins.kubernetes_linux.k8s.informer.INFORMERS', {'HelmReleaseSecret': informer}):
+        await relist_informer('HelmReleaseSecret')
+
+    assert informer.objects['a']['metadata']['labels'] == {'version': '2'}
+
+    # Watch has not caught up with the relisted version yet
+    informer.process_event(event('MODIFIED', FakeObject('a', 'ix-plex', {'version': '1'}, resource_version='11')))
+    assert informer.objects['a']['metadata']['labels'] == {'version': '2'}
@@ -0,0 +1,25 @@
+from middlewared.plugins.pool_.dataset_details import AttachmentIndex
+
+
+def test__attachment_index_lookup():
+    index = AttachmentIndex()
+    index.add({'path': '/mnt/tank/a'}, path='/mnt/tank/a', mount_info={'mount_source': 'tank/a'})
+    index.add({'path': '/mnt/tank/a/dir'}, path='/mnt/tank/a/dir', mount_info={'mount_source': 'tank/a'})
+    index.add({'path': '/mnt/tank/b'}, path='/mnt/tank/b', mount_info={})
+    index.add({'path': '/dev/zvol/tank/vol'}, dataset='tank/vol')
+
+    assert index.lookup({'id': 'tank/a', 'mountpoint': '/mnt/tank/a'}) == [
+        {'path': '/mnt/tank/a'}, {'path': '/mnt/tank/a/dir'},
+    ]
+    assert index.lookup({'id': 'tank/b', 'mountpoint': '/mnt/tank/b'}) == [{'path': '/mnt/tank/b'}]
+    assert index.lookup({'id': 'tank/vol', 'mountpoint': None}) == [{'path': '/dev/zvol/tank/vol'}]
+    assert index.lookup({'id': 'tank/c', 'mountpoint': '/mnt/tank/c'}) == []
+
+
+def test__attachment_index_not_unique():
+    index = AttachmentIndex()
+    task = {'source_datasets': ['tank/a', 'tank/a']}
+    for source in task['source_datasets']:
+        index.add(task, dataset=source, unique=False)
+
+    assert len(index.lookup({'id': 'tank/a', 'mountpoint': '/mnt/tank/a'})) == 2
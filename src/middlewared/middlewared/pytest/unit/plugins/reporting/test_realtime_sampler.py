@@ -0,0 +1,52 @@
+import queue
+from unittest.mock import Mock, patch
+
+from middlewared.plugins.reporting.events import RealtimeSampler
+
+
+def test_shared_snapshot():
+    with patch.object(RealtimeSampler, "sample", Mock(side_effect=lambda state: {"sample": object()})):
+        sampler = RealtimeSampler(Mock(call_sync=Mock(return_value=[])), 0.1)
+        q1 = queue.Queue()
+        q2 = queue.Queue()
+        sampler.subscribe(q1)
+        sampler.subscribe(q2)
+
+        try:
+            first = q1.get(timeout=5)
+            assert q2.get(timeout=5) is first
+        finally:
+            sampler.unsubscribe(q1)
+            sampler.unsubscribe(q2)
+
+        assert sampler.stop_event is None
+
+
+def test_starts_and_stops_with_subscribers():
+    with patch.object(RealtimeSampler, "sample", Mock(return_value={})):
+        sampler = RealtimeSampler(Mock(call_sync=Mock(return_value=[])), 0.1)
+        q1 = queue.Queue()
+        q2 = queue.Queue()
+
+        sampler.subscribe(q1)
+        stop_event = sampler.stop_event
+        sampler.subscribe(q2)
+        assert sampler.stop_event is stop_event
+
+        sampler.unsubscribe(q1)
+        assert not stop_event.is_set()
+
+        sampler.unsubscribe(q2)
+        assert stop_event.is_set()
+        assert sampler.stop_event is None
+
+
+def test_sampling_error_is_published():
+    with patch.object(RealtimeSampler, "sample", Mock(side_effect=OSError("boom"))):
+        sampler = RealtimeSampler(Mock(call_sync=Mock(return_value=[])), 0.1)
+        q = queue.Queue()
+        sampler.subscribe(q)
+        try:
+            assert isinstance(q.get(timeout=5), OSError)
+        finally:
+            sampler.unsubscribe(q)
@@ -0,0 +1,55 @@
+from unittest.mock import patch
+
+import pytest
+
+from middlewared.plugins.reporting import rrd_utils
+from middlewared.plugins.reporting.plugins import CPUPlugin
+
+ROWS = [
+    [1.0, None, 0.0, None],
+    [3.0, None, 2.5, 4.0],
+    [2.0, None, None, 8.0],
+]
+AGGREGATIONS = {
+    'min': [1.0, None, 0.0, 4.0],
+    'mean': [2.0, None, 1.25, 6.0],
+    'max': [3.0, None, 2.5, 8.0],
+}
+
+
+@pytest.mark.parametrize("use_numpy", [True, False])
+@pytest.mark.parametrize("rows,result", [
+    (ROWS, AGGREGATIONS),
+    ([], {'min': [], 'mean': [], 'max': []}),
+    ([[None, None]], {'min': [None, None], 'mean': [None, None], 'max': [None, None]}),
+])
+def test__aggregate(use_numpy, rows, result):
+    if use_numpy:
+        pytest.importorskip("numpy")
+
+    with patch("middlewared.plugins.reporting.rrd_utils.numpy", rrd_utils.numpy if use_numpy else None):
+        assert CPUPlugin(None).aggregate(rows) == result
+
+
+def test__export():
+    with patch("middlewared.plugins.reporting.rrd_utils.rrd_last_update", lambda rrd_file: 0):
+        with patch("middlewared.plugins.reporting.rrd_utils.rrd_xport") as rrd_xport:
+            rrd_xport.return_value = {
+                "meta": {"start": 10, "end": 30, "step": 10, "legend": ["a", "b", "c", "d"]},
+                "data": ROWS,
+            }
+            with patch.object(CPUPlugin, "get_defs", lambda self, identifier: ["DEF:x"]):
+                with patch.object(CPUPlugin, "get_rrd_files", lambda self, identifier: ["cpu.rrd"]):
+                    data = CPUPlugin(None).export(None, "end-1h", "now")
+
+    assert rrd_xport.call_args[0][0][-1] == "DEF:x"
+    assert data == {
+        "name": "cpu",
+        "identifier": None,
+        "data": ROWS,
+        "start": 10,
+        "end": 30,
+        "step": 10,
+        "legend": ["a", "b", "c", "d"],
+        "aggregations": AGGREGATIONS,
+    }
@@ -0,0 +1,80 @@
+import asyncio
+from unittest.mock import Mock
+
+import pytest
+
+from middlewared.plugins.smart_.collection import SMARTCollectionService
+from middlewared.pytest.unit.middleware import Middleware
+
+OUTPUT = """\
+Current Drive Temperature:     31 C
+Self test in progress ...
+"""
+
+
+def collection(devices, delay=0):
+    m = Middleware()
+    calls = []
+
+    async def smartctl(disk, args, options):
+        calls.append((disk, args))
+        await asyncio.sleep(delay)
+        return OUTPUT
+
+    m["device.get_disks"] = Mock(return_value=devices)
+    m["disk.smartctl"] = smartctl
+    return SMARTCollectionService(m), calls
+
+
+@pytest.mark.asyncio
+async def test_get_collects_once_per_max_age():
+    service, calls = collection({"sda": {"serial": "S1"}})
+
+    entry = (await service.get(["sda"], {}))["sda"]
+    assert (entry["disk"], entry["serial"], entry["temperature"], entry["current_test"]) == ("sda", "S1", 31,
+                                                                                             {"progress": 0})
+    await service.get(["sda"], {})
+    await service.get(["sda"], {"max_age": None})
+
+    assert calls == [("sda", ["-a", "-n", "never"])] * 2
+
+
+@pytest.mark.asyncio
+async def test_snapshot_is_keyed_by_serial():
+    service, calls = collection({"sda": {"serial": "S1"}})
+    await service.get(["sda"], {})
+
+    service.middleware["device.get_disks"].return_value = {"sdb": {"serial": "S1"}}
+    assert (await service.get(["sdb"], {}))["sdb"]["disk"] == "sdb"
+    assert len(calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_concurrent_collections_are_shared():
+    service, calls = collection({"sda": {"serial": "S1"}}, delay=0.1)
+
+    await asyncio.gather(service.refresh("sda"), service.get(["sda"], {"max_age": None}))
+
+    assert len(calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_collection_timeout():
+    service, calls = collection({"sda": {"serial": "S1"}}, delay=0.5)
+
+    assert await service.get(["sda"], {"timeout": 0}) == {"sda": None}
+    await asyncio.sleep(0.6)
+    # Collection was not cancelled
+    assert (await service.get(["sda"], {}))["sda"]["temperature"] == 31
+    assert len(calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_invalidate():
+    service, calls = collection({"sda": {"serial": "S1"}})
+    await service.get(["sda"], {})
+
+    await service.invalidate("sda")
+    await service.get(["sda"], {})
+
+    assert len(calls) == 2
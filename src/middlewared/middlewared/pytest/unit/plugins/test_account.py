@@ -0,0 +1,118 @@
+import copy
+import functools
+from unittest.mock import Mock, patch
+
+import pytest
+
+from middlewared.plugins.account import GroupService, UserService
+from middlewared.pytest.unit.middleware import Middleware
+from middlewared.utils import filter_list
+
+USERS = [
+    {"id": 1, "uid": 0, "username": "root", "home": "/root", "email": "", "group": {"id": 1}},
+    {"id": 2, "uid": 1000, "username": "foo", "home": "/home/foo", "email": "foo@example.com", "group": {"id": 2}},
+]
+GROUPS = [
+    {"id": 1, "gid": 0, "group": "wheel"},
+    {"id": 2, "gid": 1000, "group": "foo"},
+]
+MEMBERSHIPS = [
+    {"user": {"id": 1}, "group": {"id": 2}},
+    {"user": {"id": 2}, "group": {"id": 1}},
+]
+
+
+def rows_filter(rows, filters):
+    # `datastore.query` compares foreign keys with related row ids
+    return filter_list(
+        rows, [[f[0] + ".id" if f[0] in ("user", "group", "bsdusr_group") else f[0], f[1], f[2]] for f in filters],
+    )
+
+
+def middleware(service_cls):
+    m = Middleware()
+    service = service_cls(m)
+    queried = []
+
+    async def query(name, filters, options=None):
+        options = options or {}
+        queried.append((name, filters))
+        if name == "account.bsdgroupmembership":
+            return rows_filter(copy.deepcopy(MEMBERSHIPS), filters)
+        if name == "account.bsdusers" and not options.get("prefix"):
+            return rows_filter([dict(u, bsdusr_group=u["group"]) for u in copy.deepcopy(USERS)], filters)
+
+        rows = filter_list(copy.deepcopy(USERS if name == "account.bsdusers" else GROUPS), filters)
+        ctx = await m.call(options["extend_context"], rows, options.get("extra", {}))
+        return [await m.call(options["extend"], row, ctx) for row in rows]
+
+    m["datastore.query"] = query
+    m["datastore.sql_filters"] = lambda name, filters, prefix: [
+        f for f in filters if len(f) == 3 and f[0] in ("uid", "username", "gid", "group") and f[1] == "="
+    ]
+    m[service._config.datastore_extend] = getattr(service, service._config.datastore_extend.split(".")[1])
+    m[service._config.datastore_extend_context] = getattr(
+        service, service._config.datastore_extend_context.split(".")[1],
+    )
+    # Skip `@filterable` arguments validation, query-filters schema is only resolved by the first `Middleware`
+    query = service_cls.query
+    while hasattr(query, "wraps"):
+        query = query.wraps
+    service.query = functools.partial(query, service)
+    return service, queried
+
+
+@pytest.mark.asyncio
+async def test__user_query_extends_matching_users_only():
+    service, queried = middleware(UserService)
+    with patch.object(service, "_read_authorized_keys", Mock(return_value="ssh-rsa AAAA")) as read_authorized_keys:
+        result = await service.query([["username", "=", "foo"]], {"get": True})
+
+    assert result["groups"] == [1]
+    assert result["sshpubkey"] == "ssh-rsa AAAA"
+    read_authorized_keys.assert_called_once_with("/home/foo")
+    assert queried == [
+        ("account.bsdusers", [["username", "=", "foo"]]),
+        ("account.bsdgroupmembership", [["user", "in", [2]]]),
+    ]
+
+
+@pytest.mark.asyncio
+async def test__user_query_does_not_extend_unselected():
+    service, queried = middleware(UserService)
+    with patch.object(service, "_read_authorized_keys", Mock()) as read_authorized_keys:
+        result = await service.query([["uid", ">", 0]], {"select": ["username"]})
+
+    assert result == [{"username": "foo"}]
+    read_authorized_keys.assert_not_called()
+    assert queried == [("account.bsdusers", [])]
+
+
+@pytest.mark.asyncio
+async def test__user_query_filters_by_extended():
+    service, queried = middleware(UserService)
+    with patch.object(service, "_read_authorized_keys", Mock(return_value=None)):
+        assert [u["username"] for u in await service.query([["groups", "=", [2]], ["email", "=", None]], {})] == ["root"]
+
+
+@pytest.mark.asyncio
+async def test__group_query_extends_matching_groups_only():
+    service, queried = middleware(GroupService)
+
+    result = await service.query([["group", "=", "foo"]], {"get": True})
+
+    assert result["name"] == "foo"
+    assert result["users"] == [1, 2]
+    assert queried == [
+        ("account.bsdgroups", [["group", "=", "foo"]]),
+        ("account.bsdgroupmembership", [["group", "in", [2]]]),
+        ("account.bsdusers", [["bsdusr_group", "in", [2]]]),
+    ]
+
+
+@pytest.mark.asyncio
+async def test__group_query_does_not_extend_count():
+    service, queried = middleware(GroupService)
+
+    assert await service.query([["name", "^", "w"]], {"count": True}) == 1
+    assert queried == [("account.bsdgroups", [])]
@@ -0,0 +1,83 @@
+import asyncio
+from collections import defaultdict
+from datetime import datetime
+from unittest.mock import Mock, patch
+
+import pytest
+
+from middlewared.alert.base import Alert, AlertCategory, AlertClass, AlertLevel, AlertSource
+from middlewared.plugins.alert import AlertService, AlertSourceRunTimedOutAlertClass
+from middlewared.pytest.unit.middleware import Middleware
+
+
+class SampleAlertClass(AlertClass):
+    category = AlertCategory.SYSTEM
+    level = AlertLevel.WARNING
+    title = "Sample"
+    text = "%s"
+
+
+class FastAlertSource(AlertSource):
+    async def check(self):
+        await asyncio.sleep(0.1)
+        return Alert(SampleAlertClass, "fast")
+
+
+class SlowAlertSource(AlertSource):
+    run_timeout = 0.2
+
+    async def check(self):
+        await asyncio.sleep(0.5)
+        return Alert(SampleAlertClass, "slow")
+
+
+@pytest.fixture
+def alert_service():
+    m = Middleware()
+    m["alert.product_type"] = Mock(return_value="SCALE")
+
+    service = AlertService(m)
+    m._resolve_methods([service], [])
+    service.alerts = []
+    service.alert_source_last_run = defaultdict(lambda: datetime.min)
+    sources = {source.name: source for source in (SlowAlertSource(m), FastAlertSource(m))}
+    with patch("middlewared.plugins.alert.ALERT_SOURCES", sources):
+        yield service
+
+
+def alerts_text(service):
+    return sorted((alert.source, alert.klass, alert.args) for alert in service.alerts)
+
+
+@pytest.mark.asyncio
+async def test__run_alerts_concurrently(alert_service):
+    start = asyncio.get_event_loop().time()
+    await alert_service._AlertService__run_alerts()
+    # Fast source is not delayed by the slow one
+    assert asyncio.get_event_loop().time() - start < 0.4
+
+    assert alerts_text(alert_service) == [
+        ("Fast", SampleAlertClass, "fast"),
+        ("Slow", AlertSourceRunTimedOutAlertClass, {"source_name": "Slow", "timeout": 0.2}),
+    ]
+
+    stats = {stat["name"]: stat for stat in await alert_service.source_stats([], {})}
+    assert stats["Slow"]["running"]
+    assert stats["Slow"]["timeouts"] == 1
+    assert stats["Fast"]["runs"] == 1
+    assert stats["Fast"]["histogram"]["<=0.5"] == 1
+
+    await asyncio.gather(*alert_service.sources_tasks.values())
+
+
+@pytest.mark.asyncio
+async def test__timed_out_source_result_is_collected_later(alert_service):
+    await alert_service._AlertService__run_alerts()
+    await asyncio.sleep(0.4)
+    await alert_service._AlertService__run_alerts()
+
+    assert alerts_text(alert_service) == [
+        ("Fast", SampleAlertClass, "fast"),
+        ("Slow", SampleAlertClass, "slow"),
+    ]
+    assert not alert_service.sources_tasks
@@ -1,6 +1,9 @@
+import contextlib
 from contextlib import asynccontextmanager
 import datetime
-from unittest.mock import ANY, patch
+import os
+import sqlite3
+from unittest.mock import ANY, call, patch
 
 import pytest
 import sqlalchemy as sa
@@ -14,6 +17,8 @@ import middlewared.plugins.datastore  # noqa
 import middlewared.plugins.datastore.connection  # noqa
 import middlewared.plugins.datastore.schema  # noqa
 import middlewared.plugins.datastore.util  # noqa
+from middlewared.plugins.datastore.connection import checkpoint_database
+from middlewared.service_exception import CallError
 
 from middlewared.pytest.unit.helpers import load_compound_service
 from middlewared.pytest.unit.middleware import Middleware
@@ -48,7 +53,11 @@ async def datastore_test():
                 m["datastore.send_update_events"] = ds.send_update_events
                 m["datastore.send_delete_events"] = ds.send_delete_events
 
+                m["datastore.insert"] = ds.insert
                 m["datastore.update"] = ds.update
+                m["datastore.delete"] = ds.delete
+                m["datastore.bulk"] = ds.bulk
+                m["datastore.send_transaction_events"] = ds.send_transaction_events
 
                 yield ds
 
@@ -331,6 +340,39 @@ async def test__string_filters(filter, ids):
         assert [row["id"] for row in await ds.query("test.string", filter)] == ids
 
 
+@pytest.mark.parametrize("filters,sql_filters", [
+    ([("string", "=", "Lorem")], [("string", "=", "Lorem")]),
+    ([("string", "in", [None, "Ipsum"])], [("string", "in", [None, "Ipsum"])]),
+    ([("id", "=", 1), ("string", "~", "L?rem")], [("id", "=", 1)]),
+    # Different semantics for mismatching types
+    ([("string", "=", 1)], []),
+    ([("id", "=", "1")], []),
+    ([("id", "=", True)], []),
+    ([("id", "in", list(range(1000)))], []),
+    # Not columns
+    ([("missing", "=", 1)], []),
+    ([("string.attr", "=", "Lorem")], []),
+    (["OR", [("id", "=", 1), ("id", "=", 2)]], []),
+])
+@pytest.mark.asyncio
+async def test__sql_filters(filters, sql_filters):
+    async with datastore_test() as ds:
+        assert await ds.sql_filters("test.string", filters, None) == sql_filters
+
+
+@pytest.mark.parametrize("filters,sql_filters", [
+    ([("uid", "=", 55)], [("uid", "=", 55)]),
+    # Serialized as `uid`
+    ([("bsdusr_uid", "=", 55)], []),
+    # Serialized as the related row
+    ([("group", "=", 20)], []),
+])
+@pytest.mark.asyncio
+async def test__sql_filters_prefix(filters, sql_filters):
+    async with datastore_test() as ds:
+        assert await ds.sql_filters("account.bsdusers", filters, "bsdusr_") == sql_filters
+
+
 class IntegerModel(Model):
     __tablename__ = 'test_integer'
 
@@ -776,3 +818,147 @@ async def test__null_order_by(order_by, result):
         await ds.insert("test.null", {"value": 1})
 
         assert [row["id"] for row in await ds.query("test.null", [], {"order_by": order_by})] == result
+
+
+@pytest.mark.asyncio
+async def test__query_cache():
+    async with datastore_test() as ds:
+        await ds.execute("INSERT INTO `account_bsdgroups` VALUES (20, 2020)")
+        await ds.execute("INSERT INTO `account_bsdusers` VALUES (5, 55, 20)")
+
+        assert await ds.query("account.bsdusers", [], {"prefix": "bsdusr_"}) == [
+            {"id": 5, "uid": 55, "group": {"id": 20, "bsdgrp_gid": 2020}}
+        ]
+
+        stats = ds.query_cache_stats()
+        with patch.object(ds.middleware, "call", wraps=ds.middleware.call) as call:
+            result = await ds.query("account.bsdusers", [], {"prefix": "bsdusr_"})
+            assert result == [{"id": 5, "uid": 55, "group": {"id": 20, "bsdgrp_gid": 2020}}]
+            assert all(c.args[0] != "datastore.fetchall" for c in call.call_args_list)
+
+        assert ds.query_cache_stats()["hits"] == stats["hits"] + 1
+
+        # Cached rows are not shared with callers
+        result[0]["group"]["bsdgrp_gid"] = 0
+        assert (await ds.query("account.bsdusers", [], {"prefix": "bsdusr_", "get": True}))["group"]["bsdgrp_gid"] == 2020
+
+
+@pytest.mark.asyncio
+async def test__query_cache_invalidated_by_joined_table_write():
+    async with datastore_test() as ds:
+        await ds.execute("INSERT INTO `account_bsdgroups` VALUES (20, 2020)")
+        await ds.execute("INSERT INTO `account_bsdusers` VALUES (5, 55, 20)")
+
+        assert (await ds.query("account.bsdusers", [], {"get": True}))["bsdusr_group"]["bsdgrp_gid"] == 2020
+
+        await ds.update("account.bsdgroups", 20, {"bsdgrp_gid": 3030})
+
+        assert (await ds.query("account.bsdusers", [], {"get": True}))["bsdusr_group"]["bsdgrp_gid"] == 3030
+
+
+@pytest.mark.asyncio
+async def test__query_cache_invalidated_by_cascade():
+    async with datastore_test() as ds:
+        await ds.execute("INSERT INTO `account_bsdgroups` VALUES (20, 2020)")
+        await ds.execute("INSERT INTO `account_bsdusers_cascade` VALUES (5, 55, 20)")
+
+        assert len(await ds.query("account.bsdusers_cascade", [], {"relationships": False})) == 1
+
+        await ds.delete("account.bsdgroups", 20)
+
+        assert await ds.query("account.bsdusers_cascade", [], {"relationships": False}) == []
+
+
+@pytest.mark.asyncio
+async def test__insert_many():
+    async with datastore_test() as ds:
+        assert await ds.insert_many("account.bsdgroups", [{"bsdgrp_gid": 5}, {"bsdgrp_gid": 10}]) == [1, 2]
+
+        assert [row["bsdgrp_gid"] for row in await ds.query("account.bsdgroups")] == [5, 10]
+
+
+@pytest.mark.asyncio
+async def test__update_many():
+    async with datastore_test() as ds:
+        await ds.execute("INSERT INTO `account_bsdgroups` VALUES (10, 1010)")
+        await ds.execute("INSERT INTO `account_bsdgroups` VALUES (20, 2020)")
+
+        assert await ds.update_many("account.bsdgroups", [
+            [10, {"bsdgrp_gid": 1}],
+            [[("bsdgrp_gid", "=", 2020)], {"bsdgrp_gid": 2}],
+        ]) == [10, 20]
+
+        assert [row["bsdgrp_gid"] for row in await ds.query("account.bsdgroups")] == [1, 2]
+
+
+@pytest.mark.asyncio
+async def test__bulk_single_post_execute_write():
+    async with datastore_test() as ds:
+        await ds.bulk([
+            ["insert", "account.bsdgroups", {"bsdgrp_gid": 5}],
+            ["insert", "account.bsdgroups", {"bsdgrp_gid": 10}],
+            ["delete", "account.bsdgroups", 1],
+        ])
+
+        ds.middleware.call_hook_inline.assert_called_once_with(
+            "datastore.post_execute_write", [ANY, ANY, ANY], [[5], [10], [1]], ANY,
+        )
+
+
+@pytest.mark.asyncio
+async def test__bulk_rollback():
+    async with datastore_test() as ds:
+        await ds.execute("INSERT INTO `account_bsdgroups` VALUES (10, 1010)")
+
+        with pytest.raises(RuntimeError):
+            await ds.bulk([
+                ["update", "account.bsdgroups", 10, {"bsdgrp_gid": 1}],
+                ["update", "account.bsdgroups", 20, {"bsdgrp_gid": 2}],
+            ])
+
+        assert [row["bsdgrp_gid"] for row in await ds.query("account.bsdgroups")] == [1010]
+        ds.middleware.call_hook_inline.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test__bulk_coalesces_events():
+    async with datastore_test() as ds:
+        await ds.execute("INSERT INTO `account_bsdgroups` VALUES (10, 1010)")
+        await ds.execute("INSERT INTO `account_bsdgroups` VALUES (20, 2020)")
+
+        ds.middleware["group.query"] = ds.middleware._query_filter([{"id": 10, "gid": 2}])
+        with patch.dict(ds.register_event.__self__.events):
+            await ds.register_event({"description": "", "datastore": "account.bsdgroups", "plugin": "group"})
+
+            await ds.bulk([
+                ["update", "account.bsdgroups", 10, {"bsdgrp_gid": 1}],
+                ["update", "account.bsdgroups", 10, {"bsdgrp_gid": 2}],
+                ["update", "account.bsdgroups", 20, {"bsdgrp_gid": 3}],
+                ["delete", "account.bsdgroups", 20],
+            ])
+
+        assert ds.middleware.send_event.call_args_list == [
+            call("group.query", "CHANGED", id=10, fields={"id": 10, "gid": 2}),
+            call("group.query", "CHANGED", id=20, cleared=True),
+            call("group.query", "REMOVED", id=20),
+        ]
+
+
+def test__checkpoint_database_busy(tmp_path):
+    database = str(tmp_path / "freenas-v1.db")
+    with contextlib.closing(sqlite3.connect(database, isolation_level=None)) as writer:
+        writer.execute("PRAGMA journal_mode=WAL")
+        writer.execute("CREATE TABLE test (id INTEGER PRIMARY KEY)")
+        with contextlib.closing(sqlite3.connect(database, isolation_level=None)) as reader:
+            reader.execute("BEGIN")
+            reader.execute("SELECT * FROM test").fetchall()
+            writer.execute("INSERT INTO test VALUES (1)")
+
+            with patch("middlewared.plugins.datastore.connection.CHECKPOINT_BUSY_TIMEOUT", 0):
+                with pytest.raises(CallError):
+                    checkpoint_database(database)
+
+            reader.execute("COMMIT")
+
+        checkpoint_database(database)
+        assert os.path.getsize(f"{database}-wal") == 0
@@ -0,0 +1,40 @@
+from unittest.mock import AsyncMock, Mock
+
+import pytest
+
+from middlewared.plugins.cache import DSCache
+from middlewared.pytest.unit.middleware import Middleware
+
+
+@pytest.mark.asyncio
+async def test__dscache_replace():
+    m = Middleware()
+    m["tdb.replace"] = AsyncMock()
+    users = [{"uid": 1000, "username": "alice"}, {"uid": 1001, "username": "bob"}]
+
+    await DSCache(m).replace("ACTIVEDIRECTORY", "USER", users)
+
+    m["tdb.replace"].assert_called_once_with({
+        "name": "activedirectory_user",
+        "ops": [
+            {"action": "SET", "key": "ID_1000", "val": users[0]},
+            {"action": "SET", "key": "NAME_alice", "val": users[0]},
+            {"action": "SET", "key": "ID_1001", "val": users[1]},
+            {"action": "SET", "key": "NAME_bob", "val": users[1]},
+        ],
+    })
+
+
+@pytest.mark.asyncio
+async def test__dscache_refresh__healthy_cache_is_not_wiped():
+    m = Middleware()
+    m["activedirectory.get_state"] = AsyncMock(return_value="HEALTHY")
+    m["ldap.get_state"] = AsyncMock(return_value="DISABLED")
+    m["activedirectory.fill_cache"] = AsyncMock()
+    m["tdb.wipe"] = AsyncMock()
+    job = Mock(wrap=AsyncMock())
+
+    await DSCache(m).refresh(job)
+
+    m["activedirectory.fill_cache"].assert_called_once_with(True)
+    assert [call.args[0]["name"] for call in m["tdb.wipe"].call_args_list] == ["ldap_user", "ldap_group"]
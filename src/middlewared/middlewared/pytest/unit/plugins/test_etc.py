@@ -0,0 +1,75 @@
+import asyncio
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from middlewared.plugins.etc import EtcService
+from middlewared.pytest.unit.middleware import Middleware
+
+
+@pytest.mark.asyncio
+async def test__generate_checkpoint__shares_ctx_calls():
+    m = Middleware()
+    m["user.query"] = AsyncMock(return_value=[{"username": "root"}])
+    m["group.query"] = AsyncMock(return_value=[{"group": "wheel"}])
+    etc = EtcService(m)
+    groups = {
+        "user": {
+            "ctx": [{"method": "user.query"}, {"method": "group.query"}],
+            "entries": [{"type": "mako", "path": "passwd", "checkpoint": "initial"}],
+        },
+        "ssh": {
+            "ctx": [{"method": "user.query"}],
+            "entries": [{"type": "mako", "path": "ssh_config", "checkpoint": "initial"}],
+        },
+        "nfs": {
+            "ctx": [{"method": "group.query"}],
+            "entries": [{"type": "mako", "path": "exports", "checkpoint": "pool_import"}],
+        },
+    }
+    rendered = {}
+
+    async def render(path, ctx):
+        rendered[path.rsplit("/", 1)[-1]] = ctx
+
+    with patch.object(EtcService, "GROUPS", groups):
+        with patch.object(etc._renderers["mako"], "render", render):
+            await etc.generate_checkpoint("initial")
+
+    m["user.query"].assert_called_once_with()
+    m["group.query"].assert_called_once_with()
+    assert rendered == {
+        "passwd": {"user.query": [{"username": "root"}], "group.query": [{"group": "wheel"}]},
+        "ssh_config": {"user.query": [{"username": "root"}]},
+    }
+    assert rendered["passwd"]["user.query"] is not rendered["ssh_config"]["user.query"]
+    assert set((await etc.generate_stats()).keys()) == {"user", "ssh"}
+
+
+@pytest.mark.asyncio
+async def test__generate__py_entries_keep_order():
+    etc = EtcService(Middleware())
+    groups = {
+        "test": [
+            {"type": "mako", "path": "a"},
+            {"type": "py", "path": "b"},
+            {"type": "mako", "path": "c"},
+        ],
+    }
+    events = []
+
+    def renderer(delay):
+        async def render(path, ctx):
+            name = path.rsplit("/", 1)[-1]
+            events.append(f"start {name}")
+            await asyncio.sleep(delay)
+            events.append(f"end {name}")
+
+        return render
+
+    with patch.object(EtcService, "GROUPS", groups):
+        with patch.object(etc._renderers["mako"], "render", renderer(0.05)):
+            with patch.object(etc._renderers["py"], "render", renderer(0)):
+                await etc.generate("test")
+
+    assert events == ["start a", "end a", "start b", "end b", "start c", "end c"]
@@ -0,0 +1,76 @@
+import os
+import pathlib
+from unittest.mock import Mock
+
+import pytest
+
+from middlewared.plugins.filesystem_.listdir import DirectoryListing
+
+
+@pytest.fixture
+def directory(tmp_path):
+    for i in range(10):
+        (tmp_path / f"file{i}").write_text("x" * i)
+    (tmp_path / "dir").mkdir()
+    os.symlink(tmp_path / "file1", tmp_path / "link")
+    os.symlink(tmp_path / "missing", tmp_path / "dangling")
+    (tmp_path / "ix-applications").mkdir()
+    return tmp_path
+
+
+def test__listdir__all_entries(directory):
+    acl_is_trivial = Mock(return_value=True)
+    entries = DirectoryListing(pathlib.Path(directory), acl_is_trivial).query([], {"order_by": ["name"]})
+
+    assert [entry["name"] for entry in entries] == ["dir"] + [f"file{i}" for i in range(10)] + ["link"]
+    assert entries[0]["type"] == "DIRECTORY"
+    assert entries[-1] == {
+        "name": "link",
+        "path": f"{directory}/link",
+        "realpath": f"{directory}/file1",
+        "type": "SYMLINK",
+        "size": 1,
+        "mode": entries[-1]["mode"],
+        "acl": False,
+        "uid": os.getuid(),
+        "gid": os.getgid(),
+        "is_mountpoint": False,
+        "is_ctldir": False,
+    }
+    assert acl_is_trivial.call_count == 12
+
+
+def test__listdir__page_is_expanded_only(directory):
+    acl_is_trivial = Mock(return_value=True)
+    entries = DirectoryListing(pathlib.Path(directory), acl_is_trivial).query(
+        [["type", "=", "FILE"]], {"order_by": ["-name"], "offset": 2, "limit": 3, "select": ["name", "size"]},
+    )
+
+    assert entries == [{"name": "file7", "size": 7}, {"name": "file6", "size": 6}, {"name": "file5", "size": 5}]
+    acl_is_trivial.assert_not_called()
+
+
+def test__listdir__acl_only_for_page(directory):
+    acl_is_trivial = Mock(return_value=False)
+    entries = DirectoryListing(pathlib.Path(directory), acl_is_trivial).query(
+        [["name", "^", "file"]], {"limit": 2},
+    )
+
+    assert len(entries) == 2
+    assert all(entry["acl"] for entry in entries)
+    assert acl_is_trivial.call_count == 2
+
+
+def test__listdir__filter_on_stat_attribute(directory):
+    entries = DirectoryListing(pathlib.Path(directory), Mock(return_value=True)).query(
+        [["size", ">", 7], ["type", "=", "FILE"]], {"select": ["name"], "order_by": ["name"]},
+    )
+
+    assert entries == [{"name": "file8"}, {"name": "file9"}]
+
+
+def test__listdir__count_and_get(directory):
+    listing = DirectoryListing(pathlib.Path(directory), Mock(return_value=True))
+
+    assert listing.query([["type", "=", "FILE"]], {"count": True}) == 10
+    assert listing.query([["name", "=", "dir"]], {"get": True, "select": ["type"]}) == {"type": "DIRECTORY"}
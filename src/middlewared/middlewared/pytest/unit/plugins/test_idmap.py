@@ -0,0 +1,138 @@
+from unittest.mock import AsyncMock, Mock, patch
+
+import pytest
+
+from middlewared.plugins.idmap import IdmapDomainService, IdmapResolverCache, resolver_cache
+from middlewared.pytest.unit.middleware import Middleware
+from middlewared.service_exception import CallError
+from middlewared.utils.lang import undefined
+
+
+def wbinfo_result(*lines, returncode=0):
+    return Mock(returncode=returncode, stdout="".join(f"{line}\n" for line in lines).encode(), stderr=b"")
+
+
+@pytest.fixture(autouse=True)
+def clear_resolver_cache():
+    resolver_cache.clear()
+    yield
+    resolver_cache.clear()
+
+
+def test__resolver_cache__lru():
+    cache = IdmapResolverCache(maxsize=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")
+    cache.put("c", 3)
+
+    assert cache.get("a") == 1
+    assert cache.get("b") is undefined
+    assert cache.get("c") == 3
+
+
+def test__resolver_cache__ttl():
+    cache = IdmapResolverCache(ttl=10)
+    with patch("middlewared.plugins.idmap.time.monotonic", Mock(return_value=100)):
+        cache.put("a", 1)
+    with patch("middlewared.plugins.idmap.time.monotonic", Mock(return_value=111)):
+        assert cache.get("a") is undefined
+
+
+@pytest.mark.asyncio
+async def test__sids_to_unixids__batched_and_cached():
+    service = IdmapDomainService(Middleware())
+    run = AsyncMock(return_value=wbinfo_result(
+        "S-1-5-21-1-2-3-1104 -> uid/gid 90001104",
+        "S-1-5-21-1-2-3-513 -> gid 90000513",
+        "S-1-5-21-1-2-3-9999 -> unmapped",
+    ))
+    sids = ["S-1-5-21-1-2-3-1104", "S-1-5-21-1-2-3-513", "S-1-5-21-1-2-3-9999"]
+    with patch("middlewared.plugins.idmap.run", run), patch("middlewared.plugins.idmap.WBINFO_BATCH_SIZE", 3):
+        result = await service.sids_to_unixids(sids + ["S-1-22-1-1000"])
+
+        assert result == [
+            {"id_type": "BOTH", "id": 90001104},
+            {"id_type": "GROUP", "id": 90000513},
+            None,
+            {"id_type": "USER", "id": 1000},
+        ]
+        run.assert_called_once()
+
+        run.reset_mock()
+        run.return_value = wbinfo_result("S-1-5-21-1-2-3-9999 -> unmapped")
+        assert (await service.sids_to_unixids(sids))[:2] == result[:2]
+        run.assert_called_once()
+        assert run.call_args[0][0][1] == "--sids-to-unix-ids=S-1-5-21-1-2-3-9999"
+
+
+@pytest.mark.asyncio
+async def test__sids_to_names__resolved_are_cached():
+    service = IdmapDomainService(Middleware())
+    run = AsyncMock(return_value=wbinfo_result(
+        "S-1-5-21-1-2-3-1104 -> AD\\user 1",
+        "S-1-5-21-1-2-3-513 -> AD\\domain users 2",
+    ))
+    sids = ["S-1-5-21-1-2-3-1104", "S-1-5-21-1-2-3-513"]
+    with patch("middlewared.plugins.idmap.run", run):
+        assert await service.sids_to_names(sids) == [
+            {"name": "AD\\user", "type": 1},
+            {"name": "AD\\domain users", "type": 2},
+        ]
+        assert await service.sid_to_name(sids[1]) == {"name": "AD\\domain users", "type": 2}
+
+    run.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test__sids_to_names__unknown_are_not_cached():
+    service = IdmapDomainService(Middleware())
+    run = AsyncMock(return_value=wbinfo_result("S-1-5-21-1-2-3-9999 -> \\ 8"))
+    with patch("middlewared.plugins.idmap.run", run):
+        assert await service.sids_to_names(["S-1-5-21-1-2-3-9999"]) == [None]
+        with pytest.raises(CallError):
+            await service.sid_to_name("S-1-5-21-1-2-3-9999")
+
+    assert run.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test__sids_to_names__short_batch_output_falls_back_to_single_sids():
+    service = IdmapDomainService(Middleware())
+
+    async def wbinfo(args, check):
+        values = args[1].split("=", 1)[1].split(",")
+        if len(values) > 1:
+            # Invalid SID makes winbind skip it
+            return wbinfo_result("S-1-5-21-1-2-3-1104 -> AD\\user 1")
+        if values[0] == "S-1-5-21-1-2-3-1104":
+            return wbinfo_result("S-1-5-21-1-2-3-1104 -> AD\\user 1")
+        return wbinfo_result(returncode=1)
+
+    with patch("middlewared.plugins.idmap.run", wbinfo):
+        assert await service.sids_to_names(["S-1-5-21-1-2-3-1104", "S-1-invalid"]) == [
+            {"name": "AD\\user", "type": 1},
+            None,
+        ]
+
+
+@pytest.mark.asyncio
+async def test__unixids_to_sids__batch_failure_falls_back_to_single_ids():
+    middleware = Middleware()
+    middleware["group.query"] = AsyncMock(return_value=[{"gid": 1000}])
+    service = IdmapDomainService(middleware)
+
+    async def wbinfo(args, check):
+        values = args[1].split("=", 1)[1].split(",")
+        if len(values) > 1:
+            return wbinfo_result(returncode=1)
+        return wbinfo_result({"u90001104": "S-1-5-21-1-2-3-1104"}.get(values[0], "NOT MAPPED"))
+
+    with patch("middlewared.plugins.idmap.run", wbinfo):
+        assert await service.unixids_to_sids([
+            {"id_type": "USER", "id": 90001104},
+            {"id_type": "GROUP", "id": 1000},
+            {"id_type": "GROUP", "id": 1001},
+        ]) == ["S-1-5-21-1-2-3-1104", "S-1-22-2-1000", None]
+
+    middleware["group.query"].assert_called_once_with([("gid", "in", [1000, 1001])], {"select": ["gid"]})
@@ -0,0 +1,82 @@
+import pytest
+
+from middlewared.plugins.zfs_.dataset_query import (
+    dataset_query_properties, dataset_query_roots, filter_pushdown_filters, flatten_datasets,
+    flatten_datasets_filtered,
+)
+
+
+DATASETS = [
+    {
+        'id': 'tank',
+        'children': [
+            {
+                'id': 'tank/a',
+                'children': [
+                    {'id': 'tank/a/b', 'children': []},
+                ],
+            },
+            {'id': 'tank/c', 'children': []},
+        ],
+    },
+    {'id': 'boot', 'children': []},
+]
+
+
+@pytest.mark.parametrize('filters,flat,roots', [
+    ([], True, None),
+    ([['id', '=', 'tank/a']], True, ['tank/a']),
+    ([['id', 'in', ['tank/a/b', 'tank/a', 'boot']]], True, ['boot', 'tank/a']),
+    ([['pool', '=', 'tank']], True, ['tank']),
+    ([['id', '^', 'tank/a/']], True, ['tank/a']),
+    ([['id', '^', 'tank/a']], True, ['tank']),
+    ([['id', '^', 'tank']], True, None),
+    ([['type', '=', 'VOLUME'], ['id', '^', 'tank/a/']], True, ['tank/a']),
+    ([['OR', [['id', '=', 'tank/a'], ['id', '^', 'tank/a/']]]], True, ['tank/a']),
+    ([['OR', [['id', '=', 'tank/a'], ['type', '=', 'VOLUME']]]], True, None),
+    ([['id', 'in', []]], True, []),
+    ([['id', '^', 'tank/a/']], False, None),
+    ([['type', '=', 'VOLUME'], ['id', '=', 'tank/a']], False, None),
+    ([['type', '=', 'VOLUME'], ['pool', '=', 'tank']], False, ['tank']),
+])
+def test__dataset_query_roots(filters, flat, roots):
+    assert dataset_query_roots(filters, flat) == roots
+
+
+def test__flatten_datasets():
+    flattened = flatten_datasets(DATASETS)
+    assert [ds['id'] for ds in flattened] == ['tank', 'tank/a', 'tank/a/b', 'tank/c', 'boot']
+    assert flattened[1] is not DATASETS[0]['children'][0]
+    assert flattened[1] == DATASETS[0]['children'][0]
+
+
+def test__flatten_datasets_filtered():
+    assert [ds['id'] for ds in flatten_datasets_filtered(DATASETS, [['id', '^', 'tank/a']])] == ['tank/a', 'tank/a/b']
+
+
+@pytest.mark.parametrize('props,user_props,filters,options,result', [
+    (None, True, [], {}, (None, True)),
+    (None, True, [], {'select': ['id', 'properties']}, (None, True)),
+    (None, True, [], {'select': ['id']}, ([], False)),
+    (None, True, [['properties.used.parsed', '>', 0]], {'select': ['id']}, (['used'], False)),
+    (['used', 'available'], True, [], {'select': ['id'], 'order_by': ['-properties.available.parsed']},
+     (['available'], False)),
+    (None, True, [['properties.org\\.freenas:description.value', '=', 'x']], {'select': ['id']},
+     ([], True)),
+    (None, True, [], {'select': ['id', 'properties.org\\.freenas:description', 'properties.used']},
+     (['used'], True)),
+])
+def test__dataset_query_properties(props, user_props, filters, options, result):
+    assert dataset_query_properties(props, user_props, filters, options) == result
+
+
+def test__filter_pushdown_filters():
+    assert filter_pushdown_filters([
+        ['id', '=', 'tank'],
+        ['OR', [['pool', '=', 'tank'], ['type', '=', 'VOLUME']]],
+        ['OR', [['pool', '=', 'tank'], ['locked', '=', True]]],
+        ['user_properties.foo', '=', 'bar'],
+    ]) == [
+        ['id', '=', 'tank'],
+        ['OR', [['pool', '=', 'tank'], ['type', '=', 'VOLUME']]],
+    ]
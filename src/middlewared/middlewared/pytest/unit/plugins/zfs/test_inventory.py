@@ -0,0 +1,124 @@
+from unittest.mock import ANY, Mock
+
+import pytest
+
+from middlewared.plugins.zfs_.inventory import INVENTORY_SPACE_PROPERTIES, ZFSInventoryService
+from middlewared.pytest.unit.middleware import Middleware
+
+
+def dataset(name, children=None):
+    return {'id': name, 'name': name, 'type': 'FILESYSTEM', 'properties': {}, 'children': children or []}
+
+
+def history_event(name, event_type):
+    return {'class': 'sysevent.fs.zfs.history_event', 'history_dsname': name, 'history_internal_name': event_type}
+
+
+@pytest.fixture
+def middleware():
+    m = Middleware()
+    m['zfs.dataset.query'] = Mock(return_value=[dataset('tank', [dataset('tank/a', [dataset('tank/a/b')])])])
+    m['zfs.snapshot.query'] = Mock(return_value=[{'name': 'tank/a@snap1'}, {'name': 'tank/a@snap2'}])
+    return m
+
+
+@pytest.mark.asyncio
+async def test__inventory_rebuild(middleware):
+    inventory = ZFSInventoryService(middleware)
+    await inventory.refresh()
+
+    assert set(inventory.datasets) == {'tank', 'tank/a', 'tank/a/b'}
+    assert await inventory.snapshot_counts(['tank', 'tank/a']) == {'tank': 0, 'tank/a': 2}
+    assert middleware['zfs.dataset.query'].call_count == 1
+
+
+@pytest.mark.asyncio
+async def test__inventory_snapshot_events(middleware):
+    inventory = ZFSInventoryService(middleware)
+    await inventory.refresh()
+
+    await inventory.process_event(history_event('tank/a/b@snap', 'snapshot'))
+    await inventory.process_event(history_event('tank/a@snap1', 'destroy'))
+
+    assert await inventory.snapshot_counts(['tank/a', 'tank/a/b']) == {'tank/a': 1, 'tank/a/b': 1}
+    assert middleware['zfs.dataset.query'].call_count == 1
+
+
+@pytest.mark.asyncio
+async def test__inventory_dataset_events(middleware):
+    inventory = ZFSInventoryService(middleware)
+    await inventory.refresh()
+
+    await inventory.process_event(history_event('tank/a', 'destroy'))
+    assert set(inventory.datasets) == {'tank'}
+    assert inventory.snapshots == {}
+
+    middleware['zfs.dataset.query'].return_value = [dataset('tank/c')]
+    middleware['zfs.snapshot.query'].return_value = []
+    await inventory.process_event(history_event('tank/c', 'create'))
+    await inventory.refresh()
+
+    middleware['zfs.dataset.query'].assert_called_with([['id', 'in', ['tank/c']]], {
+        'extra': {'flat': False, 'properties': ANY, 'user_properties': True, 'snapshots': False},
+    })
+    assert set(inventory.datasets) == {'tank', 'tank/c'}
+
+
+@pytest.mark.asyncio
+async def test__inventory_stale_space_properties(middleware):
+    inventory = ZFSInventoryService(middleware)
+    await inventory.refresh()
+
+    tree = [dataset('tank', [dataset('tank/a', [dataset('tank/a/b')])])]
+    tree[0]['properties'] = {'used': {'parsed': 10}}
+    middleware['zfs.dataset.query'].return_value = tree
+    await inventory.refresh(max_age=0)
+
+    middleware['zfs.dataset.query'].assert_called_with([], {
+        'extra': {'flat': False, 'properties': INVENTORY_SPACE_PROPERTIES, 'user_properties': False, 'snapshots': False},
+    })
+    assert middleware['zfs.snapshot.query'].call_count == 1
+    assert inventory.datasets['tank']['properties'] == {'used': {'parsed': 10}}
+
+
+@pytest.mark.asyncio
+async def test__inventory_stale_missed_datasets(middleware):
+    inventory = ZFSInventoryService(middleware)
+    await inventory.refresh()
+
+    # `tank/c` was created without the inventory being notified
+    middleware['zfs.dataset.query'].side_effect = lambda *args: [dataset('tank', [dataset('tank/c')])]
+    await inventory.refresh(max_age=0)
+
+    assert set(inventory.datasets) == {'tank', 'tank/c'}
+    assert middleware['zfs.snapshot.query'].call_count == 2
+
+
+@pytest.mark.asyncio
+async def test__inventory_datasets_query_flat(middleware):
+    inventory = ZFSInventoryService(middleware)
+    # Skip `@filterable` arguments validation, query-filters schema is only resolved by the first `Middleware`
+    datasets_query = ZFSInventoryService.datasets_query
+    while hasattr(datasets_query, 'wraps'):
+        datasets_query = datasets_query.wraps
+
+    datasets = await datasets_query(inventory, [], {'extra': {'flat': True}})
+    assert [ds['id'] for ds in datasets] == ['tank', 'tank/a', 'tank/a/b']
+    assert [ds['id'] for ds in datasets[0]['children']] == ['tank/a']
+    assert [ds['id'] for ds in datasets[1]['children']] == ['tank/a/b']
+
+    # Entries are copies
+    datasets[1]['children'].clear()
+    datasets = await datasets_query(inventory, [], {'extra': {'flat': True}})
+    assert [ds['id'] for ds in datasets[1]['children']] == ['tank/a/b']
+
+
+def test__inventory_hierarchical(middleware):
+    inventory = ZFSInventoryService(middleware)
+    roots = inventory.hierarchical([
+        {'id': 'tank/a/b'}, {'id': 'boot'}, {'id': 'tank'}, {'id': 'tank/a'}, {'id': 'tank/a-b'},
+    ])
+
+    assert [ds['id'] for ds in roots] == ['boot', 'tank']
+    assert [ds['id'] for ds in roots[1]['children']] == ['tank/a', 'tank/a-b']
+    assert [ds['id'] for ds in roots[1]['children'][0]['children']] == ['tank/a/b']
@@ -0,0 +1,123 @@
+import asyncio
+from unittest.mock import Mock
+
+import pytest
+
+from middlewared.job import Job, JobsDeque, JobsQueue, State
+from middlewared.service import job as job_decorator
+
+
+class FakeJob:
+    def __init__(self, lock=None, lock_queue_size=None, method_name="test.method"):
+        self.id = None
+        self.lock = None
+        self.method_name = method_name
+        self.state = State.WAITING
+        self.options = {"lock": lock, "lock_queue_size": lock_queue_size}
+
+    def get_lock_name(self):
+        return self.options["lock"]
+
+    def set_id(self, id):
+        self.id = id
+
+    def send_event(self, name, fields):
+        pass
+
+    def __encode__(self):
+        return {}
+
+    def cleanup(self):
+        pass
+
+
+async def next_job(queue):
+    return await asyncio.wait_for(queue.next(), 0.1)
+
+
+@pytest.mark.asyncio
+async def test__jobs_queue__lock_contention():
+    queue = JobsQueue(Mock())
+    a, b, c = FakeJob("lock"), FakeJob("lock"), FakeJob()
+    for job in (a, b, c):
+        queue.add(job)
+
+    assert await next_job(queue) is a
+    assert await next_job(queue) is c
+    with pytest.raises(asyncio.TimeoutError):
+        await next_job(queue)
+
+    queue.finish(a)
+    assert await next_job(queue) is b
+
+    queue.finish(b)
+    assert queue.job_locks == {}
+
+
+@pytest.mark.asyncio
+async def test__jobs_queue__lock_queue_size():
+    queue = JobsQueue(Mock())
+    running = queue.add(FakeJob("lock", 1))
+    assert await next_job(queue) is running
+
+    waiting = queue.add(FakeJob("lock", 1))
+    assert queue.add(FakeJob("lock", 1)) is waiting
+    assert queue.job_locks["lock"].get_jobs() == {running, waiting}
+
+
+def test__jobs_deque__evicts_first_finished_job():
+    jobs_deque = JobsDeque(maxlen=2)
+    jobs = [FakeJob() for i in range(3)]
+    for job in jobs:
+        jobs_deque.add(job)
+
+    jobs_deque.finished(jobs[1])
+    jobs_deque.finished(jobs[0])
+    jobs_deque.add(FakeJob())
+
+    assert list(jobs_deque.all().keys()) == [1, 3, 4]
+
+
+def test__jobs_deque__candidates():
+    jobs_deque = JobsDeque()
+    jobs = [FakeJob(method_name=f"test.method{i % 2}") for i in range(4)]
+    for j in jobs:
+        jobs_deque.add(j)
+
+    jobs[2].state = State.RUNNING
+    jobs_deque.state_changed(jobs[2], State.WAITING)
+
+    assert jobs_deque.candidates([["id", "=", 2]]) == [jobs[1]]
+    assert jobs_deque.candidates([["method", "=", "test.method0"]]) == [jobs[0], jobs[2]]
+    assert jobs_deque.candidates([["method", "=", "test.method0"], ["state", "=", "WAITING"]]) == [jobs[0]]
+    assert jobs_deque.candidates([["state", "in", ["RUNNING", "WAITING"]]]) == jobs
+    # Filters which can't be looked up in the indexes
+    assert jobs_deque.candidates([["id", "=", [1]], ["description", "=", None]]) == jobs
+
+
+@job_decorator()
+def method(job, secret):
+    pass
+
+
+@pytest.mark.asyncio
+async def test__job__encoded_until_changed():
+    middleware = Mock(loop=asyncio.get_event_loop())
+    middleware.dump_args.return_value = ["********"]
+    j = Job(middleware, "test.method", None, method, ["secret"], method._job, None, None)
+
+    encoded = j.__encode__()
+    assert j.__encode__() == encoded
+    assert middleware.dump_args.call_count == 1
+
+    j.set_id(1)
+    j.set_progress(50, "Half way")
+    assert j.__encode__()["progress"]["percent"] == 50
+    assert j.__encode__()["id"] == 1
+    assert middleware.dump_args.call_count == 2
+
+    # Progress events only carry the changed fields
+    middleware.send_event.assert_called_once_with(
+        "core.get_jobs", "CHANGED", id=1,
+        fields={"id": 1, "state": "WAITING", "progress": {"percent": 50, "description": "Half way", "extra": None}},
+    )
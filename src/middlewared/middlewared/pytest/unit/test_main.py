@@ -0,0 +1,70 @@
+from datetime import date, datetime, time
+import math
+from unittest.mock import AsyncMock, Mock, patch
+
+import pytest
+
+from middlewared.client import ejson
+from middlewared.main import Application
+
+
+def test__dumps_fast__same_value_as_dumps():
+    data = {
+        "date": date(2021, 1, 2),
+        "datetime": datetime(2021, 1, 2, 3, 4, 5),
+        "time": time(3, 4, 5),
+        "big": 2 ** 70,
+        "text": "čau",
+        1: [None, True, 1.5],
+    }
+
+    assert ejson.loads(ejson.dumps_fast(data)) == ejson.loads(ejson.dumps(data))
+
+
+@pytest.mark.parametrize("data", [
+    {"date": date(2021, 1, 2), "datetime": datetime(2021, 1, 2, 3, 4, 5), "time": time(3, 4, 5)},
+    {"text": "čau", 1: [None, True, 1.5], "nested": {"list": [{"a": None}]}},
+])
+def test__dumps_fast__orjson_same_value_as_dumps(data):
+    pytest.importorskip("orjson")
+
+    with patch("middlewared.client.ejson.dumps", Mock(side_effect=AssertionError("Should be encoded by orjson"))):
+        serialized = ejson.dumps_fast(data)
+
+    assert ejson.loads(serialized) == ejson.loads(ejson.dumps(data))
+
+
+@pytest.mark.parametrize("value", [math.inf, -math.inf])
+def test__dumps_fast__non_finite_float(value):
+    data = {"value": None, "values": [1.0, value]}
+
+    assert ejson.dumps_fast(data) == ejson.dumps(data)
+
+
+def test__dumps_fast__nan():
+    assert math.isnan(ejson.loads(ejson.dumps_fast({"values": [None, math.nan]}))["values"][1])
+
+
+@pytest.mark.asyncio
+async def test__application__event_subscribers_index():
+    middleware = Mock()
+    middleware.event_source_manager.short_name_arg.side_effect = lambda name: (name, None)
+    middleware.event_source_manager.event_sources = {}
+    middleware.event_source_manager.unsubscribe_app = AsyncMock()
+    app = Application(middleware, Mock(), Mock(), Mock())
+    app._send = Mock()
+
+    await app.subscribe("1", "pool.query")
+    await app.subscribe("2", "pool.query")
+    await app.subscribe("3", "*")
+    assert middleware.register_event_subscriber.call_count == 3
+
+    await app.unsubscribe("1")
+    # Still subscribed by ident `2`
+    middleware.unregister_event_subscriber.assert_not_called()
+
+    await app.unsubscribe("2")
+    middleware.unregister_event_subscriber.assert_called_once_with(app, "pool.query")
+
+    await app.on_close()
+    middleware.unregister_event_subscriber.assert_called_with(app, "*")
@@ -0,0 +1,38 @@
+import time
+from unittest.mock import Mock, patch
+
+from middlewared.worker import FakeJob
+
+
+def test__fake_job__progress_updates_are_coalesced():
+    connection = Mock()
+    with patch("middlewared.worker.PROGRESS_UPDATE_INTERVAL", 0.2):
+        job = FakeJob(1, connection, Mock())
+        for i in range(10):
+            job.set_progress(i * 10, f"Step {i}")
+
+        # First update is sent immediately, the rest are coalesced into a single one sent later
+        assert connection.call.call_count == 1
+
+        time.sleep(0.4)
+
+    assert connection.call.call_count == 2
+    connection.call.assert_called_with(
+        "core.job_update", 1, {"progress": {"percent": 90, "description": "Step 9", "extra": None}},
+    )
+
+
+def test__fake_job__flush_progress():
+    connection = Mock()
+    job = FakeJob(1, connection, Mock())
+    job.set_progress(10)
+    job.set_progress(20)
+    job.flush_progress()
+
+    assert connection.call.call_count == 2
+    connection.call.assert_called_with(
+        "core.job_update", 1, {"progress": {"percent": 20, "description": None, "extra": None}},
+    )
+
+    job.flush_progress()
+    assert connection.call.call_count == 2
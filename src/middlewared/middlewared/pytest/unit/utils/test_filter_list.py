@@ -1,4 +1,7 @@
+import pytest
+
 from middlewared.utils import filter_list
+from middlewared.utils.query_filters import compile_query
 
 
 DATA = [
@@ -84,3 +87,54 @@ def test__filter_list_OR_eq2():
         ['number', '=', 1],
         ['number', '=', 2],
     ]]])) == 2
+
+
+def test__filter_list_order_by():
+    assert [i['number'] for i in filter_list(DATA, [], {'order_by': ['-number']})] == [3, 2, 1]
+
+
+def test__filter_list_order_by_multiple_keys():
+    data = [
+        {'a': 1, 'b': 2},
+        {'a': 2, 'b': 1},
+        {'a': 1, 'b': 1},
+    ]
+    # Last `order_by` item is the primary sort key
+    assert filter_list(data, [], {'order_by': ['a', 'b']}) == [
+        {'a': 1, 'b': 1},
+        {'a': 2, 'b': 1},
+        {'a': 1, 'b': 2},
+    ]
+    assert filter_list(data, [], {'order_by': ['-a', 'b']}) == [
+        {'a': 2, 'b': 1},
+        {'a': 1, 'b': 1},
+        {'a': 1, 'b': 2},
+    ]
+
+
+def test__filter_list_order_by_limit():
+    data = [{'number': i % 7, 'id': i} for i in range(100)]
+    assert filter_list(data, [], {'order_by': ['-number'], 'offset': 2, 'limit': 5}) == sorted(
+        data, key=lambda x: x['number'], reverse=True,
+    )[2:7]
+
+
+def test__filter_list_invalid_operation():
+    with pytest.raises(ValueError):
+        filter_list(DATA, [['number', '==', 1]])
+
+
+def test__compile_query_is_cached():
+    assert compile_query([['number', 'in', [1, 3]]], {}) is compile_query([['number', 'in', [1, 3]]], {})
+    assert compile_query([['number', '=', 1]], {}) is not compile_query([['number', '=', True]], {})
+
+
+def test__compile_query_does_not_keep_filter_values():
+    data = [{'tags': ['a'], 'number': 1}, {'tags': ['b'], 'number': 2}]
+    value = ['a']
+    select = ['number']
+    assert filter_list(data, [['tags', '=', value]], {'select': select}) == [{'number': 1}]
+
+    value[0] = 'b'
+    select.append('tags')
+    assert filter_list(data, [['tags', '=', ['a']]], {'select': ['number']}) == [{'number': 1}]
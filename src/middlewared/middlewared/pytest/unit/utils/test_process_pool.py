@@ -0,0 +1,66 @@
+import asyncio
+import os
+import time
+from unittest.mock import patch
+
+import pytest
+
+from middlewared.utils.process_pool import ElasticProcessPool, LANE_LONG, LANE_SHORT
+
+
+@pytest.fixture
+def pool():
+    pool = ElasticProcessPool(None, {LANE_SHORT: (1, 3), LANE_LONG: (1, 1)})
+    yield pool
+    for lane in pool.lanes.values():
+        for worker in list(lane.workers):
+            lane._stop(worker)
+
+
+@pytest.mark.asyncio
+async def test__grows_when_calls_are_queued(pool):
+    pool.start()
+    pids = await asyncio.gather(*[pool.run("test.pid", pid_after_sleep) for i in range(3)])
+
+    assert len(set(pids)) == 3
+    stats = pool.stats()
+    assert stats["lanes"][LANE_SHORT]["workers"] == 3
+    assert stats["lanes"][LANE_SHORT]["max_queue_depth"] >= 2
+    assert stats["lanes"][LANE_LONG]["workers"] + stats["lanes"][LANE_LONG]["starting_workers"] == 1
+    assert stats["methods"]["test.pid"]["calls"] == 3
+
+
+@pytest.mark.asyncio
+async def test__shrinks_to_min_workers(pool):
+    with patch("middlewared.utils.process_pool.WORKER_IDLE_TIMEOUT", 0.1):
+        await asyncio.gather(*[pool.run("test.pid", pid_after_sleep) for i in range(3)])
+        await asyncio.sleep(0.5)
+
+    assert pool.stats()["lanes"][LANE_SHORT]["workers"] == 1
+
+
+@pytest.mark.asyncio
+async def test__recycles_workers(pool):
+    with patch("middlewared.utils.process_pool.WORKER_MAX_TASKS", 2):
+        pids = [await pool.run("test.pid", os.getpid) for i in range(4)]
+
+    assert pids[0] == pids[1]
+    assert pids[1] != pids[2]
+    assert pool.stats()["lanes"][LANE_SHORT]["recycled_workers"] == 2
+
+
+@pytest.mark.asyncio
+async def test__long_running_methods_use_long_lane(pool):
+    assert pool.get_lane("test.slow") is pool.lanes[LANE_SHORT]
+
+    with patch("middlewared.utils.process_pool.LONG_METHOD_THRESHOLD", 0.1):
+        for i in range(3):
+            await pool.run("test.slow", pid_after_sleep)
+
+        assert pool.get_lane("test.slow") is pool.lanes[LANE_LONG]
+        assert pool.get_lane("test.slow", LANE_SHORT) is pool.lanes[LANE_SHORT]
+
+
+def pid_after_sleep():
+    time.sleep(0.2)
+    return os.getpid()
@@ -0,0 +1,93 @@
+# -*- coding=utf-8 -*-
+import argparse
+import asyncio
+import functools
+import logging
+import os
+import sqlite3
+import tempfile
+import time
+
+from middlewared.plugins.datastore import connection
+from middlewared.plugins.datastore.connection import DatastoreService, JOURNAL_MODE, READ_POOL_SIZE
+
+logger = logging.getLogger(__name__)
+
+QUERY = "SELECT * FROM bench WHERE value LIKE '%7%' ORDER BY value"
+
+
+class BenchmarkMiddleware:
+    """
+    Just enough of `Middleware` for `DatastoreService` to read and write the database in-process.
+    """
+
+    async def run_in_executor(self, pool, method, *args, **kwargs):
+        return await asyncio.get_event_loop().run_in_executor(pool, functools.partial(method, *args, **kwargs))
+
+    def call_hook_inline(self, name, *args, **kwargs):
+        pass
+
+
+def create_database(path, rows):
+    with sqlite3.connect(path) as conn:
+        conn.execute("CREATE TABLE bench (id INTEGER PRIMARY KEY, value VARCHAR(120))")
+        conn.executemany("INSERT INTO bench (value) VALUES (?)", ((f"value-{i}" * 4,) for i in range(rows)))
+    conn.close()
+
+
+async def run(datastore, queries, writes):
+    """
+    Run `queries` concurrent `datastore.fetchall` reads while `writes` `datastore.execute` updates are performed
+    (each holding `write_lock` and going through the writer executor). Returns reads per second.
+    """
+    async def write():
+        for i in range(writes):
+            await datastore.execute("UPDATE bench SET value = value WHERE id = ?", [i + 1])
+
+    start = time.monotonic()
+    writer = asyncio.ensure_future(write())
+    await asyncio.gather(*[datastore.fetchall(QUERY) for i in range(queries)])
+    elapsed = time.monotonic() - start
+    await writer
+
+    return queries / elapsed
+
+
+async def benchmark(queries, writes):
+    datastore = DatastoreService(BenchmarkMiddleware())
+    await datastore.setup()
+    try:
+        # Serve reads from the writer connection (previous behavior)
+        datastore.read_connections_count = 0
+        before = await run(datastore, queries, writes)
+        logger.info("Writer connection only: %.1f reads/s", before)
+
+        datastore.read_connections_count = READ_POOL_SIZE
+        after = await run(datastore, queries, writes)
+        logger.info("%s with %d read connections: %.1f reads/s (%.2fx)", JOURNAL_MODE, READ_POOL_SIZE, after,
+                    after / before)
+    finally:
+        async with datastore.write_lock:
+            await datastore.middleware.run_in_executor(datastore.thread_pool, datastore._close)
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="[%(asctime)s] %(message)s")
+
+    parser = argparse.ArgumentParser(description="Measure concurrent datastore read throughput")
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--writes", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, "benchmark.db")
+        create_database(path, args.rows)
+
+        connection.FREENAS_DATABASE = path
+        # `DatastoreService.write_lock` is bound to the default event loop
+        asyncio.get_event_loop().run_until_complete(benchmark(args.queries, args.writes))
+
+
+if __name__ == "__main__":
+    main()
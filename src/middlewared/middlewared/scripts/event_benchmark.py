@@ -0,0 +1,68 @@
+# -*- coding=utf-8 -*-
+import argparse
+import logging
+import threading
+import time
+
+from middlewared.client import Client
+from middlewared.utils import MIDDLEWARE_RUN_DIR
+
+logger = logging.getLogger(__name__)
+
+EVENT = "core.environ"
+ENVIRON_KEY = "MIDDLEWARED_EVENT_BENCHMARK"
+
+
+class Subscriber:
+    def __init__(self, events):
+        self.events = events
+        self.received = 0
+        self.done = threading.Event()
+        self.client = Client(f"ws+unix://{MIDDLEWARE_RUN_DIR}/middlewared-internal.sock")
+        self.client.subscribe(EVENT, self.on_event, sync=True)
+
+    def on_event(self, mtype, **message):
+        if ENVIRON_KEY in (message.get("fields") or {}):
+            self.received += 1
+            if self.received >= self.events:
+                self.done.set()
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="[%(asctime)s] %(message)s")
+
+    parser = argparse.ArgumentParser(
+        description="Measure how many events per second a running middlewared delivers to connected websocket clients",
+    )
+    parser.add_argument("--clients", type=int, default=100)
+    parser.add_argument("--idle-clients", type=int, default=100, help="Connected clients not subscribed to the event")
+    parser.add_argument("--events", type=int, default=1000)
+    args = parser.parse_args()
+
+    idle = [Client(f"ws+unix://{MIDDLEWARE_RUN_DIR}/middlewared-internal.sock") for i in range(args.idle_clients)]
+    subscribers = [Subscriber(args.events) for i in range(args.clients)]
+    try:
+        with Client(f"ws+unix://{MIDDLEWARE_RUN_DIR}/middlewared-internal.sock") as c:
+            start = time.monotonic()
+            for i in range(args.events):
+                c.call("core.environ_update", {ENVIRON_KEY: str(i)})
+
+            for subscriber in subscribers:
+                subscriber.done.wait(timeout=300)
+            elapsed = time.monotonic() - start
+
+            c.call("core.environ_update", {ENVIRON_KEY: None})
+
+        delivered = sum(subscriber.received for subscriber in subscribers)
+        logger.info(
+            "%d events to %d subscribed clients (%d idle clients connected) in %.2f s: %.0f events/s sent, "
+            "%.0f messages/s delivered", args.events, args.clients, args.idle_clients, elapsed, args.events / elapsed,
+            delivered / elapsed,
+        )
+    finally:
+        for client in idle + [subscriber.client for subscriber in subscribers]:
+            client.close()
+
+
+if __name__ == "__main__":
+    main()
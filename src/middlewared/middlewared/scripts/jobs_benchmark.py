@@ -0,0 +1,89 @@
+# -*- coding=utf-8 -*-
+import argparse
+import asyncio
+import logging
+import time
+
+from middlewared.job import Job, JobsQueue
+from middlewared.service import job
+
+logger = logging.getLogger(__name__)
+
+
+class BenchmarkMiddleware:
+    """
+    Just enough of `Middleware` for `JobsQueue` to schedule and run jobs in-process.
+    """
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.events = 0
+
+    def event_register(self, name, description):
+        pass
+
+    def send_event(self, name, event_type, **kwargs):
+        self.events += 1
+
+    def dump_args(self, args, method=None):
+        return args
+
+    async def run_in_thread(self, method, *args):
+        # Only used to close pipes which benchmark jobs do not have
+        return method(*args)
+
+
+def run(jobs, locks):
+    """
+    Submit `jobs` jobs contended on `locks` shared locks and run them until all of them finish. Returns time spent
+    submitting them and time it took to run all of them (in seconds).
+    """
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    middleware = BenchmarkMiddleware(loop)
+    queue = JobsQueue(middleware)
+
+    @job(lock=lambda args: f"benchmark_{args[0]}")
+    async def method(job, lock):
+        await asyncio.sleep(0)
+
+    async def main():
+        scheduler = asyncio.ensure_future(queue.run())
+
+        start = time.monotonic()
+        submitted = [
+            queue.add(Job(middleware, "benchmark.method", None, method, [i % locks], method._job, None, None))
+            for i in range(jobs)
+        ]
+        submit_time = time.monotonic() - start
+
+        for j in submitted:
+            await j.wait()
+        run_time = time.monotonic() - start
+
+        scheduler.cancel()
+        return submit_time, run_time
+
+    try:
+        return loop.run_until_complete(main())
+    finally:
+        loop.close()
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="[%(asctime)s] %(message)s")
+
+    parser = argparse.ArgumentParser(description="Measure job scheduling overhead of lock-contended jobs")
+    parser.add_argument("--jobs", type=int, default=10000)
+    parser.add_argument("--locks", type=int, default=10)
+    args = parser.parse_args()
+
+    submit_time, run_time = run(args.jobs, args.locks)
+    logger.info(
+        "%d jobs on %d locks: submitted in %.3f s, all finished in %.3f s (%.1f us per job)", args.jobs, args.locks,
+        submit_time, run_time, run_time / args.jobs * 1000000,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+# -*- coding=utf-8 -*-
+import argparse
+import logging
+import statistics
+import time
+
+from middlewared.client import Client
+from middlewared.utils import MIDDLEWARE_RUN_DIR
+from middlewared.worker import WorkerConnection
+
+logger = logging.getLogger(__name__)
+
+
+def measure(call, calls):
+    """
+    Perform `calls` calls of `call` and return list of their latencies (in milliseconds).
+    """
+    latencies = []
+    for i in range(calls):
+        start = time.monotonic()
+        call()
+        latencies.append((time.monotonic() - start) * 1000)
+
+    return latencies
+
+
+def connection_per_call(method):
+    # Previous behavior of process pool workers: new connection for every call
+    with Client(f'ws+unix://{MIDDLEWARE_RUN_DIR}/middlewared-internal.sock', py_exceptions=True) as c:
+        return c.call(method)
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="[%(asctime)s] %(message)s")
+
+    parser = argparse.ArgumentParser(
+        description="Measure latency of calls made from a process pool worker to a running middlewared",
+    )
+    parser.add_argument("--calls", type=int, default=500)
+    parser.add_argument("--method", default="core.ping")
+    args = parser.parse_args()
+
+    before = measure(lambda: connection_per_call(args.method), args.calls)
+    logger.info("Connection per call: mean %.3f ms, median %.3f ms", statistics.mean(before), statistics.median(before))
+
+    connection = WorkerConnection()
+    after = measure(lambda: connection.call(args.method), args.calls)
+    logger.info("Persistent connection: mean %.3f ms, median %.3f ms (%.2fx)", statistics.mean(after),
+                statistics.median(after), statistics.mean(before) / statistics.mean(after))
+
+
+if __name__ == "__main__":
+    main()
@@ -1489,6 +1489,15 @@ class CoreService(Service):
             for i in self.middleware.get_wsclients().values()
         ], filters, options)
 
+    @private
+    @accepts()
+    async def process_pool_stats(self):
+        """
+        Statistics of the process pool used by `process_pool` services: workers, queue depth and wait time (in
+        seconds) of each lane and execution time of each method.
+        """
+        return self.middleware.get_process_pool_stats()
+
     @accepts(Bool('debug_mode'))
     async def set_debug_mode(self, debug_mode):
         """
@@ -1554,7 +1563,7 @@ class CoreService(Service):
         """Get the long running jobs."""
         raw_result = options['extra'].get('raw_result', True)
         jobs = filter_list([
-            i.__encode__(raw_result) for i in list(self.middleware.jobs.all().values())
+            i.__encode__(raw_result) for i in self.middleware.jobs.candidates(filters)
         ], filters, options)
         return jobs
 
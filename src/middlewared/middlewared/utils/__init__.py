@@ -1,14 +1,13 @@
 import asyncio
 import logging
-import re
 import signal
 import subprocess
 from datetime import datetime, timedelta
 from functools import wraps
 from threading import Lock
 
-from middlewared.service_exception import MatchNotFound
 from middlewared.utils import osc
+from middlewared.utils.query_filters import compile_query
 from middlewared.utils.threading import start_daemon_thread  # noqa
 
 BUILDTIME = None
@@ -103,115 +102,7 @@ def get(obj, path):
 
 
 def filter_list(_list, filters=None, options=None):
-
-    opmap = {
-        '=': lambda x, y: x == y,
-        '!=': lambda x, y: x != y,
-        '>': lambda x, y: x > y,
-        '>=': lambda x, y: x >= y,
-        '<': lambda x, y: x < y,
-        '<=': lambda x, y: x <= y,
-        '~': lambda x, y: re.match(y, x),
-        'in': lambda x, y: x in y,
-        'nin': lambda x, y: x not in y,
-        'rin': lambda x, y: x is not None and y in x,
-        'rnin': lambda x, y: x is not None and y not in x,
-        '^': lambda x, y: x is not None and x.startswith(y),
-        '!^': lambda x, y: x is not None and not x.startswith(y),
-        '$': lambda x, y: x is not None and x.endswith(y),
-        '!$': lambda x, y: x is not None and not x.endswith(y),
-    }
-
-    if filters is None:
-        filters = {}
-    if options is None:
-        options = {}
-
-    select = options.get('select')
-
-    rv = []
-    if filters:
-
-        def filterop(f):
-            if len(f) != 3:
-                raise ValueError(f'Invalid filter {f}')
-            name, op, value = f
-            if op not in opmap:
-                raise ValueError('Invalid operation: {}'.format(op))
-            if isinstance(i, dict):
-                source = get(i, name)
-            else:
-                source = getattr(i, name)
-            if opmap[op](source, value):
-                return True
-            return False
-
-        for i in _list:
-            valid = True
-            for f in filters:
-                if len(f) == 2:
-                    op, value = f
-                    if op == 'OR':
-                        for f in value:
-                            if filterop(f):
-                                break
-                        else:
-                            valid = False
-                            break
-                    else:
-                        raise ValueError(f'Invalid operation: {op}')
-                elif not filterop(f):
-                    valid = False
-                    break
-
-            if not valid:
-                continue
-            if select:
-                entry = {}
-                for s in select:
-                    if s in i:
-                        entry[s] = i[s]
-            else:
-                entry = i
-            rv.append(entry)
-            if options.get('get') is True:
-                return entry
-    elif select:
-        rv = []
-        for i in _list:
-            entry = {}
-            for s in select:
-                if s in i:
-                    entry[s] = i[s]
-            rv.append(entry)
-    else:
-        rv = _list
-
-    if options.get('count') is True:
-        return len(rv)
-
-    if options.get('order_by'):
-        for o in options.get('order_by'):
-            if o.startswith('-'):
-                o = o[1:]
-                reverse = True
-            else:
-                reverse = False
-            rv = sorted(rv, key=lambda x: get(x, o), reverse=reverse)
-
-    if options.get('get') is True:
-        try:
-            return rv[0]
-        except IndexError:
-            raise MatchNotFound() from None
-
-    if options.get('offset'):
-        rv = rv[options['offset']:]
-
-    if options.get('limit'):
-        return rv[:options['limit']]
-
-    return rv
+    return compile_query(filters, options)(_list)
 
 
 def filter_getattrs(filters):
@@ -226,7 +117,7 @@ def filter_getattrs(filters):
     while f:
         filter_ = f.pop()
         if len(filter_) == 2:
-            f.append(filter_[1])
+            f.extend(filter_[1])
         elif len(filter_) == 3:
             attrs.add(filter_[0])
         else:
@@ -0,0 +1,301 @@
+# -*- coding=utf-8 -*-
+import asyncio
+from collections import defaultdict, deque
+import concurrent.futures
+import concurrent.futures.process
+import logging
+import time
+
+import psutil
+
+logger = logging.getLogger(__name__)
+
+__all__ = ["LANE_LONG", "LANE_SHORT", "ElasticProcessPool"]
+
+LANE_SHORT = "short"
+LANE_LONG = "long"
+# Methods whose mean execution time (seconds) is above this are run in the long lane
+LONG_METHOD_THRESHOLD = 2
+# Number of executions after which a method can be considered long-running
+LONG_METHOD_MIN_CALLS = 3
+# Workers above lane's `min_workers` are stopped after being idle for this long (seconds)
+WORKER_IDLE_TIMEOUT = 300
+# Workers are replaced after running this many calls or if their RSS grows over `WORKER_MAX_RSS` bytes
+WORKER_MAX_TASKS = 1000
+WORKER_MAX_RSS = 1024 * 1024 * 1024
+
+
+class ProcessPoolWorker:
+    """
+    Single worker process (a `ProcessPoolExecutor` with one worker so that it can be stopped individually).
+    """
+
+    def __init__(self, initializer):
+        self.executor = concurrent.futures.ProcessPoolExecutor(max_workers=1, initializer=initializer)
+        self.tasks = 0
+        self.idle_since = None
+
+    def start(self):
+        # Worker process is spawned on first submit, this future is done once it is initialized
+        return self.executor.submit(int)
+
+    def submit(self, func):
+        self.tasks += 1
+        return self.executor.submit(func)
+
+    def rss(self):
+        try:
+            return psutil.Process(next(iter(self.executor._processes))).memory_info().rss
+        except (StopIteration, TypeError, psutil.Error):
+            return None
+
+    def stop(self):
+        self.executor.shutdown(wait=False)
+
+
+class ProcessPoolMethodStats:
+    def __init__(self):
+        self.calls = 0
+        self.total_time = 0
+        self.max_time = 0
+        self.total_wait_time = 0
+
+    @property
+    def mean_time(self):
+        return self.total_time / self.calls if self.calls else None
+
+    def record(self, wait_time, run_time):
+        self.calls += 1
+        self.total_time += run_time
+        self.max_time = max(self.max_time, run_time)
+        self.total_wait_time += wait_time
+
+    def serialize(self):
+        return {
+            "calls": self.calls,
+            "total_time": self.total_time,
+            "mean_time": self.mean_time,
+            "max_time": self.max_time,
+            "mean_wait_time": self.total_wait_time / self.calls if self.calls else None,
+        }
+
+
+class ProcessPoolLane:
+    """
+    Group of worker processes that grows up to `max_workers` when calls have to be queued and shrinks back to
+    `min_workers` when workers stay idle.
+    """
+
+    def __init__(self, name, initializer, min_workers, max_workers):
+        if not 0 < max_workers or not 0 <= min_workers <= max_workers:
+            raise ValueError(f"Invalid {name!r} lane bounds: {min_workers}..{max_workers}")
+
+        self.name = name
+        self.initializer = initializer
+        self.min_workers = min_workers
+        self.max_workers = max_workers
+
+        self.loop = None
+        # Initialized workers (busy or idle)
+        self.workers = set()
+        # Used as a stack so least recently used workers are at its beginning
+        self.idle = []
+        self.starting = 0
+        self.waiters = deque()
+        self.shrink_handle = None
+
+        self.calls = 0
+        self.total_wait_time = 0
+        self.max_wait_time = 0
+        self.max_queue_depth = 0
+        self.spawned = 0
+        self.recycled = 0
+        self.broken = 0
+
+    def start(self):
+        self.loop = asyncio.get_event_loop()
+        self._ensure_capacity()
+
+    async def run(self, func, method_stats):
+        if self.loop is None:
+            self.start()
+
+        enqueued_at = time.monotonic()
+        worker = await self._acquire()
+        started_at = time.monotonic()
+        wait_time = started_at - enqueued_at
+        self.calls += 1
+        self.total_wait_time += wait_time
+        self.max_wait_time = max(self.max_wait_time, wait_time)
+
+        fut = worker.submit(func)
+        finished = True
+        try:
+            return await asyncio.wrap_future(fut)
+        except asyncio.CancelledError:
+            # Worker process keeps running the call, it can only be reused once it finishes
+            finished = False
+            fut.add_done_callback(lambda f: self.loop.call_soon_threadsafe(self._finish, worker, f))
+            raise
+        finally:
+            if finished:
+                method_stats.record(wait_time, time.monotonic() - started_at)
+                self._finish(worker, fut)
+
+    async def _acquire(self):
+        if self.idle:
+            return self.idle.pop()
+
+        waiter = self.loop.create_future()
+        self.waiters.append(waiter)
+        self.max_queue_depth = max(self.max_queue_depth, self.queue_depth)
+        self._ensure_capacity()
+        try:
+            return await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # Worker was handed over but the caller was cancelled before it could use it
+                self._release(waiter.result())
+            raise
+
+    @property
+    def queue_depth(self):
+        return sum(1 for waiter in self.waiters if not waiter.done())
+
+    def _ensure_capacity(self):
+        while len(self.workers) + self.starting < self.max_workers and (
+            len(self.workers) + self.starting < self.min_workers or self.queue_depth > self.starting
+        ):
+            self._spawn()
+
+    def _spawn(self):
+        worker = ProcessPoolWorker(self.initializer)
+        self.starting += 1
+        self.spawned += 1
+        worker.start().add_done_callback(lambda f: self.loop.call_soon_threadsafe(self._started, worker, f))
+
+    def _started(self, worker, fut):
+        self.starting -= 1
+
+        if (error := fut.exception()) is not None:
+            logger.error("Failed to start %r lane process pool worker", self.name, exc_info=error)
+            worker.stop()
+            if not self.workers and not self.starting:
+                # No worker is going to pick up queued calls
+                while self.waiters:
+                    if not (waiter := self.waiters.popleft()).done():
+                        waiter.set_exception(error)
+            return
+
+        self.workers.add(worker)
+        self._release(worker)
+
+    def _finish(self, worker, fut):
+        if not fut.cancelled() and isinstance(fut.exception(), concurrent.futures.process.BrokenProcessPool):
+            self.broken += 1
+            self._stop(worker)
+            self._ensure_capacity()
+        elif worker.tasks >= WORKER_MAX_TASKS or (worker.rss() or 0) >= WORKER_MAX_RSS:
+            self.recycled += 1
+            self._stop(worker)
+            self._ensure_capacity()
+        else:
+            self._release(worker)
+
+    def _release(self, worker):
+        while self.waiters:
+            if not (waiter := self.waiters.popleft()).done():
+                waiter.set_result(worker)
+                return
+
+        worker.idle_since = time.monotonic()
+        self.idle.append(worker)
+        self._schedule_shrink()
+
+    def _stop(self, worker):
+        self.workers.discard(worker)
+        if worker in self.idle:
+            self.idle.remove(worker)
+        worker.stop()
+
+    def _schedule_shrink(self):
+        if self.shrink_handle is None and self.idle and len(self.workers) > self.min_workers:
+            self.shrink_handle = self.loop.call_later(WORKER_IDLE_TIMEOUT, self._shrink)
+
+    def _shrink(self):
+        self.shrink_handle = None
+        now = time.monotonic()
+        while (
+            len(self.workers) > self.min_workers and self.idle and
+            now - self.idle[0].idle_since >= WORKER_IDLE_TIMEOUT
+        ):
+            self._stop(self.idle[0])
+
+        self._schedule_shrink()
+
+    def stats(self):
+        return {
+            "min_workers": self.min_workers,
+            "max_workers": self.max_workers,
+            "workers": len(self.workers),
+            "idle_workers": len(self.idle),
+            "starting_workers": self.starting,
+            "queue_depth": self.queue_depth,
+            "max_queue_depth": self.max_queue_depth,
+            "calls": self.calls,
+            "mean_wait_time": self.total_wait_time / self.calls if self.calls else None,
+            "max_wait_time": self.max_wait_time,
+            "spawned_workers": self.spawned,
+            "recycled_workers": self.recycled,
+            "broken_workers": self.broken,
+        }
+
+
+class ElasticProcessPool:
+    """
+    Process pool with separate lanes for short and long-running calls.
+
+    `lanes` maps lane name to its `(min_workers, max_workers)`. Calls are run in `LANE_SHORT` unless a different
+    lane is requested or the method has proven to be long-running.
+    """
+
+    def __init__(self, initializer, lanes):
+        self.lanes = {
+            name: ProcessPoolLane(name, initializer, min_workers, max_workers)
+            for name, (min_workers, max_workers) in lanes.items()
+        }
+        self.methods = defaultdict(ProcessPoolMethodStats)
+
+    def start(self):
+        for lane in self.lanes.values():
+            lane.start()
+
+    def get_lane(self, name, lane=None):
+        if lane is None:
+            stats = self.methods.get(name)
+            if (
+                LANE_LONG in self.lanes and stats is not None and stats.calls >= LONG_METHOD_MIN_CALLS and
+                stats.mean_time >= LONG_METHOD_THRESHOLD
+            ):
+                lane = LANE_LONG
+            else:
+                lane = LANE_SHORT
+
+        return self.lanes[lane]
+
+    async def run(self, name, func, lane=None, retries=2):
+        """
+        Run picklable `func` in a worker process. `name` identifies the method for statistics and lane selection.
+        """
+        for i in range(retries):
+            try:
+                return await self.get_lane(name, lane).run(func, self.methods[name])
+            except concurrent.futures.process.BrokenProcessPool:
+                if i == retries - 1:
+                    raise
+
+    def stats(self):
+        return {
+            "lanes": {name: lane.stats() for name, lane in self.lanes.items()},
+            "methods": {name: stats.serialize() for name, stats in self.methods.items()},
+        }
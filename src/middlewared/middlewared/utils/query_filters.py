@@ -0,0 +1,340 @@
+import copy
+import heapq
+import re
+import threading
+from collections import OrderedDict
+
+from middlewared.service_exception import MatchNotFound
+
+COMPILED_QUERY_CACHE_SIZE = 512
+QUERY_OPTIONS = ('select', 'order_by', 'count', 'get', 'offset', 'limit')
+
+
+def _split_path(path):
+    """
+    Split a dot notation path into its components honoring `\\.` escapes
+    (see `middlewared.utils.get`).
+    """
+    parts = []
+    rv = ''
+    right = path
+    while right:
+        left, sep, right = right.partition('.')
+        if sep and left and left[-1] == '\\':
+            rv += left[:-1] + sep
+            continue
+        parts.append(rv + left)
+        rv = ''
+    return tuple(parts)
+
+
+def _to_index(part):
+    try:
+        return int(part)
+    except ValueError:
+        return None
+
+
+def _list_item(obj, key, index):
+    if index is None:
+        # Raise same error as `middlewared.utils.get` would
+        index = int(key)
+    return obj[index] if index < len(obj) else None
+
+
+def _path_getter(path):
+    """
+    Return a callable equivalent to `lambda obj: middlewared.utils.get(obj, path)` with `path` parsed only once.
+    """
+    parts = _split_path(path)
+    if not parts:
+        return lambda obj: obj
+
+    if len(parts) == 1:
+        key = parts[0]
+        index = _to_index(key)
+
+        def getter(obj):
+            if isinstance(obj, dict):
+                return obj.get(key)
+            elif isinstance(obj, (list, tuple)):
+                return _list_item(obj, key, index)
+            return obj
+
+        return getter
+
+    indexes = tuple(_to_index(part) for part in parts)
+
+    def getter(obj):
+        for key, index in zip(parts, indexes):
+            if isinstance(obj, dict):
+                obj = obj.get(key)
+            elif isinstance(obj, (list, tuple)):
+                obj = _list_item(obj, key, index)
+        return obj
+
+    return getter
+
+
+def _row_getter(name):
+    """
+    Dictionaries are traversed using dot notation, any other object is accessed by attribute.
+    """
+    path_getter = _path_getter(name)
+
+    def getter(row):
+        if isinstance(row, dict):
+            return path_getter(row)
+        return getattr(row, name)
+
+    return getter
+
+
+def _membership(value, negate):
+    if isinstance(value, (list, tuple, set, frozenset)):
+        try:
+            lookup = frozenset(value)
+        except TypeError:
+            # Unhashable members, fall back to a linear scan
+            lookup = value
+    else:
+        lookup = value
+
+    def op(x):
+        try:
+            return (x in lookup) is not negate
+        except TypeError:
+            # `x` is not hashable so it can't be looked up in the frozenset
+            return (x in value) is not negate
+
+    return op
+
+
+def _compile_op(op, value):
+    if op == '=':
+        return lambda x: x == value
+    elif op == '!=':
+        return lambda x: x != value
+    elif op == '>':
+        return lambda x: x > value
+    elif op == '>=':
+        return lambda x: x >= value
+    elif op == '<':
+        return lambda x: x < value
+    elif op == '<=':
+        return lambda x: x <= value
+    elif op == '~':
+        match = re.compile(value).match
+        return lambda x: match(x)
+    elif op == 'in':
+        return _membership(value, False)
+    elif op == 'nin':
+        return _membership(value, True)
+    elif op == 'rin':
+        return lambda x: x is not None and value in x
+    elif op == 'rnin':
+        return lambda x: x is not None and value not in x
+    elif op == '^':
+        return lambda x: x is not None and x.startswith(value)
+    elif op == '!^':
+        return lambda x: x is not None and not x.startswith(value)
+    elif op == '$':
+        return lambda x: x is not None and x.endswith(value)
+    elif op == '!$':
+        return lambda x: x is not None and not x.endswith(value)
+    else:
+        raise ValueError(f'Invalid operation: {op}')
+
+
+def _compile_filter(f):
+    if len(f) != 3:
+        raise ValueError(f'Invalid filter {f}')
+
+    name, op, value = f
+    getter = _row_getter(name)
+    test = _compile_op(op, value)
+    return lambda row: bool(test(getter(row)))
+
+
+def compile_filters(filters):
+    """
+    Compile a list of query-filters into a single predicate accepting a row.
+
+    Returns `None` if `filters` is empty.
+    """
+    if not filters:
+        return None
+
+    predicates = []
+    for f in filters:
+        if len(f) == 2:
+            op, value = f
+            if op != 'OR':
+                raise ValueError(f'Invalid operation: {op}')
+
+            or_predicates = tuple(_compile_filter(i) for i in value)
+            predicates.append(lambda row, p=or_predicates: any(i(row) for i in p))
+        else:
+            predicates.append(_compile_filter(f))
+
+    if len(predicates) == 1:
+        return predicates[0]
+
+    predicates = tuple(predicates)
+    return lambda row: all(p(row) for p in predicates)
+
+
+def compile_order_by(order_by):
+    """
+    Compile `order_by` query option into a list of `(key, reverse)` sort passes.
+
+    Historically each `order_by` item is applied as a separate stable sort so the last item is the primary sort key.
+    When all items share the same direction this is equivalent to a single sort on a tuple key.
+    """
+    if not order_by:
+        return []
+
+    keys = []
+    for o in order_by:
+        if o.startswith('-'):
+            keys.append((_path_getter(o[1:]), True))
+        else:
+            keys.append((_path_getter(o), False))
+
+    if len(keys) > 1 and len({reverse for _, reverse in keys}) == 1:
+        getters = tuple(getter for getter, _ in reversed(keys))
+        return [(lambda row: tuple(getter(row) for getter in getters), keys[0][1])]
+
+    return keys
+
+
+def _freeze(value):
+    if isinstance(value, (list, tuple)):
+        return type(value), tuple(_freeze(v) for v in value)
+    elif isinstance(value, dict):
+        return dict, tuple((k, _freeze(v)) for k, v in value.items())
+    # Type is included so that i.e. `1` and `True` do not share a compiled plan
+    return type(value), value
+
+
+class CompiledQuery:
+    """
+    Reusable evaluation plan for a filters/options pair.
+    """
+
+    def __init__(self, filters, options):
+        self.predicate = compile_filters(filters)
+        self.select = options.get('select') or None
+        self.sort = compile_order_by(options.get('order_by'))
+        self.count = options.get('count') is True
+        self.get = options.get('get') is True
+        self.offset = options.get('offset') or 0
+        self.limit = options.get('limit') or 0
+
+    def _select(self, row):
+        return {s: row[s] for s in self.select if s in row}
+
+    def _order(self, rv):
+        if len(self.sort) == 1 and not self.get and self.limit:
+            key, reverse = self.sort[0]
+            n = self.offset + self.limit
+            if isinstance(rv, (list, tuple)) and n < len(rv) // 2:
+                # Top-N selection, `heapq.nsmallest`/`nlargest` are equivalent to `sorted(...)[:n]`
+                return (heapq.nlargest if reverse else heapq.nsmallest)(n, rv, key=key)
+
+        for key, reverse in self.sort:
+            rv = sorted(rv, key=key, reverse=reverse)
+        return rv
+
+    def __call__(self, _list):
+        if self.predicate is not None:
+            predicate = self.predicate
+            if self.get:
+                # Preserve historical behavior of returning the first match
+                for i in _list:
+                    if predicate(i):
+                        return self._select(i) if self.select else i
+                rv = []
+            else:
+                rv = [i for i in _list if predicate(i)]
+                if self.select:
+                    rv = [self._select(i) for i in rv]
+        elif self.select:
+            rv = [self._select(i) for i in _list]
+        else:
+            rv = _list
+
+        if self.count:
+            return len(rv)
+
+        if self.sort:
+            rv = self._order(rv)
+
+        if self.get:
+            try:
+                return rv[0]
+            except IndexError:
+                raise MatchNotFound() from None
+
+        if self.offset:
+            rv = rv[self.offset:]
+
+        if self.limit:
+            return rv[:self.limit]
+
+        return rv
+
+
+class CompiledQueryCache:
+    def __init__(self, maxsize=COMPILED_QUERY_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.lock = threading.Lock()
+        self.queries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, filters, options):
+        try:
+            key = (_freeze(filters), _freeze({k: options[k] for k in QUERY_OPTIONS if k in options}))
+            hash(key)
+        except TypeError:
+            return CompiledQuery(filters, options)
+
+        with self.lock:
+            query = self.queries.get(key)
+            if query is not None:
+                self.queries.move_to_end(key)
+                self.hits += 1
+                return query
+
+        # Cached plan must not keep references to (mutable) filter values of the caller, i.e. to a list used by
+        # `in` which might be modified after the query while the plan is still looked up by its original contents
+        query = CompiledQuery(copy.deepcopy(filters), {k: copy.deepcopy(options[k]) for k in QUERY_OPTIONS if k in options})
+        with self.lock:
+            self.misses += 1
+            self.queries[key] = query
+            if len(self.queries) > self.maxsize:
+                self.queries.popitem(last=False)
+
+        return query
+
+    def stats(self):
+        with self.lock:
+            return {'size': len(self.queries), 'maxsize': self.maxsize, 'hits': self.hits, 'misses': self.misses}
+
+    def clear(self):
+        with self.lock:
+            self.queries.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+compiled_queries = CompiledQueryCache()
+
+
+def compile_query(filters=None, options=None):
+    """
+    Get a (cached) `CompiledQuery` for `filters` and `options`. Calling the result with a list of rows is equivalent
+    to `filter_list(rows, filters, options)`.
+    """
+    return compiled_queries.get(filters or [], options or {})
@@ -5,6 +5,8 @@ import asyncio
 import inspect
 import os
 import setproctitle
+import threading
+import time
 
 from . import logger
 from .common.environ import environ_update
@@ -14,6 +16,34 @@ import middlewared.utils.osc as osc
 from .utils.service.call import MethodNotFoundError, ServiceCallMixin
 
 MIDDLEWARE = None
+# Job progress updates made more often than this (seconds) are coalesced
+PROGRESS_UPDATE_INTERVAL = 0.5
+
+
+class WorkerConnection(object):
+    """
+    Connection to middlewared shared by all calls, events and job progress updates of a worker process.
+
+    It is only established when it is first needed and is re-established on next use if it gets closed.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.client = None
+        # Callables run with every newly established client (i.e. to subscribe to events)
+        self.on_connect = []
+
+    def get(self):
+        with self.lock:
+            if self.client is None or self.client.closed:
+                self.client = Client(f'ws+unix://{MIDDLEWARE_RUN_DIR}/middlewared-internal.sock', py_exceptions=True)
+                for callback in self.on_connect:
+                    callback(self.client)
+
+            return self.client
+
+    def call(self, method, *params, **kwargs):
+        return self.get().call(method, *params, **kwargs)
 
 
 class FakeMiddleware(LoadPluginsMixin, ServiceCallMixin):
@@ -23,23 +53,25 @@ class FakeMiddleware(LoadPluginsMixin, ServiceCallMixin):
 
     def __init__(self):
         super().__init__()
-        self.client = None
+        self.connection = WorkerConnection()
         _logger = logger.Logger('worker')
         self.logger = _logger.getLogger()
         _logger.configure_logging('console')
         self.loop = asyncio.get_event_loop()
 
     def _call(self, name, serviceobj, methodobj, params=None, app=None, pipes=None, job=None):
+        fake_job = None
+        job_options = getattr(methodobj, '_job', None)
+        if job and job_options:
+            params = list(params) if params else []
+            fake_job = FakeJob(job['id'], self.connection, self.logger)
+            params.insert(0, fake_job)
+
         try:
-            with Client(f'ws+unix://{MIDDLEWARE_RUN_DIR}/middlewared-internal.sock', py_exceptions=True) as c:
-                self.client = c
-                job_options = getattr(methodobj, '_job', None)
-                if job and job_options:
-                    params = list(params) if params else []
-                    params.insert(0, FakeJob(job['id'], self.client))
-                return methodobj(*params)
+            return methodobj(*params)
         finally:
-            self.client = None
+            if fake_job is not None:
+                fake_job.flush_progress()
 
     def _run(self, name, args, job):
         serviceobj, methodobj = self._method_lookup(name)
@@ -76,7 +108,7 @@ class FakeMiddleware(LoadPluginsMixin, ServiceCallMixin):
                 self.logger.trace('Calling %r in current process', method)
                 return sync_methodobj(*params)
 
-        return self.client.call(method, *params, timeout=timeout, **kwargs)
+        return self.connection.call(method, *params, timeout=timeout, **kwargs)
 
     def event_register(self, *args, **kwargs):
         pass
@@ -85,28 +117,80 @@ class FakeMiddleware(LoadPluginsMixin, ServiceCallMixin):
         return []
 
     def send_event(self, name, event_type, **kwargs):
-        with Client(py_exceptions=True) as c:
-            return c.call('core.event_send', name, event_type, kwargs)
+        return self.connection.call('core.event_send', name, event_type, kwargs)
 
 
 class FakeJob(object):
 
-    def __init__(self, id, client):
+    def __init__(self, id, connection, logger):
         self.id = id
-        self.client = client
+        self.connection = connection
+        self.logger = logger
         self.progress = {
             'percent': None,
             'description': None,
             'extra': None,
         }
+        self.progress_lock = threading.Lock()
+        self.progress_send_lock = threading.Lock()
+        self.progress_sent_at = None
+        self.progress_timer = None
 
     def set_progress(self, percent, description=None, extra=None):
-        self.progress['percent'] = percent
-        if description:
-            self.progress['description'] = description
-        if extra:
-            self.progress['extra'] = extra
-        self.client.call('core.job_update', self.id, {'progress': self.progress})
+        with self.progress_lock:
+            self.progress['percent'] = percent
+            if description:
+                self.progress['description'] = description
+            if extra:
+                self.progress['extra'] = extra
+
+            if self.progress_timer is not None:
+                # Already scheduled update will send the latest progress
+                return
+
+            if self.progress_sent_at is not None:
+                delay = self.progress_sent_at + PROGRESS_UPDATE_INTERVAL - time.monotonic()
+                if delay > 0:
+                    self.progress_timer = threading.Timer(delay, self._progress_timer_expired)
+                    self.progress_timer.daemon = True
+                    self.progress_timer.start()
+                    return
+
+        self._send_progress()
+
+    def flush_progress(self):
+        """
+        Send coalesced progress update immediately (if there is any).
+        """
+        with self.progress_lock:
+            if self.progress_timer is None:
+                return
+
+            self.progress_timer.cancel()
+            self.progress_timer = None
+
+        self._send_progress()
+
+    def _progress_timer_expired(self):
+        with self.progress_lock:
+            if self.progress_timer is None:
+                # Already flushed
+                return
+
+            self.progress_timer = None
+
+        self._send_progress()
+
+    def _send_progress(self):
+        with self.progress_send_lock:
+            with self.progress_lock:
+                progress = self.progress.copy()
+                self.progress_sent_at = time.monotonic()
+
+            try:
+                self.connection.call('core.job_update', self.id, {'progress': progress})
+            except Exception:
+                self.logger.warning('Failed to update job %r progress', self.id, exc_info=True)
 
 
 def main_worker(*call_args):
@@ -131,8 +215,7 @@ def reconfigure_logging(mtype, **message):
         logger.reconfigure_logging()
 
 
-def receive_events():
-    c = Client(f'ws+unix://{MIDDLEWARE_RUN_DIR}/middlewared-internal.sock', py_exceptions=True)
+def receive_events(c):
     c.subscribe('core.environ', lambda *args, **kwargs: environ_update(kwargs['fields']))
     c.subscribe('core.reconfigure_logging', reconfigure_logging)
 
@@ -148,4 +231,5 @@ def worker_init(debug_level, log_handler):
     setproctitle.setproctitle('middlewared (worker)')
     osc.die_with_parent()
     logger.setup_logging('worker', debug_level, log_handler)
-    receive_events()
+    MIDDLEWARE.connection.on_connect.append(receive_events)
+    MIDDLEWARE.connection.get()